@@ -0,0 +1,47 @@
+"""Benchmarks of drf-json-schema, run against the dummy project."""
+
+import json
+import os
+import platform
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def setup(scale: int, seed: int) -> Dict[str, int]:
+    """Set up Django with the benchmark settings, and generate the data."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+    # The models can only be imported once Django is set up.
+    from .data import generate
+
+    return generate(scale, seed)
+
+
+def environment() -> Dict[str, str]:
+    """Return the versions of Python and the dependencies that are measured."""
+    import django
+    import rest_framework
+
+    return OrderedDict(
+        (
+            ("python", platform.python_version()),
+            ("django", django.get_version()),
+            ("djangorestframework", rest_framework.VERSION),
+        )
+    )
+
+
+def write_report(report: Dict[str, Any], output: Optional[str] = None) -> None:
+    """Write a report as JSON to a file, or to stdout."""
+    content = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(content + "\n")
+    else:
+        print(content)
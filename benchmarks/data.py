@@ -0,0 +1,81 @@
+"""
+Generate synthetic data for the dummy models.
+
+The shapes are skewed like a real catalog: most artists have an album or two
+and a few have many, albums have 4 to 16 tracks, and playlists favor the
+popular tracks, so some tracks are in many playlists.
+"""
+
+import random
+from typing import Any, Dict, List
+
+from django.db import transaction
+
+from tests.dummy.models import Album, Artist, Playlist, Track
+
+
+def generate(scale: int = 1, seed: int = 0) -> Dict[str, int]:
+    """
+    Replace the data with about 100 artists and 20 playlists per unit of scale.
+
+    The data only depends on the scale and the seed. Return the number of
+    each model created.
+    """
+    rng = random.Random(seed)
+    with transaction.atomic():
+        for model in (Playlist, Track, Album, Artist):
+            model.objects.all().delete()
+
+        Artist.objects.bulk_create(
+            Artist(first_name="First %d" % i, last_name="Last %d" % i)
+            for i in range(100 * scale)
+        )
+        artist_ids = list(Artist.objects.values_list("pk", flat=True))
+
+        albums = []
+        for artist_id in artist_ids:
+            for i in range(min(int(rng.paretovariate(1.2)), 25)):
+                albums.append(Album(album_name="Album %d" % i, artist_id=artist_id))
+        # Some albums have no artist.
+        albums.extend(Album(album_name="Compilation %d" % i) for i in range(5 * scale))
+        Album.objects.bulk_create(albums)
+        album_ids = list(Album.objects.values_list("pk", flat=True))
+
+        Track.objects.bulk_create(
+            Track(track_num=num, name="Track %d" % num, album_id=album_id)
+            for album_id in album_ids
+            for num in range(1, rng.randint(4, 16) + 1)
+        )
+        track_ids = list(Track.objects.values_list("pk", flat=True))
+
+        Playlist.objects.bulk_create(
+            Playlist(name="Playlist %d" % i) for i in range(20 * scale)
+        )
+        playlist_ids = list(Playlist.objects.values_list("pk", flat=True))
+        add_playlist_tracks(rng, playlist_ids, track_ids)
+
+    return {
+        "artists": len(artist_ids),
+        "albums": len(album_ids),
+        "tracks": len(track_ids),
+        "playlists": len(playlist_ids),
+        "playlist_tracks": Playlist.tracks.through.objects.count(),
+    }
+
+
+def add_playlist_tracks(
+    rng: random.Random, playlist_ids: List[int], track_ids: List[int]
+) -> None:
+    """Add 10 to 50 tracks to each playlist, favoring popular tracks."""
+    ranked = list(track_ids)
+    rng.shuffle(ranked)
+    popularity = [1.0 / rank for rank in range(1, len(ranked) + 1)]
+    through = Playlist.tracks.through
+    rows: List[Any] = []
+    for playlist_id in playlist_ids:
+        chosen = set(rng.choices(ranked, weights=popularity, k=rng.randint(10, 50)))
+        rows.extend(
+            through(playlist_id=playlist_id, track_id=track_id)
+            for track_id in sorted(chosen)
+        )
+    through.objects.bulk_create(rows)
@@ -0,0 +1,302 @@
+"""
+Measure the memory used to render and parse JSON API documents, with tracemalloc.
+
+Lists of tracks are rendered across page sizes, include depths and codecs
+(the encodings of JSONRenderer), and broken down by phase:
+
+* serializer: handling the request, which outputs the serialized data.
+* tree: rendering the document's resource objects.
+* encode: encoding the document as bytes.
+* render: the whole of `JSONAPIRenderer.render()`.
+
+Playlists are parsed with linkage of increasing numbers of tracks.
+
+The peak memory per resource of each case is compared with a committed
+baseline, and the run fails if it grew by more than the tolerance:
+
+    python -m benchmarks.memory --output memory.json
+
+Allocations differ between versions of Python, Django and Django REST
+framework, so the baseline is only compared with the same feature releases
+as it was recorded with (see benchmarks.environment()). With others, the
+comparison is skipped with a warning. After a change that is expected to use
+more memory, or to record the baseline in another environment, regenerate it
+with:
+
+    python -m benchmarks.memory --update-baseline
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import os
+import sys
+import tracemalloc
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from . import environment, setup, write_report
+
+BASELINE = os.path.join(os.path.dirname(__file__), "memory_baseline.json")
+
+PAGE_SIZES = (10, 100, 1000)
+INCLUDES = ("", "album", "album.artist")
+# The options of each codec's renderer.
+CODECS: Dict[str, Dict[str, Any]] = OrderedDict(
+    (
+        ("compact", {}),
+        ("spaced", {"compact": False}),
+        ("ascii", {"ensure_ascii": True}),
+    )
+)
+LINKAGE_SIZES = (10, 100, 1000)
+
+Measurement = Dict[str, int]
+
+
+def traced(func: Callable, *args: Any) -> Tuple[Any, Measurement]:
+    """
+    Call a function, measuring the memory it allocates.
+
+    Return its result, and the peak and retained memory in bytes. The retained
+    memory is what was allocated by the call and is still in use, such as
+    the result.
+    """
+    # Garbage left by earlier calls would be collected at a different point of
+    # each call, and make its peak vary.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, OrderedDict((("peak", peak), ("retained", retained)))
+
+
+def render_cases() -> Iterator[Tuple[int, str, str]]:
+    """Generate the page size, include paths and codec of each render case."""
+    return itertools.product(PAGE_SIZES, INCLUDES, CODECS)
+
+
+def get_tracks(size: int, include: str) -> Any:
+    """Handle a request for a page of tracks, returning the unrendered response."""
+    from rest_framework.test import APIRequestFactory
+
+    from .views import TrackViewSet
+
+    query: Dict[str, Any] = {"limit": size}
+    if include:
+        query["include"] = include
+    request = APIRequestFactory().get("/api/tracks/", query)
+    return TrackViewSet.as_view({"get": "list"})(request)
+
+
+def get_renderer(response: Any, codec: str) -> Any:
+    """Return the renderer of a response, with the options of a codec."""
+    renderer = response.accepted_renderer
+    for (option, value) in CODECS[codec].items():
+        setattr(renderer, option, value)
+    return renderer
+
+
+def measure_render(size: int, include: str, codec: str) -> Dict[str, Any]:
+    """Measure the phases of rendering a page of tracks."""
+    response, serializer = traced(get_tracks, size, include)
+    renderer = get_renderer(response, codec)
+    context = dict(response.renderer_context, response=response)
+    document_context = renderer.get_document_context(context)
+    (data, included), tree = traced(
+        renderer.render_data,
+        response.data,
+        context,
+        renderer.get_include(context),
+        document_context,
+    )
+    document = OrderedDict((("data", data), ("included", included)))
+    content, encode = traced(
+        renderer.encode,
+        document,
+        response.accepted_media_type,
+        context,
+        document_context,
+    )
+
+    # The whole render, of another response so that nothing is shared.
+    response = get_tracks(size, include)
+    renderer = get_renderer(response, codec)
+    _content, render = traced(
+        renderer.render,
+        response.data,
+        response.accepted_media_type,
+        dict(response.renderer_context, response=response),
+    )
+
+    resources = len(data) + len(included)
+    return OrderedDict(
+        (
+            (
+                "case",
+                "render tracks limit=%d include=%s codec=%s"
+                % (size, include or "-", codec),
+            ),
+            ("resources", resources),
+            ("bytes", len(content)),
+            ("serializer", serializer),
+            ("tree", tree),
+            ("encode", encode),
+            ("render", render),
+            ("peak_per_resource", render["peak"] // resources),
+        )
+    )
+
+
+def measure_parse(size: int) -> Dict[str, Any]:
+    """Measure parsing a playlist document, with linkage to a number of tracks."""
+    from rest_framework.test import APIRequestFactory
+
+    from rest_framework_json_schema.parsers import JSONAPIParser
+
+    from .views import PlaylistViewSet
+
+    content = json.dumps(
+        {
+            "data": {
+                "type": "playlist",
+                "attributes": {"name": "Playlist"},
+                "relationships": {
+                    "tracks": {
+                        "data": [
+                            {"type": "track", "id": str(i)} for i in range(1, size + 1)
+                        ]
+                    }
+                },
+            }
+        }
+    ).encode("utf-8")
+    request = APIRequestFactory().post("/api/playlists/")
+    view = PlaylistViewSet(
+        request=request, format_kwarg=None, kwargs={}, action="create"
+    )
+    parser = JSONAPIParser()
+    _parsed, parse = traced(
+        parser.parse,
+        BytesIO(content),
+        parser.media_type,
+        {"view": view, "request": request},
+    )
+    return OrderedDict(
+        (
+            ("case", "parse playlist tracks=%d" % size),
+            ("resources", size + 1),
+            ("bytes", len(content)),
+            ("parse", parse),
+            ("peak_per_resource", parse["peak"] // (size + 1)),
+        )
+    )
+
+
+def check_baseline(
+    results: List[Dict[str, Any]], baseline: Dict[str, int], tolerance: float
+) -> List[str]:
+    """Return a description of each case whose peak memory per resource regressed."""
+    regressions = []
+    for result in results:
+        expected = baseline.get(result["case"])
+        if expected is not None and result["peak_per_resource"] > expected * (
+            1 + tolerance
+        ):
+            regressions.append(
+                "%s: %d bytes per resource > %d"
+                % (result["case"], result["peak_per_resource"], expected)
+            )
+    return regressions
+
+
+def release(environment: Dict[str, str]) -> Dict[str, str]:
+    """Return the feature releases of an environment, without the patch levels."""
+    return {
+        name: ".".join(version.split(".")[:2])
+        for (name, version) in environment.items()
+    }
+
+
+def describe(environment: Dict[str, str]) -> str:
+    """Describe the versions of an environment."""
+    return ", ".join("%s %s" % item for item in environment.items())
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scale", type=int, default=1, help="Units of data to generate (default 1)."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the data.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed growth of peak memory per resource (default 0.1).",
+    )
+    parser.add_argument(
+        "--baseline", default=BASELINE, help="The baseline to compare with."
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Record the results as the baseline, instead of comparing.",
+    )
+    parser.add_argument("--output", help="Write the results to a file, not stdout.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Generate the data, measure every case and compare with the baseline."""
+    args = parse_args(argv)
+    data = setup(args.scale, args.seed)
+
+    # Warm up, so the first cases don't measure imports and caches.
+    measure_render(PAGE_SIZES[0], INCLUDES[-1], "compact")
+    measure_parse(LINKAGE_SIZES[0])
+    results = [
+        measure_render(size, include, codec)
+        for (size, include, codec) in render_cases()
+    ]
+    results.extend(measure_parse(size) for size in LINKAGE_SIZES)
+    report: Dict[str, Any] = OrderedDict(
+        (("environment", environment()), ("data", data), ("results", results))
+    )
+    write_report(report, args.output)
+
+    peaks = OrderedDict(
+        (result["case"], result["peak_per_resource"]) for result in results
+    )
+    if args.update_baseline:
+        write_report(
+            OrderedDict(
+                (("environment", report["environment"]), ("peak_per_resource", peaks))
+            ),
+            args.baseline,
+        )
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if release(baseline["environment"]) != release(report["environment"]):
+        print(
+            "Not comparing with the baseline, which was recorded with %s, not %s."
+            % (describe(baseline["environment"]), describe(report["environment"])),
+            file=sys.stderr,
+        )
+        return 0
+    regressions = check_baseline(results, baseline["peak_per_resource"], args.tolerance)
+    for regression in regressions:
+        print("Memory regression: %s" % regression, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
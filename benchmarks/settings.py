@@ -0,0 +1,27 @@
+"""
+Django settings for the benchmarks: the dummy project, served like in production.
+
+The SQLite database is a file in the temporary directory, or the
+BENCHMARK_DATABASE environment variable.
+"""
+
+import os
+import tempfile
+
+from tests.dummy.settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+ALLOWED_HOSTS = ["127.0.0.1", "testserver"]
+
+ROOT_URLCONF = "benchmarks.urls"
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get(
+            "BENCHMARK_DATABASE",
+            os.path.join(tempfile.gettempdir(), "drf-json-schema-benchmarks.sqlite3"),
+        ),
+    }
+}
@@ -0,0 +1,201 @@
+"""
+Measure the throughput of JSON API endpoints of the dummy project, end to end.
+
+Requests are handled in-process by the WSGI application, so middleware,
+content negotiation and responses are measured along with rendering. Each
+case of a matrix of endpoints, include paths, sparse fieldsets and page sizes
+is requested repeatedly, and the results are written as JSON, along with the
+peak resident set size of the whole run (it is per process, not per case):
+
+    python -m benchmarks.throughput --scale 2 --output throughput.json
+
+The data is generated in a SQLite database (see benchmarks.settings).
+"""
+
+import argparse
+import itertools
+import math
+import sys
+import time
+import wsgiref.util
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+
+from . import environment, setup, write_report
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None  # type: ignore
+
+# The include paths and sparse fieldsets of each endpoint.
+ENDPOINTS: Dict[str, Tuple[Sequence[str], Dict[str, str]]] = OrderedDict(
+    (
+        ("artists", (("",), {"fields[artist]": "lastName"})),
+        (
+            "albums",
+            (
+                ("", "artist", "tracks", "artist,tracks"),
+                {"fields[album]": "albumName,artist", "fields[track]": "name"},
+            ),
+        ),
+        (
+            "tracks",
+            (("", "album", "album.artist"), {"fields[track]": "name,album"}),
+        ),
+        (
+            "playlists",
+            (
+                ("", "tracks", "tracks.album.artist"),
+                {"fields[playlist]": "name,tracks", "fields[track]": "name,album"},
+            ),
+        ),
+    )
+)
+PAGE_SIZES = (10, 100)
+
+
+def cases(select: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Generate the cases of the matrix, optionally only those of an endpoint."""
+    for (endpoint, (includes, fieldset)) in ENDPOINTS.items():
+        if select and endpoint != select:
+            continue
+        for (include, sparse, limit) in itertools.product(
+            includes, (False, True), PAGE_SIZES
+        ):
+            query: Dict[str, Any] = OrderedDict((("limit", limit),))
+            if include:
+                query["include"] = include
+            if sparse:
+                query.update(fieldset)
+            yield OrderedDict(
+                (
+                    ("endpoint", endpoint),
+                    ("include", include),
+                    ("sparse", sparse),
+                    ("limit", limit),
+                    ("path", "/api/%s/" % endpoint),
+                    ("query", urlencode(query)),
+                )
+            )
+
+
+def call(application: Callable, path: str, query: str) -> Tuple[str, int]:
+    """Make a GET request to a WSGI application, returning its status and size."""
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "HTTP_ACCEPT": "application/vnd.api+json",
+        "wsgi.input": BytesIO(),
+    }
+    wsgiref.util.setup_testing_defaults(environ)
+    statuses = []
+
+    def start_response(status: str, headers: List, exc_info: Any = None) -> None:
+        statuses.append(status)
+
+    body = application(environ, start_response)
+    try:
+        size = sum(len(chunk) for chunk in body)
+    finally:
+        close = getattr(body, "close", None)
+        if close is not None:
+            close()
+    return statuses[0], size
+
+
+def percentile(latencies: List[float], percent: float) -> float:
+    """Return a percentile of sorted latencies, by the nearest rank."""
+    rank = int(math.ceil(percent / 100.0 * len(latencies)))
+    return latencies[min(max(rank, 1), len(latencies)) - 1]
+
+
+def peak_rss() -> Optional[int]:
+    """Return the peak resident set size of this process in kilobytes, if known."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_case(
+    application: Callable, case: Dict[str, Any], requests: int, warmup: int
+) -> Dict[str, Any]:
+    """Request a case repeatedly, and return its measurements."""
+    for _i in range(warmup):
+        call(application, case["path"], case["query"])
+
+    latencies = []
+    start = time.perf_counter()
+    for _i in range(requests):
+        request_start = time.perf_counter()
+        status, size = call(application, case["path"], case["query"])
+        latencies.append(time.perf_counter() - request_start)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    result = OrderedDict(case)
+    result.update(
+        (
+            ("status", int(status.split()[0])),
+            ("bytes", size),
+            ("requests", requests),
+            ("rps", round(requests / elapsed, 1)),
+            ("p50_ms", round(percentile(latencies, 50) * 1000, 3)),
+            ("p99_ms", round(percentile(latencies, 99) * 1000, 3)),
+        )
+    )
+    return result
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scale", type=int, default=1, help="Units of data to generate (default 1)."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the data.")
+    parser.add_argument(
+        "--requests", type=int, default=50, help="Measured requests per case."
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=5, help="Unmeasured requests per case."
+    )
+    parser.add_argument(
+        "--endpoint", choices=list(ENDPOINTS), help="Only measure an endpoint."
+    )
+    parser.add_argument("--output", help="Write the results to a file, not stdout.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Generate the data, measure every case and write the results."""
+    args = parse_args(argv)
+    data = setup(args.scale, args.seed)
+
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    report: Dict[str, Any] = OrderedDict(
+        (
+            ("environment", environment()),
+            ("data", data),
+            ("requests", args.requests),
+            ("results", []),
+        )
+    )
+    for case in cases(args.endpoint):
+        report["results"].append(
+            run_case(application, case, args.requests, args.warmup)
+        )
+    report["peak_rss_kb"] = peak_rss()
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""URL configuration of the benchmarks."""
+
+from django.conf.urls import include, url
+from rest_framework.routers import DefaultRouter
+
+from .views import AlbumViewSet, ArtistViewSet, PlaylistViewSet, TrackViewSet
+
+router = DefaultRouter()
+router.register(r"artists", ArtistViewSet, "artist")
+router.register(r"albums", AlbumViewSet, "album")
+router.register(r"tracks", TrackViewSet, "track")
+router.register(r"playlists", PlaylistViewSet, "playlist")
+
+urlpatterns = [url(r"^api/", include(router.urls))]
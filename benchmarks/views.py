@@ -0,0 +1,38 @@
+"""Paginated viewsets of the dummy models, prefetching the linkage they render."""
+
+from rest_framework_json_schema.pagination import JSONAPILimitOffsetPagination
+from tests.dummy.models import Album, Playlist
+from tests.support import db_views
+
+
+class Pagination(JSONAPILimitOffsetPagination):
+    """Limit/offset pagination, with pages of up to 1000 resources."""
+
+    default_limit = 10
+    max_limit = 1000
+
+
+class ArtistViewSet(db_views.ArtistViewSet):
+    """A paginated viewset of artists."""
+
+    pagination_class = Pagination
+
+
+class AlbumViewSet(db_views.AlbumViewSet):
+    """A paginated viewset of albums."""
+
+    queryset = Album.objects.prefetch_related("tracks").order_by("pk")
+    pagination_class = Pagination
+
+
+class TrackViewSet(db_views.TrackViewSet):
+    """A paginated viewset of tracks."""
+
+    pagination_class = Pagination
+
+
+class PlaylistViewSet(db_views.PlaylistViewSet):
+    """A paginated viewset of playlists."""
+
+    queryset = Playlist.objects.prefetch_related("tracks").order_by("pk")
+    pagination_class = Pagination
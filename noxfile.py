@@ -69,3 +69,25 @@ def pydocstyle(session: Session) -> None:
     """Check docstrings."""
     session.install("pydocstyle")
     session.run("pydocstyle")
+
+
+@nox.session
+def throughput(session: Session) -> None:
+    """Measure the throughput of the dummy project's endpoints."""
+    install_pipenv_requirements(session)
+    session.run(
+        "python",
+        "-m",
+        "benchmarks.throughput",
+        *session.posargs,
+        env={"PYTHONPATH": "."},
+    )
+
+
+@nox.session
+def memory(session: Session) -> None:
+    """Compare the memory used to render and parse documents with the baseline."""
+    install_pipenv_requirements(session)
+    session.run(
+        "python", "-m", "benchmarks.memory", *session.posargs, env={"PYTHONPATH": "."}
+    )
@@ -52,7 +52,9 @@ def from_serializer(
 
     for field_name, field in serializer.get_fields().items():
         if field_name != id_field:
-            if isinstance(field, serializers.RelatedField):
+            if isinstance(
+                field, (serializers.RelatedField, serializers.ManyRelatedField)
+            ):
                 rels.append(field_name)
             else:
                 attrs.append(field_name)
@@ -79,9 +81,14 @@ class AutoSchemaDescriptor(Generic[T]):
         self.init_kwargs = init_kwargs
         self._cached: Optional[Type[ResourceObject]] = None
 
-    def __get__(self, serializer: T, objtype: Type[T]) -> Type[ResourceObject]:
+    def __get__(
+        self, serializer: Optional[T], objtype: Type[T]
+    ) -> Type[ResourceObject]:
         """Generate the serializer."""
         if not self._cached:
+            if serializer is None:
+                # Accessed from the class, as related resources do.
+                serializer = objtype()
             self._cached = from_serializer(
                 serializer, self.api_type, id_field=self.id_field, **self.init_kwargs
             )
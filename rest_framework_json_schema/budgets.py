@@ -0,0 +1,168 @@
+"""
+Limit the cost of including related resources in a document.
+
+https://jsonapi.org/format/#fetching-includes
+"""
+
+import copy
+from typing import Any, Dict, Optional, Set, Tuple
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, serializers, status
+from rest_framework.relations import ManyRelatedField
+
+
+class IncludeBudgetExceeded(exceptions.APIException):
+    """The included resources requested would cost more than the view allows."""
+
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = _("The requested include paths are too expensive.")
+    default_code = "include_budget_exceeded"
+
+
+class IncludeBudget:
+    """
+    Limits on the related resources that a document can include.
+
+    Set an instance as the `include_budget` of a view:
+
+    * max_depth: The number of relationships in an include path.
+    * max_paths: The number of include paths, counting every prefix of a path.
+    * max_included: The number of included resources.
+    * max_bytes: The size of the encoded document.
+
+    Limits that are None aren't checked. The depth and paths are checked before
+    rendering. With `JSONAPIIncludeBudgetMixin`, the number of included
+    resources is also estimated before the request is handled, from the
+    cardinality of relationships: to-one relationships have a member, and
+    to-many relationships have their `cardinality` (see RelationshipObject),
+    their `linkage_limit`, or `default_cardinality` members.
+
+    While rendering, the resources of included relationships are counted once
+    each, however many times they are referenced, and rendering stops as soon
+    as there are too many. The size is checked once
+    the document is encoded. Violations are rendered as a 400 error.
+    """
+
+    max_depth: Optional[int] = None
+    max_paths: Optional[int] = None
+    max_included: Optional[int] = None
+    max_bytes: Optional[int] = None
+    # The members assumed for to-many relationships without a cardinality.
+    default_cardinality = 10
+
+    def __init__(self, **kwargs: Any) -> None:
+        """Create a budget, with limits to override."""
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+        self.included = 0
+        # The (type, id) of the resources counted by `include_resource()`.
+        self.resources: Set[Tuple[str, str]] = set()
+
+    def for_document(self) -> "IncludeBudget":
+        """Return a copy of the budget to spend on rendering a document."""
+        budget = copy.copy(self)
+        budget.included = 0
+        budget.resources = set()
+        return budget
+
+    def check_include(self, include: Dict[str, Dict]) -> None:
+        """Check the depth and number of the include paths."""
+        depth, paths = measure_include(include)
+        if self.max_depth is not None and depth > self.max_depth:
+            raise IncludeBudgetExceeded(
+                "Include paths can have at most %d relationships." % self.max_depth
+            )
+        if self.max_paths is not None and paths > self.max_paths:
+            raise IncludeBudgetExceeded(
+                "At most %d relationships can be included." % self.max_paths
+            )
+
+    def preflight(
+        self,
+        serializer: serializers.Serializer,
+        include: Dict[str, Dict],
+        primary: Optional[int],
+    ) -> None:
+        """
+        Check include paths before any resource is fetched.
+
+        :param serializer: The serializer of the primary data.
+        :param include: The parsed include parameter.
+        :param primary: The expected number of resources in the primary data,
+            or None if it isn't known, in which case included resources are
+            only counted while rendering.
+        """
+        self.check_include(include)
+        if self.max_included is None or primary is None:
+            return
+        estimate = self.estimate_included(serializer, include, primary)
+        if estimate > self.max_included:
+            raise IncludeBudgetExceeded(
+                "The include paths could include about %d resources, but at most "
+                "%d can be included." % (estimate, self.max_included)
+            )
+
+    def estimate_included(
+        self, serializer: Any, include: Dict[str, Dict], resources: int
+    ) -> int:
+        """Estimate the resources included from a number of resources."""
+        schema = getattr(serializer, "schema", None)
+        fields = getattr(serializer, "fields", None)
+        if schema is None or fields is None:
+            return 0
+        relationships = dict(schema().norm_relationships)
+        total = 0
+        for (name, children) in include.items():
+            field = fields.get(name)
+            rel = relationships.get(name)
+            if field is None or rel is None:
+                continue
+            if isinstance(field, ManyRelatedField):
+                cardinality = rel.cardinality
+                if cardinality is None:
+                    cardinality = rel.linkage_limit
+                if cardinality is None:
+                    cardinality = self.default_cardinality
+                field = field.child_relation
+            else:
+                cardinality = 1
+            members = resources * cardinality
+            total += members
+            get_serializer = getattr(field, "get_serializer", None)
+            if children and get_serializer is not None and get_serializer():
+                total += self.estimate_included(get_serializer()(), children, members)
+        return total
+
+    def include(self, members: int) -> None:
+        """Count included resources, checking the limit."""
+        self.included += members
+        if self.max_included is not None and self.included > self.max_included:
+            raise IncludeBudgetExceeded(
+                "At most %d resources can be included." % self.max_included
+            )
+
+    def include_resource(self, type: str, id: Any) -> None:
+        """Count an included resource, unless it was already counted."""
+        key = (type, str(id))
+        if key not in self.resources:
+            self.resources.add(key)
+            self.include(1)
+
+    def check_bytes(self, size: int) -> None:
+        """Check the size of the encoded document."""
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise IncludeBudgetExceeded(
+                "The document would be larger than %d bytes." % self.max_bytes
+            )
+
+
+def measure_include(include: Dict[str, Dict]) -> Tuple[int, int]:
+    """Return the depth and the number of paths of a parsed include parameter."""
+    depth = 0
+    paths = 0
+    for children in include.values():
+        child_depth, child_paths = measure_include(children)
+        depth = max(depth, child_depth + 1)
+        paths += child_paths + 1
+    return depth, paths
@@ -23,3 +23,11 @@ class NoSchema(Exception):
 
     This is a programmer error.
     """
+
+
+class ValuesUnsupported(Exception):
+    """
+    The resource can't be rendered from queryset values.
+
+    Rendering falls back to the serializer.
+    """
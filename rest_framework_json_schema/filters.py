@@ -1,11 +1,43 @@
 """Utilities and helpers for filtering."""
 
+import logging
 import re
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+from urllib.parse import parse_qsl
 
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import (
+    Count,
+    ForeignObjectRel,
+    IntegerField,
+    Model,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+)
+from django.db.models.functions import Coalesce
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.request import Request
+
+from .relations import JSONAPIManyRelatedField
+from .schema import ResourceObject
 from .transforms import NullTransform, Transform
+from .utils import parse_relationship_modes
+
+logger = logging.getLogger(__name__)
 
 FILTER = re.compile(r"^filter\[(\w+)\]$")
+FILTER_OPERATOR = re.compile(r"^filter\[(\w+)\](?:\[(\w+)\])?$")
+
+# (member name, operator, values)
+FilterSpecType = Tuple[Tuple[str, str, Tuple[str, ...]], ...]
 
 
 def get_query_filters(
@@ -26,3 +58,340 @@ def get_query_filters(
             result[transformer.transform(m.group(1))] = value
 
     return result
+
+
+@lru_cache(maxsize=1024)
+def parse_filter_spec(query_string: str) -> FilterSpecType:
+    """
+    Parse the JSON API filter parameters of a query string.
+
+    Filters may specify an operator, and a comma-separated list of values:
+
+    filter[name]=John&filter[age][gte]=30&filter[id]=1,2,3
+    Returns:
+    (("name", "eq", ("John",)), ("age", "gte", ("30",)), ("id", "eq", ("1", "2", "3")))
+
+    The result is cached, as clients tend to repeat the same queries.
+    """
+    result = []
+    for (key, value) in parse_qsl(query_string, keep_blank_values=True):
+        m = FILTER_OPERATOR.match(key)
+        if m:
+            values = tuple(value.split(",")) if value else ("",)
+            result.append((m.group(1), m.group(2) or "eq", values))
+    return tuple(result)
+
+
+class JSONAPIFilterBackend(BaseFilterBackend):
+    """
+    Filter a queryset in the database using the JSON API filter parameters.
+
+    Filters are named by the (transformed) names of the attributes and
+    relationships in the schema, and their values are converted by the
+    matching serializer fields. Only fields whose source is a model field can
+    be filtered, and a view can restrict which attributes and relationships
+    can be filtered with `filter_fields`.
+
+    filter[name]=John           name = 'John'
+    filter[name]=John,Miles     name IN ('John', 'Miles')
+    filter[name][ne]=John       NOT name = 'John'
+    filter[age][gte]=30         age >= 30
+
+    https://jsonapi.org/format/#fetching-filtering
+    """
+
+    # Maps the operator in filter[name][op] to the Django lookup.
+    operators: Dict[str, str] = {
+        "eq": "exact",
+        "ne": "exact",
+        "lt": "lt",
+        "lte": "lte",
+        "gt": "gt",
+        "gte": "gte",
+        "in": "in",
+        "contains": "contains",
+        "icontains": "icontains",
+        "startswith": "startswith",
+        "isnull": "isnull",
+    }
+    # Operators that accept a list of values.
+    list_operators = ("eq", "ne", "in")
+
+    def filter_queryset(
+        self, request: Request, queryset: QuerySet, view: Any
+    ) -> QuerySet:
+        """Return the filtered queryset."""
+        spec = parse_filter_spec(request.META.get("QUERY_STRING", ""))
+        if not spec:
+            return queryset
+
+        serializer = view.get_serializer()
+        fields = self.get_filter_fields(view, serializer.schema())
+        distinct = False
+        for (member, operator, values) in spec:
+            param = "filter[%s]" % member
+            field = serializer.fields.get(fields.get(member))
+            model_field = get_model_field(
+                queryset.model, getattr(field, "source_attrs", ())
+            )
+            if model_field is None:
+                raise ValidationError({param: ["Invalid filter."]})
+            if operator not in self.operators:
+                raise ValidationError({param: ["Invalid filter operator."]})
+            if len(values) > 1 and operator not in self.list_operators:
+                raise ValidationError({param: ["Only a single value is allowed."]})
+
+            lookup = self.get_lookup(field, operator, len(values) > 1)
+            try:
+                converted = [
+                    self.to_internal_value(field, operator, v, model_field)
+                    for v in values
+                ]
+            except ValidationError as e:
+                raise ValidationError({param: e.detail})
+            value = converted if lookup.endswith("__in") else converted[0]
+
+            q = Q(**{lookup: value})
+            queryset = queryset.exclude(q) if operator == "ne" else queryset.filter(q)
+            distinct = distinct or isinstance(field, ManyRelatedField)
+
+        # Filtering on a to-many relationship can repeat results.
+        return queryset.distinct() if distinct else queryset
+
+    def get_filter_fields(self, view: Any, schema: ResourceObject) -> Dict[str, str]:
+        """Return the filterable fields, keyed by their transformed name."""
+        allowed = getattr(view, "filter_fields", None)
+        names = list(schema.norm_attributes) + [
+            name for (name, _) in schema.norm_relationships
+        ]
+        result = {
+            schema.transformed_names[name]: name
+            for name in names
+            if allowed is None or name in allowed
+        }
+        if allowed is None or schema.id in allowed:
+            result["id"] = schema.id
+        return result
+
+    def get_lookup(self, field: serializers.Field, operator: str, many: bool) -> str:
+        """Return the Django lookup for a field and operator."""
+        path = "__".join(field.source_attrs)
+        lookup = self.operators[operator]
+        if many and lookup == "exact":
+            lookup = "in"
+        return "%s__%s" % (path, lookup)
+
+    def to_internal_value(
+        self,
+        field: serializers.Field,
+        operator: str,
+        value: str,
+        model_field: Any = None,
+    ) -> Any:
+        """Convert a filter value using its serializer field."""
+        if operator == "isnull":
+            return serializers.BooleanField().to_internal_value(value)
+        if isinstance(field, (RelatedField, ManyRelatedField)):
+            # Filter on the related ID, without fetching the related object.
+            return self.to_related_pk(model_field, value)
+        if operator in ("contains", "icontains", "startswith"):
+            # These match part of a value, which the field may not accept.
+            return value
+        return field.to_internal_value(value)
+
+    def to_related_pk(self, model_field: Any, value: str) -> Any:
+        """Convert a filter value to the primary key of a related model."""
+        related_model = getattr(model_field, "related_model", None)
+        if related_model is None:
+            return value
+        try:
+            return related_model._meta.pk.to_python(value)
+        except DjangoValidationError as e:
+            raise ValidationError(e.messages)
+        except ValueError:
+            raise ValidationError(["Invalid value."])
+
+
+def get_model_field(model: Optional[Type[Model]], source_attrs: Sequence[str]) -> Any:
+    """
+    Return the model field that a serializer field's source refers to.
+
+    Relationships are followed through the source's attributes. Return None if
+    the source isn't a model field, such as a method or "*".
+    """
+    field = None
+    for attr in source_attrs:
+        if model is None:
+            return None
+        try:
+            field = model._meta.pk if attr == "pk" else model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model
+    return field
+
+
+def get_reverse_path(
+    model: Type[Model], source_attrs: Sequence[str]
+) -> Optional[Tuple[Type[Model], str]]:
+    """
+    Return the model at the end of a relationship, and the path back from it.
+
+    Return None if the source doesn't follow relationships between models.
+    """
+    names = []
+    for attr in source_attrs:
+        field = get_model_field(model, (attr,))
+        if field is None or field.related_model is None:
+            return None
+        if isinstance(field, ForeignObjectRel):
+            names.append(field.field.name)
+        else:
+            names.append(field.related_query_name())
+        model = field.related_model
+    if not names:
+        return None
+    return model, "__".join(reversed(names))
+
+
+def has_sort_index(model: Type[Model], field_name: str) -> bool:
+    """Return whether an index can be used to sort a model by a field."""
+    try:
+        field = model._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        # Not a concrete field, so it can't be indexed.
+        return False
+    if getattr(field, "primary_key", False) or getattr(field, "unique", False):
+        return True
+    if getattr(field, "db_index", False):
+        return True
+    # An index on several fields can be used if it starts with this field.
+    # Indexes on expressions have no fields.
+    leading = [
+        index.fields[0].lstrip("-") for index in model._meta.indexes if index.fields
+    ]
+    leading += [fields[0] for fields in model._meta.unique_together]
+    leading += [fields[0] for fields in getattr(model._meta, "index_together", ())]
+    return field_name in leading or field.attname in leading
+
+
+class JSONAPISortBackend(BaseFilterBackend):
+    """
+    Sort a queryset in the database using the JSON API sort parameter.
+
+    sort=-createdAt,name sorts by created_at descending, then by name.
+
+    Only the attributes in the schema's `sortable` whitelist (and the ID) can be
+    sorted by, using their transformed names. The primary key is added to the
+    end of the ordering, so it is deterministic, as cursor pagination requires.
+
+    In DEBUG mode, a warning is logged when the leading sort field has no index.
+
+    https://jsonapi.org/format/#fetching-sorting
+    """
+
+    sort_query_param = "sort"
+
+    def filter_queryset(
+        self, request: Request, queryset: QuerySet, view: Any
+    ) -> QuerySet:
+        """Return the sorted queryset."""
+        sort = request.query_params.get(self.sort_query_param)
+        if not sort:
+            return queryset
+
+        ordering = self.get_ordering(sort, view)
+        if settings.DEBUG:
+            self.check_index(queryset.model, ordering[0].lstrip("-"), sort)
+        pk_names = {"pk", queryset.model._meta.pk.name}
+        if not any(o.lstrip("-") in pk_names for o in ordering):
+            ordering.append("pk")
+        return queryset.order_by(*ordering)
+
+    def get_ordering(self, sort: str, view: Any) -> List[str]:
+        """Convert the sort parameter to a list of ORM orderings."""
+        serializer = view.get_serializer()
+        fields = self.get_sort_fields(serializer.schema())
+        ordering = []
+        for member in sort.split(","):
+            descending = member.startswith("-")
+            name = fields.get(member.lstrip("-"))
+            if name not in serializer.fields:
+                raise ValidationError({self.sort_query_param: ["Invalid sort field."]})
+            path = "__".join(serializer.fields[name].source_attrs)
+            ordering.append("-" + path if descending else path)
+        return ordering
+
+    def get_sort_fields(self, schema: ResourceObject) -> Dict[str, str]:
+        """Return the sortable fields, keyed by their transformed name."""
+        result = {
+            schema.transformed_names[name]: name
+            for name in schema.sortable
+            if name in schema.transformed_names
+        }
+        result["id"] = schema.id
+        return result
+
+    def check_index(self, model: Type[Model], field_name: str, sort: str) -> None:
+        """Warn when a sort won't be able to use an index."""
+        if not has_sort_index(model, field_name):
+            logger.warning(
+                "sort=%s on %s has no index on %s, so the database must sort "
+                "every matching row.",
+                sort,
+                model._meta.label,
+                field_name,
+            )
+
+
+class JSONAPIRelationshipCountBackend(BaseFilterBackend):
+    """
+    Count the members of relationships rendered in "count" mode in bulk.
+
+    The queryset is annotated with the count of each to-many relationship whose
+    members are only counted, so their fields don't query for each instance.
+    The mode is selected by the client with relationships[TYPE]=name:count,
+    or by the relationship object's `mode`.
+    """
+
+    def filter_queryset(
+        self, request: Request, queryset: QuerySet, view: Any
+    ) -> QuerySet:
+        """Return the annotated queryset."""
+        serializer = view.get_serializer()
+        schema = serializer.schema()
+        modes = parse_relationship_modes(request.query_params)
+        annotations = {}
+        for (name, rel) in schema.norm_relationships:
+            field = serializer.fields.get(name)
+            if (
+                isinstance(field, JSONAPIManyRelatedField)
+                and field.source != "*"
+                and schema.get_relationship_mode(name, rel, modes) == "count"
+            ):
+                annotations[field.count_annotation % name] = self.get_count(
+                    queryset.model, field.source_attrs
+                )
+        if not annotations:
+            return queryset
+        return queryset.annotate(**annotations)
+
+    def get_count(self, model: Type[Model], source_attrs: Sequence[str]) -> Any:
+        """
+        Return an expression counting the members of a relationship.
+
+        The members are counted in a correlated subquery, so the count doesn't
+        depend on joins added to the queryset, by filters on the relationship.
+        """
+        reverse = get_reverse_path(model, source_attrs)
+        if reverse is None:
+            return Count("__".join(source_attrs), distinct=True)
+        related_model, path = reverse
+        members = (
+            related_model._default_manager.filter(**{path: OuterRef("pk")})
+            .order_by()
+            .values(path)
+            .annotate(count=Count("pk", distinct=True))
+            .values("count")
+        )
+        return Coalesce(Subquery(members, output_field=IntegerField()), 0)
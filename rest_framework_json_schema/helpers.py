@@ -1,9 +1,11 @@
 """Helper classes for serializers and paginators."""
 
-from typing import Any
+from typing import Any, Dict
 
 from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
 
+from .schema import ObjDataType, RelationshipObject
+
 
 class JSONReturnList(ReturnList):
     """Extend a DRF ReturnList to include meta and links."""
@@ -23,3 +25,39 @@ class JSONReturnDict(ReturnDict):
         self.meta = kwargs.pop("meta", None)
         self.links = kwargs.pop("links", None)
         super().__init__(*args, **kwargs)
+
+
+class LinkageList(list):
+    """
+    A list of some of the members of a to-many relationship.
+
+    `total` is the number of all the members.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Create a linkage list."""
+        self.total: int = kwargs.pop("total")
+        super().__init__(*args, **kwargs)
+
+
+class JSONReturnLinkage:
+    """
+    Resource linkage to be rendered as the primary data of a relationship endpoint.
+
+    The relationship object renders the linkage, along with its links and meta.
+    As the parent resource isn't serialized, `obj_data` usually only contains its ID.
+    """
+
+    def __init__(
+        self,
+        relationship: RelationshipObject,
+        obj_data: ObjDataType,
+        rel_data: Any,
+        **kwargs: Any
+    ) -> None:
+        """Create a return linkage."""
+        self.relationship = relationship
+        self.obj_data = obj_data
+        self.rel_data = rel_data
+        self.meta: Dict[str, Any] = kwargs.pop("meta", None)
+        self.links: Dict[str, Any] = kwargs.pop("links", None)
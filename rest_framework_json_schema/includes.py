@@ -0,0 +1,400 @@
+"""
+Resolve included resources level by level, loading them in bulk.
+
+https://jsonapi.org/format/#fetching-includes
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.db import connections
+from django.db.models import QuerySet, prefetch_related_objects
+from rest_framework.relations import PKOnlyObject, RelatedField
+
+from .relations import JSONAPIManyRelatedField
+from .schema import Context, ObjDataType, ResourceIdObject, ResourceObject
+from .utils import parse_relationship_modes
+
+try:
+    from asgiref.sync import async_to_sync, sync_to_async
+except ImportError:  # Django < 3.0
+    async_to_sync = sync_to_async = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class IncludeLoader:
+    """
+    Load the data of included resources in bulk, in the style of a DataLoader.
+
+    The resolver registers the identifiers of the resources to include with
+    `add()`, and then loads all of those of a type at once with `load_many()`.
+
+    By default, resources of a `ResourceIdField` are fetched with a single
+    `in_bulk()` query on the relationship field's queryset (or the model's
+    default manager), prefetching the to-many relationships their serializer
+    will render, and then serialized together. Other resource identifiers
+    return their own data. Override `load_many()` for other data sources.
+    """
+
+    def __init__(self, context: Context) -> None:
+        """Create a loader for a document."""
+        self.context = context
+        # Identifiers by type and ID
+        self.identifiers: Dict[str, Dict[str, Any]] = {}
+        # The loaded data by type and ID, which is loaded once per document.
+        self.data: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, identifier: ResourceIdObject) -> None:
+        """Register the identifier of a resource to load."""
+        self.identifiers.setdefault(identifier.type, {}).setdefault(
+            str(identifier.id), identifier
+        )
+
+    def load_many(self, type: str, ids: Sequence[Any]) -> Dict[str, Any]:
+        """
+        Return the data of the resources of a type, by ID.
+
+        Resources that were loaded at an earlier level of the include paths
+        aren't loaded again.
+        """
+        data = self.data.setdefault(type, {})
+        ids = [id for id in ids if str(id) not in data]
+        if not ids:
+            return data
+
+        identifiers = self.identifiers[type]
+        first = identifiers[str(ids[0])]
+        serializer_class = getattr(first, "serializer", None)
+        if serializer_class is None:
+            # The identifiers know how to get their own data.
+            for id in ids:
+                data[str(id)] = identifiers[str(id)].get_data()
+            return data
+
+        instances = self.get_instances(type, ids)
+        found = [str(id) for id in ids if str(id) in instances]
+        serializer = serializer_class(
+            [instances[id] for id in found],
+            many=True,
+            context=getattr(first, "context", None) or {},
+        )
+        data.update(zip(found, serializer.data))
+        return data
+
+    def get_instances(self, type: str, ids: Sequence[Any]) -> Dict[str, Any]:
+        """Return the instances of the resources of a type, by ID."""
+        identifiers = self.identifiers[type]
+        instances = {}
+        missing = []
+        for id in ids:
+            instance = getattr(identifiers[str(id)], "instance", None)
+            if instance is None or isinstance(instance, PKOnlyObject):
+                missing.append(id)
+            else:
+                instances[str(id)] = instance
+        if missing:
+            queryset = self.get_queryset(type)
+            for (pk, instance) in queryset.in_bulk(missing).items():
+                instances[str(pk)] = instance
+                # Keep it, for the other references to the resource.
+                identifiers[str(pk)].instance = instance
+        return instances
+
+    async def aload_many(self, type: str, ids: Sequence[Any]) -> Dict[str, Any]:
+        """
+        Return the data of the resources of a type, by ID, asynchronously.
+
+        With Django's async ORM, the missing instances are fetched on the event
+        loop, and their to-many relationships are then prefetched in a thread.
+        Serializing them, like loading them without the async ORM, is done in
+        a thread too. Override this for data sources with async clients.
+        """
+        if hasattr(QuerySet, "ain_bulk"):
+            await self.aget_instances(type, ids)
+        return await sync_to_async(self.load_many)(type, ids)
+
+    async def aget_instances(self, type: str, ids: Sequence[Any]) -> None:
+        """Fetch the missing instances of a type with the async ORM."""
+        identifiers = self.identifiers[type]
+        missing = [
+            id
+            for id in ids
+            if isinstance(getattr(identifiers[str(id)], "field", None), RelatedField)
+            and isinstance(identifiers[str(id)].instance, PKOnlyObject)
+        ]
+        if not missing:
+            return
+        queryset = self.get_queryset(type, prefetch=False)
+        if not isinstance(queryset, QuerySet):
+            return
+        instances = await queryset.ain_bulk(missing)
+        # The async ORM doesn't prefetch, so that's done in a thread.
+        prefetch = self.get_prefetch(identifiers[str(missing[0])])
+        if prefetch and instances:
+            await sync_to_async(prefetch_related_objects)(
+                list(instances.values()), *prefetch
+            )
+        for (pk, instance) in instances.items():
+            identifiers[str(pk)].instance = instance
+
+    def get_queryset(self, type: str, prefetch: bool = True) -> Any:
+        """
+        Return the queryset to fetch the instances of a type from.
+
+        Unless `prefetch` is False, the queryset prefetches the to-many
+        relationships whose linkage will be rendered.
+        """
+        first: Any = next(iter(self.identifiers[type].values()))
+        field = getattr(first, "field", None)
+        queryset = field.get_queryset() if field is not None else None
+        if queryset is None:
+            queryset = first.serializer.Meta.model._default_manager.all()
+        if prefetch and isinstance(queryset, QuerySet):
+            lookups = self.get_prefetch(first)
+            if lookups:
+                queryset = queryset.prefetch_related(*lookups)
+        return queryset
+
+    def get_prefetch(self, identifier: Any) -> List[str]:
+        """Return the to-many relationships whose linkage will be rendered."""
+        serializer = identifier.serializer(context=identifier.context)
+        schema = identifier.get_schema()
+        request = self.context.request
+        modes = parse_relationship_modes(request.query_params) if request else {}
+        return [
+            "__".join(serializer.fields[name].source_attrs)
+            for (name, rel) in schema.norm_relationships
+            if isinstance(serializer.fields.get(name), JSONAPIManyRelatedField)
+            and serializer.fields[name].source != "*"
+            and schema.get_relationship_mode(name, rel, modes) == "linkage"
+        ]
+
+
+class IncludeResolver:
+    """
+    Render included resources breadth-first.
+
+    Rather than rendering each included resource as soon as its relationship is
+    rendered, relationships add their members to the resolver. `resolve()` then
+    loads all of the resources of each type at the same level of the include
+    paths at once, and renders them, which adds the members of the next level.
+    The number of loads grows with the depth of the include paths, rather than
+    with the number of resources.
+
+    Resources are included in the order their relationships were first
+    rendered, level by level, and only once: a resource referenced again is
+    only rendered again if its include paths continue differently, so the
+    resources they include are added too.
+
+    The loads of the types of a level are independent, such as those of
+    `include=artist,tracks`. With `max_workers` above 1, they are run
+    concurrently on a thread pool of that size. Each thread uses its own
+    database connections, which are closed once its load is done (unless they
+    are shared with other threads). Since those
+    connections don't see the uncommitted changes of the request's transaction,
+    only enable this for views that don't write before rendering. Loads are
+    still rendered in order, so `included` is the same either way.
+
+    The duration of each load is kept in `timings`, as (level, type, seconds).
+
+    With a deadline in the context, levels stop being loaded once it's near.
+    """
+
+    # The number of loads of a level run concurrently.
+    max_workers: int = 1
+
+    def __init__(self, loader: IncludeLoader) -> None:
+        """Create a resolver."""
+        self.loader = loader
+        self.pending: List[Tuple[ResourceIdObject, Context]] = []
+        self.schemas: Dict[str, ResourceObject] = {}
+        self.timings: List[Tuple[int, str, float]] = []
+        self.level = 0
+        # The include paths of the types of the current level.
+        self.level_paths: Dict[str, str] = {}
+        # The include trees each resource was rendered with, by type and ID.
+        self.rendered: Dict[Tuple[str, str], List[Dict]] = {}
+
+    def add(self, identifier: ResourceIdObject, context: Context) -> None:
+        """Add a resource to include, rendered with the given context."""
+        self.pending.append((identifier, context))
+        self.loader.add(identifier)
+
+    def resolve(self) -> List[ObjDataType]:
+        """Load and render all of the included resources, level by level."""
+        included: List[ObjDataType] = []
+        executor = None
+        try:
+            deadline = self.loader.context.deadline
+            while self.pending:
+                level, self.pending = self.pending, []
+                if deadline is not None and deadline.is_near():
+                    for (_identifier, context) in level:
+                        deadline.omit(".".join(context.path))
+                    break
+                self.level += 1
+                ids = self.get_level_ids(level)
+                self.level_paths = self.get_level_paths(level)
+                if executor is None and self.max_workers > 1 and len(ids) > 1:
+                    executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                data = self.load_level(ids, executor)
+                included.extend(self.render_level(level, data))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return included
+
+    def get_level_ids(
+        self, level: List[Tuple[ResourceIdObject, Context]]
+    ) -> Dict[str, List[Any]]:
+        """Return the unique IDs of the resources of a level, by type."""
+        ids: Dict[str, Dict[str, Any]] = OrderedDict()
+        for (identifier, _context) in level:
+            ids.setdefault(identifier.type, OrderedDict()).setdefault(
+                str(identifier.id), identifier.id
+            )
+        return OrderedDict(
+            (type, list(type_ids.values())) for (type, type_ids) in ids.items()
+        )
+
+    def get_level_paths(
+        self, level: List[Tuple[ResourceIdObject, Context]]
+    ) -> Dict[str, str]:
+        """Return the include paths of the resources of a level, by type."""
+        paths: Dict[str, Dict[str, None]] = {}
+        for (identifier, context) in level:
+            paths.setdefault(identifier.type, OrderedDict())[
+                ".".join(context.path)
+            ] = None
+        return {type: ",".join(type_paths) for (type, type_paths) in paths.items()}
+
+    def load_level(
+        self, ids: Dict[str, List[Any]], executor: Optional[Executor] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Load the resources of a level, with one load per type."""
+        if executor is None or len(ids) < 2:
+            return {type: self.load(type, type_ids) for (type, type_ids) in ids.items()}
+        futures = [
+            (type, executor.submit(self.load_in_thread, type, type_ids))
+            for (type, type_ids) in ids.items()
+        ]
+        # Wait for all of them in order, so errors are raised deterministically.
+        return {type: future.result() for (type, future) in futures}
+
+    def load(self, type: str, ids: List[Any]) -> Dict[str, Any]:
+        """Load the resources of a type, and time it."""
+        start = time.perf_counter()
+        detector = self.loader.context.detector
+        if detector is None:
+            data = self.loader.load_many(type, ids)
+        else:
+            with detector.scope(self.level_paths.get(type, ""), type):
+                data = self.loader.load_many(type, ids)
+        duration = time.perf_counter() - start
+        self.timings.append((self.level, type, duration))
+        logger.debug(
+            "Loaded %d %s resources at include level %d in %.3fs",
+            len(ids),
+            type,
+            self.level,
+            duration,
+        )
+        return data
+
+    def load_in_thread(self, type: str, ids: List[Any]) -> Dict[str, Any]:
+        """Load the resources of a type in a worker thread."""
+        try:
+            return self.load(type, ids)
+        finally:
+            # Connections are per thread, and this one is done with its own.
+            # Those shared with other threads, such as the request's, are kept.
+            for alias in connections:
+                connection = connections[alias]
+                if not connection.allow_thread_sharing:
+                    connection.close()
+
+    def render_level(
+        self,
+        level: List[Tuple[ResourceIdObject, Context]],
+        data: Dict[str, Dict[str, Any]],
+    ) -> List[ObjDataType]:
+        """Render the loaded resources of a level, each of them once."""
+        included = []
+        for (identifier, context) in level:
+            obj_data = data[identifier.type].get(str(identifier.id))
+            if obj_data is None:
+                # The resource doesn't exist (anymore).
+                continue
+            includes = self.rendered.setdefault(
+                (identifier.type, str(identifier.id)), []
+            )
+            if context.include in includes:
+                continue
+            includes.append(context.include)
+            # Rendering adds the resources it includes to the next level.
+            obj, _included = self.get_schema(identifier).render(obj_data, context)
+            if len(includes) == 1:
+                included.append(obj)
+        return included
+
+    def get_schema(self, identifier: ResourceIdObject) -> ResourceObject:
+        """Return the schema of a resource, which is shared by its type."""
+        schema: Optional[ResourceObject] = self.schemas.get(identifier.type)
+        if schema is None:
+            schema = self.schemas[identifier.type] = identifier.get_schema()
+        return schema
+
+
+class AsyncIncludeResolver(IncludeResolver):
+    """
+    Render included resources breadth-first, loading them asynchronously.
+
+    The document is still rendered in a thread, as serializers are synchronous,
+    but the loads of each level are run on the event loop with the loader's
+    `aload_many()`, and the loads of the types of a level are gathered, so
+    they can overlap. Levels are still loaded one after the other, since the
+    resources of a level are only known once the previous one is rendered.
+
+    Without asgiref (before Django 3.0), or when rendering in the thread of the
+    event loop, the resources are loaded synchronously.
+    """
+
+    def load_level(
+        self, ids: Dict[str, List[Any]], executor: Optional[Executor] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Load the resources of a level on the event loop."""
+        if async_to_sync is None or in_event_loop():
+            return super().load_level(ids, executor)
+        return async_to_sync(self.aload_level)(ids)
+
+    async def aload_level(self, ids: Dict[str, List[Any]]) -> Dict[str, Dict[str, Any]]:
+        """Load the resources of a level, gathering the loads of its types."""
+        results = await asyncio.gather(
+            *[self.aload(type, type_ids) for (type, type_ids) in ids.items()]
+        )
+        return dict(zip(ids, results))
+
+    async def aload(self, type: str, ids: List[Any]) -> Dict[str, Any]:
+        """Load the resources of a type asynchronously, and time it."""
+        start = time.perf_counter()
+        data = await self.loader.aload_many(type, ids)
+        self.timings.append((self.level, type, time.perf_counter() - start))
+        return data
+
+
+def in_event_loop() -> bool:
+    """Return whether this thread is running an event loop."""
+    if sys.version_info < (3, 7):
+        # get_running_loop() was added in Python 3.7.
+        return asyncio._get_running_loop() is not None
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
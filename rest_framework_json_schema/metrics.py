@@ -0,0 +1,284 @@
+"""
+Collect metrics of the cost of rendering, by resource type and include path.
+
+The metrics can be exported in the Prometheus text format.
+https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+LabelsType = Tuple[Tuple[str, str], ...]
+
+
+class MetricsHook:
+    """
+    Receive the measurements of rendering.
+
+    Set an instance as the `metrics` of JSONAPIRenderer to collect them. The
+    methods are called while rendering, so they should be quick. This base class
+    ignores everything.
+
+    Include paths are the dotted relationship names from the primary data, and
+    are empty for the primary data itself.
+    """
+
+    def observe_document(
+        self,
+        type: str,
+        include: str,
+        seconds: float,
+        resources: int,
+        included: int,
+        size: int,
+    ) -> None:
+        """Observe a rendered document, of primary data of a type."""
+
+    def observe_resource(self, type: str, path: str, seconds: float) -> None:
+        """Observe a rendered resource object, at an include path."""
+
+    def observe_included(self, path: str, members: int) -> None:
+        """Observe the number of members included by a relationship."""
+
+    def observe_omitted(self, type: str, path: str) -> None:
+        """Observe an include path omitted from a document, because of its deadline."""
+
+
+class Histogram:
+    """Count observations in cumulative buckets, like a Prometheus histogram."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        """Create an empty histogram with the upper bounds of its buckets."""
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add an observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Return the cumulative counts of the buckets, by upper bound."""
+        result = []
+        total = 0
+        for (bound, count) in zip(self.buckets + [float("inf")], self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+
+class InMemoryMetrics(MetricsHook):
+    """
+    Aggregate the measurements of rendering in memory, as counters and histograms.
+
+    A single lock is held only to update an aggregate, so the cost is a
+    dictionary lookup and a few additions per observation.
+
+    Each include parameter is a label value, so only enable this for APIs with
+    a bounded set of include paths.
+    """
+
+    seconds_buckets: Sequence[float] = (
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+    )
+    count_buckets: Sequence[float] = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+    size_buckets: Sequence[float] = (
+        1000,
+        10000,
+        100000,
+        1000000,
+        10000000,
+    )
+
+    # name: (type, help, buckets attribute, empty for counters)
+    definitions = OrderedDict(
+        (
+            (
+                "jsonapi_documents_total",
+                ("counter", "Rendered documents.", ""),
+            ),
+            (
+                "jsonapi_document_render_seconds",
+                ("histogram", "Time to render a document.", "seconds_buckets"),
+            ),
+            (
+                "jsonapi_document_resources",
+                ("histogram", "Resource objects in a document.", "count_buckets"),
+            ),
+            (
+                "jsonapi_document_included",
+                ("histogram", "Included resources in a document.", "count_buckets"),
+            ),
+            (
+                "jsonapi_document_bytes",
+                ("histogram", "Size of a rendered document.", "size_buckets"),
+            ),
+            (
+                "jsonapi_resource_render_seconds",
+                ("histogram", "Time to render a resource object.", "seconds_buckets"),
+            ),
+            (
+                "jsonapi_included_members",
+                ("histogram", "Members included by a relationship.", "count_buckets"),
+            ),
+            (
+                "jsonapi_omitted_includes_total",
+                ("counter", "Include paths omitted because of the deadline.", ""),
+            ),
+        )
+    )
+
+    def __init__(self) -> None:
+        """Create empty metrics."""
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelsType, float]] = {}
+        self.histograms: Dict[str, Dict[LabelsType, Histogram]] = {}
+
+    def inc(self, name: str, labels: LabelsType, value: float = 1) -> None:
+        """Increment a counter."""
+        with self.lock:
+            counter = self.counters.setdefault(name, {})
+            counter[labels] = counter.get(labels, 0) + value
+
+    def observe(self, name: str, labels: LabelsType, value: float) -> None:
+        """Add an observation to a histogram."""
+        with self.lock:
+            histograms = self.histograms.setdefault(name, {})
+            histogram = histograms.get(labels)
+            if histogram is None:
+                buckets = getattr(self, self.definitions[name][2])
+                histogram = histograms[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def observe_document(
+        self,
+        type: str,
+        include: str,
+        seconds: float,
+        resources: int,
+        included: int,
+        size: int,
+    ) -> None:
+        """Observe a rendered document, of primary data of a type."""
+        labels = (("type", type), ("include", include))
+        self.inc("jsonapi_documents_total", labels)
+        self.observe("jsonapi_document_render_seconds", labels, seconds)
+        self.observe("jsonapi_document_resources", labels, resources)
+        self.observe("jsonapi_document_included", labels, included)
+        self.observe("jsonapi_document_bytes", labels, size)
+
+    def observe_resource(self, type: str, path: str, seconds: float) -> None:
+        """Observe a rendered resource object, at an include path."""
+        labels = (("type", type), ("path", path))
+        self.observe("jsonapi_resource_render_seconds", labels, seconds)
+
+    def observe_included(self, path: str, members: int) -> None:
+        """Observe the number of members included by a relationship."""
+        self.observe("jsonapi_included_members", (("path", path),), members)
+
+    def observe_omitted(self, type: str, path: str) -> None:
+        """Observe an include path omitted from a document, because of its deadline."""
+        self.inc("jsonapi_omitted_includes_total", (("type", type), ("path", path)))
+
+    def clear(self) -> None:
+        """Forget all of the measurements."""
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def export(self) -> str:
+        """Return the metrics in the Prometheus text format."""
+        lines = []
+        with self.lock:
+            for (name, (metric_type, help, _buckets)) in self.definitions.items():
+                if name not in self.counters and name not in self.histograms:
+                    continue
+                lines.append("# HELP %s %s" % (name, help))
+                lines.append("# TYPE %s %s" % (name, metric_type))
+                for (labels, value) in sorted(self.counters.get(name, {}).items()):
+                    lines.append("%s%s %s" % (name, format_labels(labels), value))
+                for (labels, histogram) in sorted(
+                    self.histograms.get(name, {}).items()
+                ):
+                    for (bound, count) in histogram.cumulative():
+                        lines.append(
+                            "%s_bucket%s %d"
+                            % (name, format_labels(labels + (("le", bound),)), count)
+                        )
+                    lines.append(
+                        "%s_sum%s %r" % (name, format_labels(labels), histogram.sum)
+                    )
+                    lines.append(
+                        "%s_count%s %d" % (name, format_labels(labels), histogram.count)
+                    )
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: LabelsType) -> str:
+    """Format the labels of a sample."""
+    return "{%s}" % ",".join(
+        '%s="%s"'
+        % (
+            name,
+            value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+        )
+        for (name, value) in labels
+    )
+
+
+# The metrics collected by default, when they are enabled.
+default_metrics = InMemoryMetrics()
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Render metrics in the Prometheus text format."""
+
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(
+        self, data: Any, accepted_media_type: Any = None, renderer_context: Any = None
+    ) -> Any:
+        """Return the exported metrics."""
+        return data.encode(self.charset) if isinstance(data, str) else data
+
+
+class PrometheusMetricsView(APIView):
+    """
+    Export in-memory metrics for Prometheus to scrape.
+
+    Route it with `PrometheusMetricsView.as_view()`. Access is controlled by
+    the usual permission classes, so restrict them if metrics are private.
+    """
+
+    renderer_classes = (PrometheusRenderer,)
+    metrics: InMemoryMetrics = default_metrics
+
+    def get(self, request: Request) -> Response:
+        """Return the metrics in the Prometheus text format."""
+        return Response(
+            self.metrics.export(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
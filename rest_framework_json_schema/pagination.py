@@ -1,16 +1,177 @@
 """Pagination serializers determine the structure for paginated responses."""
 
+import hashlib
+import json
 from collections import OrderedDict
+from datetime import date, datetime, time
+from typing import Any, List, Optional, Sequence, Tuple
 
-from rest_framework.pagination import LimitOffsetPagination
+from django.core import signing
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Count, Q, QuerySet, Window
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.utils.serializer_helpers import ReturnList
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from .helpers import JSONReturnList
 
 
 class JSONAPILimitOffsetPagination(LimitOffsetPagination):
-    """Implement JSON API limit/offset pagination."""
+    """
+    Implement JSON API limit/offset pagination.
+
+    Counting every result can be the slowest part of a request, so the way the
+    count in `meta` is made is configurable with `count_strategy`:
+
+    * "exact": A COUNT(*) query (the default).
+    * "cached": An exact count, cached for `count_cache_timeout` seconds, keyed
+      by the filtered query.
+    * "estimated": The query planner's estimate. This is only supported by
+      PostgreSQL; other databases fall back to an exact count. Estimates are
+      rendered as `estimatedCount` rather than `count`.
+    * "window": A COUNT(*) OVER () window function in the page query, so no
+      separate count query is made.
+    * "none": No count.
+
+    Clients may choose one of `allowed_count_strategies` with the
+    `page[count]` query parameter.
+    """
+
+    count_strategy: str = "exact"
+    allowed_count_strategies: Sequence[str] = ()
+    count_query_param = "page[count]"
+    count_cache_alias = "default"
+    count_cache_timeout = 60
+    # Planner estimates for small results are unreliable, so below this,
+    # an exact count is made instead.
+    exact_count_threshold = 1000
+
+    count: Optional[int]
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view: Any = None
+    ) -> Optional[List[Any]]:
+        """Return a single page of results."""
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.offset = self.get_offset(request)
+        self.request = request
+        self.has_next = False
+        self.count_estimated = False
+        strategy = self.get_count_strategy(request)
+        if strategy == "window":
+            results = self.get_window_page(queryset)
+        else:
+            self.count = self.get_count_by_strategy(queryset, strategy)
+            if self.count == 0 or (
+                self.count is not None
+                and not self.count_estimated
+                and self.offset > self.count
+            ):
+                return []
+            # Fetch one more than needed, to know if there is a next page
+            # without depending on the count.
+            results = list(queryset[self.offset : self.offset + self.limit + 1])
+
+        self.has_next = len(results) > self.limit
+        if self.count is not None and self.count > self.limit:
+            self.display_page_controls = self.template is not None
+        return results[: self.limit]
+
+    def get_count_strategy(self, request: Request) -> str:
+        """Return the count strategy, which the client may choose."""
+        strategy = request.query_params.get(self.count_query_param)
+        if strategy in self.allowed_count_strategies:
+            return strategy
+        return self.count_strategy
+
+    def get_count_by_strategy(self, queryset: QuerySet, strategy: str) -> Optional[int]:
+        """Count the results using a count strategy (other than "window")."""
+        if strategy == "none":
+            return None
+        if strategy == "cached":
+            return self.get_cached_count(queryset)
+        if strategy == "estimated":
+            estimate = self.get_estimated_count(queryset)
+            if estimate is not None and estimate >= self.exact_count_threshold:
+                self.count_estimated = True
+                return estimate
+        return self.get_count(queryset)
+
+    def get_count_cache_key(self, queryset: QuerySet) -> Optional[str]:
+        """Return the cache key for the count of a filtered query."""
+        query = getattr(queryset, "query", None)
+        if query is None:
+            return None
+        sql, params = query.sql_with_params()
+        digest = hashlib.sha256(
+            ("%s:%s:%r" % (queryset.db, sql, params)).encode()
+        ).hexdigest()
+        return "jsonapi:count:%s" % digest
+
+    def get_cached_count(self, queryset: QuerySet) -> int:
+        """Return an exact count, which is cached."""
+        try:
+            key = self.get_count_cache_key(queryset)
+        except EmptyResultSet:
+            # The query can't match anything, so it has no SQL to key on.
+            return 0
+        if key is None:
+            return self.get_count(queryset)
+        cache = caches[self.count_cache_alias]
+        count = cache.get(key)
+        if count is None:
+            count = self.get_count(queryset)
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    def get_estimated_count(self, queryset: QuerySet) -> Optional[int]:
+        """Return the query planner's estimated count, if the database has one."""
+        if not hasattr(queryset, "explain"):
+            return None
+        if connections[queryset.db].vendor != "postgresql":
+            return None
+        plan = json.loads(queryset.explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def get_window_page(self, queryset: QuerySet) -> List[Any]:
+        """Fetch the page, counting all the results in the same query."""
+        results = list(
+            queryset.annotate(jsonapi_window_count=Window(expression=Count("pk")))[
+                self.offset : self.offset + self.limit + 1
+            ]
+        )
+        if results:
+            first = results[0]
+            self.count = (
+                first["jsonapi_window_count"]
+                if isinstance(first, dict)
+                else first.jsonapi_window_count
+            )
+        elif self.offset:
+            # We're past the end, so the window had nothing to count.
+            self.count = self.get_count(queryset)
+        else:
+            self.count = 0
+        return results
+
+    def get_next_link(self) -> Optional[str]:
+        """Return the link to the next page, if there is one."""
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        offset = self.offset + self.limit
+        return replace_query_param(url, self.offset_query_param, offset)
 
     def get_paginated_response(self, data: ReturnList) -> Response:
         """
@@ -21,6 +182,10 @@ class JSONAPILimitOffsetPagination(LimitOffsetPagination):
 
         https://jsonapi.org/format/#fetching-pagination
         """
+        meta = None
+        if self.count is not None:
+            count_name = "estimatedCount" if self.count_estimated else "count"
+            meta = OrderedDict(((count_name, self.count),))
         return Response(
             JSONReturnList(
                 data,
@@ -31,6 +196,199 @@ class JSONAPILimitOffsetPagination(LimitOffsetPagination):
                         ("page[previous]", self.get_previous_link()),
                     )
                 ),
-                meta=OrderedDict((("count", self.count),)),
+                meta=meta,
             )
         )
+
+
+def _cursor_value(value: Any) -> Any:
+    """Convert a position value to something that can be stored in a cursor."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return str(value)
+
+
+class JSONAPICursorPagination(BasePagination):
+    """
+    Implement JSON API cursor (keyset) pagination.
+
+    Rather than using an OFFSET, each page is fetched by filtering on the position
+    of the last item of the previous page, so deep pages are as fast as the first.
+    No count query is made.
+
+    The ordering is taken from the queryset if it has been ordered, for instance
+    by the JSON API sort parameter, or otherwise from `ordering`. The primary key
+    is always added to make the ordering stable, and the ordering fields should
+    not be nullable.
+
+    Cursors are opaque and signed, so they can't be forged or tampered with.
+
+    https://jsonapi.org/format/#fetching-pagination
+    """
+
+    cursor_query_param = "page[cursor]"
+    page_size_query_param = "page[size]"
+    page_size: Optional[int] = api_settings.PAGE_SIZE
+    max_page_size: Optional[int] = 100
+    ordering: Sequence[str] = ("pk",)
+    invalid_cursor_message = _("Invalid cursor")
+    # Cursors are signed with the SECRET_KEY, using this salt.
+    salt = "rest_framework_json_schema.pagination.cursor"
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view: Any = None
+    ) -> Optional[List[Any]]:
+        """Return a single page of results."""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+        position, reverse = self.decode_cursor(request)
+
+        if reverse:
+            queryset = queryset.order_by(*[self.invert(o) for o in self.ordering])
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position, reverse))
+
+        self.position = position
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        return self.page
+
+    def get_paginated_response(self, data: ReturnList) -> Response:
+        """
+        Return the paginated response.
+
+        Place the links under the correct location to be used by the
+        JSONAPIRenderer to include in the output payload.
+        """
+        return Response(
+            JSONReturnList(
+                data,
+                serializer=data.serializer,
+                links=OrderedDict(
+                    (
+                        ("page[next]", self.get_next_link()),
+                        ("page[previous]", self.get_previous_link()),
+                    )
+                ),
+            )
+        )
+
+    def get_page_size(self, request: Request) -> Optional[int]:
+        """Return the page size, which the client may request with page[size]."""
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+            if size > 0:
+                return min(size, self.max_page_size) if self.max_page_size else size
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, queryset: QuerySet) -> List[str]:
+        """Return the ordering of the results, ending with the primary key."""
+        ordering = list(queryset.query.order_by or self.ordering)
+        assert all(
+            isinstance(o, str) for o in ordering
+        ), "Cursor pagination requires the ordering to be field names."
+        pk_names = {"pk", queryset.model._meta.pk.name, queryset.model._meta.pk.attname}
+        if not any(o.lstrip("-") in pk_names for o in ordering):
+            ordering.append("pk")
+        return ordering
+
+    def invert(self, ordering: str) -> str:
+        """Reverse the direction of an ordering field."""
+        return ordering[1:] if ordering.startswith("-") else "-" + ordering
+
+    def get_position(self, obj: Any) -> List[Any]:
+        """Return the values of the ordering fields for an object."""
+        position = []
+        for ordering in self.ordering:
+            field = ordering.lstrip("-")
+            if isinstance(obj, dict):
+                # A row of QuerySet.values()
+                value = obj[field]
+            else:
+                value = obj
+                for attr in field.split("__"):
+                    value = getattr(value, attr)
+            position.append(_cursor_value(value))
+        return position
+
+    def get_position_filter(self, position: List[Any], reverse: bool) -> Q:
+        """
+        Return a filter for the results after (or before) a position.
+
+        For an ordering of (a, b, c) this is:
+            a > A OR (a = A AND b > B) OR (a = A AND b = B AND c > C)
+        """
+        result = Q()
+        equal = Q()
+        for (ordering, value) in zip(self.ordering, position):
+            field = ordering.lstrip("-")
+            descending = ordering.startswith("-") != reverse
+            lookup = "%s__%s" % (field, "lt" if descending else "gt")
+            result |= equal & Q(**{lookup: value})
+            equal &= Q(**{field: value})
+        return result
+
+    def encode_cursor(self, position: List[Any], reverse: bool) -> str:
+        """Return a signed cursor for a position."""
+        return signing.dumps(
+            {"o": self.ordering, "p": position, "r": reverse},
+            salt=self.salt,
+            compress=True,
+        )
+
+    def decode_cursor(self, request: Request) -> Tuple[Optional[List[Any]], bool]:
+        """Return the position and direction of the cursor in the request."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = signing.loads(encoded, salt=self.salt)
+        except signing.BadSignature:
+            raise NotFound(self.invalid_cursor_message)
+        # A cursor from a different ordering points nowhere meaningful.
+        if cursor.get("o") != self.ordering or len(cursor["p"]) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor["p"], bool(cursor["r"])
+
+    def get_link(self, cursor: str) -> str:
+        """Return the link for a page with the given cursor."""
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self) -> Optional[str]:
+        """Return the link to the next page, if there is one."""
+        if not self.has_next:
+            return None
+        if not self.page:
+            # We went back before the beginning, so start again.
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.get_link(
+            self.encode_cursor(self.get_position(self.page[-1]), False)
+        )
+
+    def get_previous_link(self) -> Optional[str]:
+        """Return the link to the previous page, if there is one."""
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # We went past the end, so go back from where we were.
+            return self.get_link(self.encode_cursor(self.position or [], True))
+        return self.get_link(self.encode_cursor(self.get_position(self.page[0]), True))
@@ -33,6 +33,23 @@ class JSONAPIParser(JSONParser):
         """Override this if this isn't the way you back to your schema."""
         return parser_context["view"].get_serializer().schema
 
+    def get_related_types(self, parser_context: Mapping[str, Any]) -> Dict[str, str]:
+        """
+        Return the JSON API type of each relationship, keyed by relationship name.
+
+        These are used to verify the type of incoming resource linkage.
+        Override this if this isn't the way you get to your relationship fields.
+        """
+        result = {}
+        serializer = parser_context["view"].get_serializer()
+        for name, field in serializer.fields.items():
+            # Unwrap to-many relationships to get at the relationship field.
+            field = getattr(field, "child_relation", field)
+            get_type = getattr(field, "get_type", None)
+            if get_type:
+                result[name] = get_type()
+        return result
+
     def parse(
         self,
         stream: IO[Any],
@@ -51,8 +68,40 @@ class JSONAPIParser(JSONParser):
             raise exceptions.ValidationError("No primary data.")
 
         try:
-            parsed = schema().parse(data, Context(parser_context.get("request", None)))
+            context = Context(
+                parser_context.get("request", None),
+                related_types=self.get_related_types(parser_context),
+            )
+            parsed = schema().parse(data, context)
         except TypeConflict as e:
             raise Conflict(str(e))
 
         return parsed
+
+
+class JSONAPIRelationshipParser(JSONParser):
+    """
+    Parses JSON API relationship documents, as sent to relationship endpoints.
+
+    The resource linkage is left unparsed, because it can only be interpreted
+    by the schema of the resource that owns the relationship.
+
+    https://jsonapi.org/format/#crud-updating-relationships
+    """
+
+    media_type = "application/vnd.api+json"
+    renderer_class = JSONAPIRenderer
+
+    def parse(
+        self,
+        stream: IO[Any],
+        media_type: Optional[str] = None,
+        parser_context: Optional[Mapping[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Given a stream to read from, return the relationship document."""
+
+        toplevel = super().parse(stream, media_type, parser_context)
+        # "data" is required, but may be null when clearing a to-one relationship.
+        if not isinstance(toplevel, dict) or "data" not in toplevel:
+            raise exceptions.ValidationError("No primary data.")
+        return toplevel
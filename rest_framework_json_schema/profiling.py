@@ -0,0 +1,165 @@
+"""
+Profile single requests with cProfile, and keep the most recent profiles.
+
+The profiles are pstats files, which can be read with `pstats`, or visualized
+with tools such as snakeviz or flameprof.
+https://docs.python.org/3/library/profile.html
+"""
+
+import cProfile
+import os
+import re
+import tempfile
+import threading
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from rest_framework.request import Request
+
+RX_REQUEST_ID = re.compile(r"^[\w-]{1,64}$")
+
+
+class RequestProfiler:
+    """
+    Profile the handling of a request, labelling the rendering of resource objects.
+
+    While profiling, resource objects are rendered through a function named
+    after their type, such as ``render[album]``, so the time spent rendering
+    each type can be told apart in the profile.
+    """
+
+    # The request header that asks for a request to be profiled.
+    header = "HTTP_X_PROFILE"
+    # The request header with an id for the request, used to store its profile.
+    request_id_header = "HTTP_X_REQUEST_ID"
+    # The response header with the id of the stored profile.
+    response_header = "X-Profile-Id"
+
+    def __init__(self, request_id: str) -> None:
+        """Create a profiler of a request, which isn't enabled yet."""
+        self.request_id = request_id
+        self.profile = cProfile.Profile()
+        self.labels: Dict[str, Callable] = {}
+
+    @classmethod
+    def is_requested(cls, request: Request) -> bool:
+        """Return whether a request asks to be profiled."""
+        return bool(request.META.get(cls.header))
+
+    @classmethod
+    def get_request_id(cls, request: Request) -> str:
+        """Return the id of a request: its own if it's safe as a file name, or a new one."""
+        request_id = request.META.get(cls.request_id_header, "")
+        if RX_REQUEST_ID.match(request_id):
+            return request_id
+        return uuid.uuid4().hex
+
+    def enable(self) -> None:
+        """Start profiling this thread."""
+        self.profile.enable()
+
+    def disable(self) -> None:
+        """Stop profiling."""
+        self.profile.disable()
+
+    def call(self, label: str, func: Callable, *args: Any) -> Any:
+        """Call a function through a function named after a label."""
+        labelled = self.labels.get(label)
+        if labelled is None:
+            labelled = self.labels[label] = labelled_call(label)
+        return labelled(func, *args)
+
+
+def labelled_call(label: str) -> Callable:
+    """
+    Return a function that calls a function, and is profiled under a label.
+
+    Profiles identify functions by the name of their code, which is replaced by
+    the label. Before Python 3.8, which can't replace it, this is a plain call.
+    """
+
+    def call(func: Callable, *args: Any) -> Any:
+        return func(*args)
+
+    replace = getattr(call.__code__, "replace", None)
+    if replace is not None:
+        call.__code__ = replace(co_name=label)
+    return call
+
+
+class ProfileStore:
+    """
+    Keep the most recent profiles in a directory, as pstats files by request id.
+
+    The directory is the `JSON_API_PROFILE_DIR` setting by default, or a
+    directory in the temporary directory. The `JSON_API_PROFILE_RETENTION`
+    setting is the number of profiles kept (20 by default): older ones are
+    removed when a profile is saved.
+    """
+
+    suffix = ".prof"
+
+    def __init__(
+        self, directory: Optional[str] = None, retention: Optional[int] = None
+    ) -> None:
+        """Create a store, in a directory which is created when needed."""
+        self._directory = directory
+        self._retention = retention
+        self.lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        """Return the directory of the profiles."""
+        if self._directory is not None:
+            return self._directory
+        return getattr(
+            settings,
+            "JSON_API_PROFILE_DIR",
+            os.path.join(tempfile.gettempdir(), "drf-json-schema-profiles"),
+        )
+
+    @property
+    def retention(self) -> int:
+        """Return the number of profiles kept."""
+        if self._retention is not None:
+            return self._retention
+        return getattr(settings, "JSON_API_PROFILE_RETENTION", 20)
+
+    def path(self, request_id: str) -> str:
+        """Return the path of the profile of a request."""
+        return os.path.join(self.directory, request_id + self.suffix)
+
+    def save(self, profiler: RequestProfiler) -> str:
+        """Save the profile of a request, and remove the oldest profiles."""
+        path = self.path(profiler.request_id)
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.profile.dump_stats(path)
+            request_ids = self.request_ids()
+            for old in request_ids[: max(len(request_ids) - self.retention, 0)]:
+                try:
+                    os.remove(self.path(old))
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def request_ids(self) -> List[str]:
+        """Return the request ids of the stored profiles, oldest first."""
+        try:
+            names = [
+                name
+                for name in os.listdir(self.directory)
+                if name.endswith(self.suffix)
+            ]
+        except FileNotFoundError:
+            return []
+        paths = [os.path.join(self.directory, name) for name in names]
+        return [
+            os.path.basename(path)[: -len(self.suffix)]
+            for path in sorted(paths, key=os.path.getmtime)
+        ]
+
+
+# The store of profiles, by default.
+default_profile_store = ProfileStore()
@@ -0,0 +1,42 @@
+"""
+A pytest plugin to check the render costs of tests against snapshots.
+
+It adds a `perf_snapshots` fixture (see testing.PerfSnapshots) and an
+`--update-perf-snapshots` option. Enable it with
+``-p rest_framework_json_schema.pytest_plugin``.
+"""
+
+import os
+from typing import Any, Iterator
+
+import pytest
+
+from .testing import PerfSnapshots
+
+
+def pytest_addoption(parser: Any) -> None:
+    """Add the option to update the snapshots of render costs."""
+    parser.addoption(
+        "--update-perf-snapshots",
+        action="store_true",
+        default=False,
+        help="Record render costs as the budgets of perf_snapshots.",
+    )
+
+
+@pytest.fixture
+def perf_snapshots(request: Any) -> Iterator[PerfSnapshots]:
+    """
+    Provide the render cost budgets of a test module.
+
+    They are kept in ``perf_snapshots/<module>.json`` next to the test module.
+    """
+    directory, filename = os.path.split(str(request.fspath))
+    path = os.path.join(
+        directory, "perf_snapshots", os.path.splitext(filename)[0] + ".json"
+    )
+    snapshots = PerfSnapshots(
+        path, update=request.config.getoption("--update-perf-snapshots")
+    )
+    yield snapshots
+    snapshots.save()
@@ -0,0 +1,160 @@
+"""
+Detect N+1 queries while rendering, by include path.
+
+https://docs.djangoproject.com/en/stable/topics/db/instrumentation/
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+RX_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+
+# The detectors watching the queries of each thread.
+_local = threading.local()
+
+
+class QueryDetector:
+    """
+    Count the queries made while rendering, by include path and resource type.
+
+    The detector wraps the execution of queries on a database connection. The
+    resource objects being rendered, and the included resources being loaded,
+    set the scope the queries are attributed to: the include path from the
+    primary data (empty for the primary data itself) and the resource type.
+
+    Queries of the same shape (the SQL, with lists of parameters collapsed) that
+    are made `threshold` times or more in a scope are reported as repeated,
+    which is usually an N+1: a query per resource rather than one for all.
+    Queries made by loads that run concurrently in other threads aren't seen.
+    """
+
+    threshold = 2
+
+    def __init__(self, threshold: Optional[int] = None) -> None:
+        """Create a detector that hasn't seen any queries."""
+        if threshold is not None:
+            self.threshold = threshold
+        self.local = threading.local()
+        # Numbers of queries by scope and shape
+        self.queries: Dict[Tuple[str, str], Dict[str, int]] = OrderedDict()
+
+    @classmethod
+    def current(cls) -> Optional["QueryDetector"]:
+        """Return the detector watching the queries of this thread, if any."""
+        return getattr(_local, "detector", None)
+
+    @classmethod
+    def for_render(cls) -> Optional["QueryDetector"]:
+        """Return the detector of a render: the current one, or a new one in DEBUG."""
+        detector = cls.current()
+        if detector is None and settings.DEBUG:
+            detector = cls()
+        return detector
+
+    @property
+    def scopes(self) -> List[Tuple[str, str]]:
+        """Return the stack of scopes of this thread."""
+        scopes = getattr(self.local, "scopes", None)
+        if scopes is None:
+            scopes = self.local.scopes = [("", "")]
+        return scopes
+
+    def enter(self, path: str, type: str) -> None:
+        """Attribute the following queries to an include path and resource type."""
+        self.scopes.append((path, type))
+
+    def exit(self) -> None:
+        """Attribute the following queries to the previous scope."""
+        if len(self.scopes) > 1:
+            self.scopes.pop()
+
+    @contextmanager
+    def scope(self, path: str, type: str) -> Iterator[None]:
+        """Attribute the queries of a block to an include path and resource type."""
+        self.enter(path, type)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    @contextmanager
+    def watch(self, using: str = "default") -> Iterator["QueryDetector"]:
+        """Watch the queries of a database connection in this thread."""
+        if self.current() is self:
+            yield self
+            return
+        previous = self.current()
+        _local.detector = self
+        try:
+            with connections[using].execute_wrapper(self):
+                yield self
+        finally:
+            _local.detector = previous
+            self.local.scopes = None
+
+    def __call__(
+        self, execute: Callable, sql: str, params: Any, many: bool, context: Dict
+    ) -> Any:
+        """Count a query, and execute it."""
+        self.record(sql)
+        return execute(sql, params, many, context)
+
+    def record(self, sql: str) -> None:
+        """Count a query in the current scope."""
+        shape = RX_IN_LIST.sub("(...)", sql)
+        counts = self.queries.setdefault(self.scopes[-1], OrderedDict())
+        counts[shape] = counts.get(shape, 0) + 1
+
+    def repeated(self) -> List[Dict[str, Any]]:
+        """Return the queries that were repeated in a scope."""
+        return [
+            OrderedDict(
+                (("path", path), ("type", type), ("count", count), ("sql", shape))
+            )
+            for ((path, type), counts) in self.queries.items()
+            for (shape, count) in counts.items()
+            if count >= self.threshold
+        ]
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Log the repeated queries, and return them."""
+        repeated = self.repeated()
+        for query in repeated:
+            logger.warning(
+                "Query repeated %d times for %s resources at include path %r: %s",
+                query["count"],
+                query["type"] or "unknown",
+                query["path"],
+                query["sql"],
+            )
+        return repeated
+
+
+@contextmanager
+def assert_no_repeated_queries(
+    threshold: Optional[int] = None, using: str = "default"
+) -> Iterator[QueryDetector]:
+    """
+    Fail if a query is repeated in a scope while rendering, like an N+1.
+
+    Use it in tests around rendering responses, such as:
+
+        with assert_no_repeated_queries():
+            response.render()
+    """
+    detector = QueryDetector(threshold)
+    with detector.watch(using):
+        yield detector
+    repeated = detector.repeated()
+    assert not repeated, "Repeated queries:\n%s" % "\n".join(
+        "%(count)d x %(type)s at %(path)r: %(sql)s" % query for query in repeated
+    )
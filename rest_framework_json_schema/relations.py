@@ -4,12 +4,23 @@ Serializer fields and classes for handling related resources.
 https://jsonapi.org/format/#document-resource-object-relationships
 """
 
-from typing import Any, Dict, Type
+from typing import Any, Container, Dict, Iterable, List, Optional, Tuple, Type
 
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import QuerySet
 from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework.relations import (
+    MANY_RELATION_KWARGS,
+    ManyRelatedField,
+    PKOnlyObject,
+    RelatedField,
+)
 
-from .schema import ResourceIdObject, ResourceObject
+from .helpers import LinkageList
+from .schema import IdentityMap, RelationshipObject, ResourceIdObject, ResourceObject
+from .utils import parse_relationship_modes
 
 
 class ResourceIdField(ResourceIdObject):
@@ -21,17 +32,26 @@ class ResourceIdField(ResourceIdObject):
     """
 
     def __init__(
-        self, serializer: Type[serializers.Serializer], instance: Any, **kwargs: Any
+        self,
+        serializer: Type[serializers.Serializer],
+        instance: Any,
+        context: Optional[Dict[str, Any]] = None,
+        field: Optional[RelatedField] = None,
+        **kwargs: Any
     ) -> None:
         """
         Create a ResourceIdField.
 
         :param serializer: The related resource serializer.
-        :param instance: The related resource instance.
+        :param instance: The related resource instance, or only its primary key.
+        :param context: The serializer context, such as the request.
+        :param field: The relationship field, whose queryset the instance is from.
         :param kwargs: Other arguments.
         """
         self.serializer = serializer
         self.instance = instance
+        self.context = context or {}
+        self.field = field
         super().__init__(**kwargs)
 
     def get_schema(self) -> ResourceObject:
@@ -40,7 +60,114 @@ class ResourceIdField(ResourceIdObject):
 
     def get_data(self) -> Dict[str, Any]:
         """Return the serialized data for this resource."""
-        return self.serializer(self.instance).data
+        instance = self.instance
+        if isinstance(instance, PKOnlyObject) and self.field is not None:
+            instance = self.field.get_queryset().get(pk=instance.pk)
+        return self.serializer(instance, context=self.context).data
+
+
+class JSONAPIManyRelatedField(ManyRelatedField):
+    """
+    A to-many relationship field that resolves its resource linkage in bulk.
+
+    Rather than looking up each related resource one by one, all of the IDs
+    are resolved with a single query.
+
+    If the relationship has a `linkage_limit` in the parent's schema, only that
+    many members are fetched, with a sliced query. The number of all
+    the members is only counted if there are more.
+
+    When the relationship is rendered without linkage, the members aren't
+    fetched. If only their number is rendered, it is read from the
+    `count_annotation` of the instance, when the queryset has been annotated
+    with it, or counted otherwise.
+    """
+
+    count_annotation = "jsonapi_%s_count"
+
+    def get_relationship(self) -> Optional[Tuple[ResourceObject, RelationshipObject]]:
+        """Return the parent's schema and the relationship object of this field."""
+        if not hasattr(self, "_relationship"):
+            self._relationship = None
+            schema_class = getattr(self.parent, "schema", None)
+            if schema_class is not None:
+                schema = schema_class()
+                for (name, rel) in schema.norm_relationships:
+                    if name == self.field_name:
+                        self._relationship = (schema, rel)
+        return self._relationship
+
+    def get_linkage_limit(self) -> Optional[int]:
+        """Return the linkage limit of this relationship in the parent's schema."""
+        relationship = self.get_relationship()
+        return relationship[1].linkage_limit if relationship else None
+
+    def get_relationship_mode(self) -> str:
+        """Return the mode in which this relationship will be rendered."""
+        if not hasattr(self, "_relationship_mode"):
+            self._relationship_mode = "linkage"
+            relationship = self.get_relationship()
+            request = self.context.get("request", None)
+            if relationship:
+                schema, rel = relationship
+                modes = (
+                    parse_relationship_modes(request.query_params) if request else {}
+                )
+                self._relationship_mode = schema.get_relationship_mode(
+                    self.field_name, rel, modes
+                )
+        return self._relationship_mode
+
+    def get_attribute(self, instance: Any) -> Any:
+        """Return the related instances, limited by the linkage limit."""
+        mode = self.get_relationship_mode()
+        if mode == "links":
+            return []
+        if mode == "count":
+            count = getattr(instance, self.count_annotation % self.field_name, None)
+            if count is None:
+                related = super().get_attribute(instance)
+                count = (
+                    related.count() if isinstance(related, QuerySet) else len(related)
+                )
+            return LinkageList([], total=count)
+
+        related = super().get_attribute(instance)
+        limit = self.get_linkage_limit()
+        if limit is None or not isinstance(related, QuerySet):
+            return related
+
+        if related._result_cache is not None:
+            # The members have been prefetched.
+            members = list(related)
+            if len(members) <= limit:
+                return members
+            return LinkageList(members[:limit], total=len(members))
+        if not related.ordered:
+            # Order like the pages of the relationship endpoint.
+            related = related.order_by("pk")
+        # Fetch one more than the limit, to know if there are more to count.
+        members = list(related[: limit + 1])
+        if len(members) <= limit:
+            return members
+        return LinkageList(members[:limit], total=related.count())
+
+    def to_representation(self, iterable: Iterable[Any]) -> List[Any]:
+        """Transform the related instances, keeping the number of all the members."""
+        result = super().to_representation(iterable)
+        total = getattr(iterable, "total", None)
+        if total is not None:
+            return LinkageList(result, total=total)
+        return result
+
+    def to_internal_value(self, data: Any) -> List[Any]:
+        """Transform the *incoming* list of IDs into a list of related instances."""
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        return self.child_relation.to_internal_value_many(data)
 
 
 class JSONAPIRelationshipField(serializers.PrimaryKeyRelatedField):
@@ -52,6 +179,10 @@ class JSONAPIRelationshipField(serializers.PrimaryKeyRelatedField):
     It also accesses the related resource's schema to identify the JSON API type.
     """
 
+    default_error_messages = {
+        "does_not_exist_many": _("Invalid pks {pk_values} - objects do not exist."),
+    }
+
     def __init__(self, **kwargs: Any) -> None:
         """
         Create an object.
@@ -71,6 +202,15 @@ class JSONAPIRelationshipField(serializers.PrimaryKeyRelatedField):
         ), "JSONAPIRelationshipField must either specify a `type` or `serializer`."
         super().__init__(**kwargs)
 
+    @classmethod
+    def many_init(cls, *args: Any, **kwargs: Any) -> JSONAPIManyRelatedField:
+        """Create a to-many relationship field that resolves IDs in bulk."""
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return JSONAPIManyRelatedField(**list_kwargs)
+
     def use_pk_only_optimization(self) -> bool:
         """Decide whether to use pk only optimization."""
         # We can use the pk-only optimization if the parent's object
@@ -82,10 +222,14 @@ class JSONAPIRelationshipField(serializers.PrimaryKeyRelatedField):
             return False
 
         include = request.query_params.get("include")
-        # Because we can't tell what "level" of inclusion we're at,
+        if not include:
+            return True
+        # Included resources are loaded in bulk by the renderer, from their IDs.
+        # Otherwise, because we can't tell what "level" of inclusion we're at,
         # the only safe thing we can do is to turn off the optimization
         # if the include parameter exists.
-        return not include
+        renderer = getattr(request, "accepted_renderer", None)
+        return getattr(renderer, "include_loader_class", None) is not None
 
     def get_serializer(self) -> Type[serializers.Serializer]:
         """Return the serializer for this related resource."""
@@ -102,15 +246,110 @@ class JSONAPIRelationshipField(serializers.PrimaryKeyRelatedField):
             return self.type
         return self.get_serializer().schema().type
 
+    def to_pks(self, data: Iterable[Any], queryset: Any) -> List[Any]:
+        """
+        Convert *incoming* IDs to the primary keys of the related model.
+
+        IDs are converted by the model's primary key field, so that IDs written
+        differently, like "01" for 1, still match. Without a model, they are
+        compared as strings.
+        """
+        data = list(data)
+        if self.pk_field is not None:
+            data = [self.pk_field.to_internal_value(pk) for pk in data]
+        model = getattr(queryset, "model", None)
+        pks = []
+        for pk in data:
+            if isinstance(pk, bool):
+                self.fail("incorrect_type", data_type=type(pk).__name__)
+            try:
+                pks.append(normalize_pk(model, pk))
+            except (DjangoValidationError, TypeError, ValueError):
+                self.fail("incorrect_type", data_type=type(pk).__name__)
+        return pks
+
+    def to_internal_value_many(self, data: Iterable[Any]) -> List[Any]:
+        """
+        Transform a list of *incoming* IDs into related instances using one query.
+
+        All IDs that don't exist are reported together.
+        """
+        queryset = self.get_queryset()
+        pks = self.to_pks(data, queryset)
+        if not pks:
+            return []
+
+        try:
+            if hasattr(queryset, "in_bulk"):
+                found = queryset.in_bulk(pks)
+            else:
+                found = {obj.pk: obj for obj in queryset.filter(pk__in=pks)}
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(pks[0]).__name__)
+
+        model = getattr(queryset, "model", None)
+        by_pk = {normalize_pk(model, pk): obj for pk, obj in found.items()}
+        self.check_exist(pks, by_pk)
+        return [by_pk[pk] for pk in pks]
+
+    def get_existing_pks(self, pks: List[Any]) -> List[Any]:
+        """
+        Verify that related resources exist, using one query.
+
+        The primary keys must already be converted by `to_pks()`.
+        """
+        if not pks:
+            return []
+        queryset = self.get_queryset()
+        model = getattr(queryset, "model", None)
+        found = {
+            normalize_pk(model, pk)
+            for pk in queryset.filter(pk__in=pks).values_list("pk", flat=True)
+        }
+        self.check_exist(pks, found)
+        return pks
+
+    def check_exist(self, pks: List[Any], found: Container[Any]) -> None:
+        """Report all of the primary keys that weren't found together."""
+        missing = [str(pk) for pk in pks if pk not in found]
+        if missing:
+            self.fail("does_not_exist_many", pk_values=", ".join(missing))
+
     def to_representation(self, value: Any) -> Any:
         """Transform the *outgoing* native value into primitive data."""
         id = super().to_representation(value)
-        serializer = self.get_serializer()
+        type = self.get_type()
+        identity_map = IdentityMap.for_request(self.context.get("request", None))
+        identifier = identity_map.get(type, id) if identity_map else None
+        if identifier is not None:
+            # The resource has been referenced before in this request.
+            if (
+                isinstance(identifier, ResourceIdField)
+                and isinstance(identifier.instance, PKOnlyObject)
+                and not isinstance(value, PKOnlyObject)
+            ):
+                identifier.instance = value
+            return identifier
 
+        serializer = self.get_serializer()
         if serializer:
             # Wrap this in our special ResourceIdField that can fetch and serialize
             # this included relation.
-            return ResourceIdField(serializer, value, id=id, type=self.get_type())
+            identifier = ResourceIdField(
+                serializer, value, self.context, self, id=id, type=type
+            )
         else:
             # If we don't have a serializer, we cannot include this relationship.
-            return ResourceIdObject(id=id, type=self.get_type())
+            identifier = ResourceIdObject(id=id, type=type)
+        return identity_map.add(identifier) if identity_map else identifier
+
+
+def normalize_pk(model: Any, pk: Any) -> Any:
+    """
+    Convert an ID to the primary key of a model, or to a string without one.
+
+    Raise ValidationError (Django's) if the ID isn't a valid primary key.
+    """
+    if model is None:
+        return str(pk)
+    return model._meta.pk.to_python(pk)
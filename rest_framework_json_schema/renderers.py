@@ -1,14 +1,47 @@
 """Renderers are used to serialize a response into specific media types."""
 
 import re
+import time
 from collections import OrderedDict
-from typing import Any, Dict, Optional, Mapping, List, Union, Tuple, Type
-
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Optional,
+    Mapping,
+    List,
+    Union,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from django.conf import settings
 from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import replace_query_param
 
+from .budgets import IncludeBudget, IncludeBudgetExceeded
 from .exceptions import NoSchema
-from .schema import Context, ResourceObject, ObjDataType, RenderResultType
-from .utils import parse_include
+from .helpers import JSONReturnLinkage
+from .includes import (
+    AsyncIncludeResolver,
+    IncludeLoader,
+    IncludeResolver,
+    sync_to_async,
+)
+from .metrics import MetricsHook
+from .queries import QueryDetector
+from .schema import (
+    Context,
+    ResourceObject,
+    ObjDataType,
+    RenderBatch,
+    RenderResultType,
+)
+from .timing import RenderDeadline, RenderTimer
+from .utils import parse_include, parse_relationship_modes
+
+T = TypeVar("T")
 
 RX_FIELDS = re.compile(r"^fields\[([a-zA-Z0-9\-_]+)\]$")
 
@@ -21,6 +54,24 @@ class JSONAPIRenderer(JSONRenderer):
     # You can specify top-level items here.
     meta: Optional[Dict[str, Any]] = None
     jsonapi: Optional[Any] = None
+    # Included resources are rendered breadth-first, with the resources of each
+    # type at each level loaded in bulk by the loader. Set the loader to None to
+    # render them depth-first, one by one.
+    include_loader_class: Optional[Type[IncludeLoader]] = IncludeLoader
+    include_resolver_class: Type[IncludeResolver] = IncludeResolver
+    # The resolver used when rendering asynchronously, with `arender()`.
+    async_include_resolver_class: Type[IncludeResolver] = AsyncIncludeResolver
+    async_includes = False
+    # Measures the phases of rendering, when the request asks for Server-Timing.
+    timer_class: Type[RenderTimer] = RenderTimer
+    # Receives the measurements of rendering, such as metrics.default_metrics.
+    metrics: Optional[MetricsHook] = None
+    # Attributes queries to include paths in DEBUG, to find N+1 queries.
+    query_detector_class: Type[QueryDetector] = QueryDetector
+    # The seconds to render a document in. Once they're nearly spent, included
+    # resources stop being expanded. Views can set their own `render_deadline`.
+    render_deadline: Optional[float] = None
+    deadline_class: Type[RenderDeadline] = RenderDeadline
 
     def render_obj(
         self,
@@ -53,24 +104,126 @@ class JSONAPIRenderer(JSONRenderer):
 
         return primary, included
 
+    def get_document_context(self, renderer_context: Mapping[str, Any]) -> Context:
+        """
+        Return the context of rendering a document.
+
+        It starts the document's timer and spends its own copy of the view's
+        include budget. The rest is added when the primary data is rendered.
+        """
+        request = renderer_context.get("request", None)
+        budget = self.get_include_budget(renderer_context)
+        return Context(
+            request,
+            timer=self.timer_class.for_request(request),
+            metrics=self.metrics,
+            budget=budget.for_document() if budget is not None else None,
+            started=time.perf_counter(),
+        )
+
     def render_data(
         self,
         data: Union[Dict, List],
         renderer_context: Mapping[str, Any],
         include: Dict,
+        context: Context,
     ) -> Tuple[Union[ObjDataType, List[ObjDataType], None], List[ObjDataType]]:
-        """Render primary data and included resources."""
+        """Render primary data and included resources, in the document's context."""
         schema = self.get_schema(data, renderer_context)
         assert schema, "Unable to get schema class"
-        fields = self.get_fields(renderer_context)
-        context = Context(renderer_context.get("request", None), include, fields)
-
+        if context.budget is not None:
+            context.budget.check_include(include)
+        seconds = self.get_render_deadline(renderer_context)
+        if seconds is not None:
+            context.deadline = self.deadline_class(seconds, context.started)
+        timer = context.timer
+        start = timer.start() if timer is not None else 0.0
+        context.include = include
+        context.fields = self.get_fields(renderer_context)
+        context.relationship_modes = self.get_relationship_modes(renderer_context)
+        context.batch = RenderBatch()
+        context.profiler = getattr(renderer_context.get("view"), "profiler", None)
+        if include:
+            context.resolver = self.get_include_resolver(context)
+        if timer is not None:
+            timer.stop("parse", start)
+
+        detector = self.query_detector_class.for_render()
+        if detector is None:
+            return self.render_resources(data, schema(), renderer_context, context)
+        context.detector = detector
+        with detector.watch():
+            return self.render_resources(data, schema(), renderer_context, context)
+
+    def render_resources(
+        self,
+        data: Union[Dict, List],
+        schema: ResourceObject,
+        renderer_context: Mapping[str, Any],
+        context: Context,
+    ) -> Tuple[Union[ObjDataType, List[ObjDataType], None], List[ObjDataType]]:
+        """Render the resources of primary data and included resources."""
+        timer = context.timer
+        start = timer.start() if timer is not None else 0.0
+        context.document_type = schema.type
+        result: Tuple[Union[ObjDataType, List[ObjDataType], None], List[ObjDataType]]
         if isinstance(data, dict):
-            return self.render_obj(data, schema(), renderer_context, context)
-
+            result = self.render_obj(data, schema, renderer_context, context)
         elif isinstance(data, list):
-            return self.render_list(data, schema(), renderer_context, context)
-        return None, []
+            result = self.render_list(data, schema, renderer_context, context)
+        else:
+            return None, []
+        if timer is not None:
+            timer.stop("render", start)
+            start = timer.start()
+
+        if context.resolver is not None:
+            result[1].extend(context.resolver.resolve())
+            if timer is not None:
+                timer.stop("include", start)
+                timer.add("load", sum(t[2] for t in context.resolver.timings))
+                start = timer.start()
+
+        # Links and meta are rendered once per type, for primary data and
+        # included resources alike.
+        if context.batch is not None:
+            context.batch.render(context)
+        if timer is not None:
+            timer.stop("links", start)
+            timer.count("included", len(result[1]))
+        return result
+
+    def get_debug_meta(self, context: Context) -> Dict[str, Any]:
+        """Return the meta of the document that is only rendered in DEBUG."""
+        if context.detector is None:
+            return {}
+        repeated_queries = context.detector.report()
+        if repeated_queries and settings.DEBUG:
+            return {"repeated_queries": repeated_queries}
+        return {}
+
+    def get_include_resolver(self, context: Context) -> Optional[IncludeResolver]:
+        """Return the resolver of included resources, or None to render them as found."""
+        if self.include_loader_class is None:
+            return None
+        resolver_class = (
+            self.async_include_resolver_class
+            if self.async_includes
+            else self.include_resolver_class
+        )
+        return resolver_class(self.include_loader_class(context))
+
+    def render_linkage(
+        self,
+        data: JSONReturnLinkage,
+        renderer_context: Mapping[str, Any],
+        context: Context,
+    ) -> ObjDataType:
+        """Render the resource linkage of a relationship endpoint."""
+        rendered, _included = data.relationship.render(
+            data.obj_data, data.rel_data, context, False
+        )
+        return rendered
 
     def render_exception(self, data: Any, renderer_context: Mapping[str, Any]) -> Any:
         """Render an exception result."""
@@ -113,6 +266,15 @@ class JSONAPIRenderer(JSONRenderer):
                     fields[m.group(1)] = value.split(",")
         return fields
 
+    def get_relationship_modes(
+        self, renderer_context: Mapping[str, Any]
+    ) -> Dict[str, Dict]:
+        """Return the parsed relationships parameters, if any exist."""
+        request = renderer_context.get("request", None)
+        if request:
+            return parse_relationship_modes(request.query_params)
+        return {}
+
     def render(
         self,
         data: Any,
@@ -127,7 +289,26 @@ class JSONAPIRenderer(JSONRenderer):
         if not renderer_context:
             return bytes()
 
-        to_include = self.get_include(renderer_context)
+        context = self.get_document_context(renderer_context)
+        try:
+            content = self.render_document(data, media_type, renderer_context, context)
+            if context.budget is not None:
+                context.budget.check_bytes(len(content))
+        except IncludeBudgetExceeded as exc:
+            return self.render_budget_exceeded(
+                exc, media_type, renderer_context, context
+            )
+        return content
+
+    def render_document(
+        self,
+        data: Any,
+        media_type: Optional[str],
+        renderer_context: Mapping[str, Any],
+        context: Context,
+    ) -> bytes:
+        """Render the document of `data`, returning a bytestring."""
+        to_include = self.timed(context, "parse", self.get_include, renderer_context)
         rendered: Dict[str, Any] = OrderedDict()
         if self.jsonapi:
             rendered["jsonapi"] = self.jsonapi
@@ -140,10 +321,18 @@ class JSONAPIRenderer(JSONRenderer):
 
         if self.is_exception(data, renderer_context):
             rendered["errors"] = self.render_exception(data, renderer_context)
+        elif isinstance(data, JSONReturnLinkage):
+            # A relationship endpoint: the document is a relationship object.
+            relationship = self.render_linkage(
+                data, renderer_context, Context(context.request)
+            )
+            rendered["data"] = relationship["data"]
+            links.update(relationship.get("links") or {})
+            meta.update(relationship.get("meta") or {})
         else:
             try:
                 rendered_data, included = self.render_data(
-                    data, renderer_context, to_include
+                    data, renderer_context, to_include, context
                 )
                 if rendered_data is not None:
                     rendered["data"] = rendered_data
@@ -154,19 +343,177 @@ class JSONAPIRenderer(JSONRenderer):
                 # primary data.
                 meta["data"] = data
 
-        data_meta = getattr(data, "meta", None)
-        if data_meta:
-            meta.update(data_meta)
-        data_links = getattr(data, "links", None)
-        if data_links:
-            links.update(data_links)
+        meta.update(getattr(data, "meta", None) or {})
+        links.update(getattr(data, "links", None) or {})
+        meta.update(self.get_debug_meta(context))
+        self.render_omitted(meta, links, renderer_context, context)
 
         if meta:
             rendered["meta"] = meta
         if links:
             rendered["links"] = links
 
-        return super().render(rendered, media_type, renderer_context)
+        return self.encode(rendered, media_type, renderer_context, context)
+
+    def get_render_deadline(
+        self, renderer_context: Mapping[str, Any]
+    ) -> Optional[float]:
+        """Return the seconds to render the document in, or None for no deadline."""
+        return getattr(
+            renderer_context.get("view"), "render_deadline", self.render_deadline
+        )
+
+    def render_omitted(
+        self,
+        meta: Dict[str, Any],
+        links: Dict[str, Any],
+        renderer_context: Mapping[str, Any],
+        context: Context,
+    ) -> None:
+        """
+        Add the include paths that were omitted because of the deadline to meta.
+
+        The link with the same name fetches the primary data again, including
+        only those paths.
+        """
+        if context.deadline is None or not context.deadline.omitted:
+            return
+        omitted = list(context.deadline.omitted)
+        meta["omittedIncludes"] = omitted
+        request = renderer_context.get("request", None)
+        if request is not None:
+            links["omittedIncludes"] = replace_query_param(
+                request.build_absolute_uri(), "include", ",".join(omitted)
+            )
+        if context.metrics is not None and context.document_type is not None:
+            for path in omitted:
+                context.metrics.observe_omitted(context.document_type, path)
+
+    def get_include_budget(
+        self, renderer_context: Mapping[str, Any]
+    ) -> Optional[IncludeBudget]:
+        """Return the include budget of the view, if it has one."""
+        return getattr(renderer_context.get("view"), "include_budget", None)
+
+    def render_budget_exceeded(
+        self,
+        exc: IncludeBudgetExceeded,
+        media_type: Optional[str],
+        renderer_context: Mapping[str, Any],
+        context: Context,
+    ) -> bytes:
+        """Render the error of an include budget that is exceeded, as a 400."""
+        response = renderer_context.get("response", None)
+        if response is not None:
+            response.status_code = exc.status_code
+        context.document_type = None
+        errors = self.render_exception({"detail": exc.detail}, renderer_context)
+        return self.encode(
+            OrderedDict((("errors", errors),)), media_type, renderer_context, context
+        )
+
+    def encode(
+        self,
+        rendered: Dict[str, Any],
+        media_type: Optional[str],
+        renderer_context: Mapping[str, Any],
+        context: Context,
+    ) -> bytes:
+        """Encode the rendered document as JSON."""
+        timer = context.timer
+        if timer is None and context.metrics is None:
+            return super().render(rendered, media_type, renderer_context)
+
+        start = time.perf_counter()
+        content = super().render(rendered, media_type, renderer_context)
+        if timer is not None:
+            timer.stop("encode", start)
+            timer.count("bytes", len(content))
+            self.render_timing(timer, renderer_context)
+        if context.metrics is not None:
+            self.observe_document(
+                context.metrics, rendered, content, renderer_context, context
+            )
+        return content
+
+    def observe_document(
+        self,
+        metrics: MetricsHook,
+        rendered: Dict[str, Any],
+        content: bytes,
+        renderer_context: Mapping[str, Any],
+        context: Context,
+    ) -> None:
+        """Report a rendered document of resources to the metrics."""
+        if context.document_type is None:
+            # Errors, relationship linkage, or data without a schema.
+            return
+        data = rendered.get("data")
+        resources = len(data) if isinstance(data, list) else int(data is not None)
+        included = len(rendered.get("included", ()))
+        metrics.observe_document(
+            context.document_type,
+            self.get_include_label(renderer_context),
+            time.perf_counter() - context.started,
+            resources + included,
+            included,
+            len(content),
+        )
+
+    def get_include_label(self, renderer_context: Mapping[str, Any]) -> str:
+        """
+        Return the include paths of the document, as a label of its metrics.
+
+        The label is built from the parsed include parameter, keeping only the
+        paths of relationships of the view's serializers, so that repeated or
+        unknown paths don't create new series. Paths are sorted, and only the
+        longest of those with the same start are kept.
+        """
+        get_serializer = getattr(renderer_context.get("view"), "get_serializer", None)
+        if get_serializer is None:
+            return ""
+        include = self.get_include(renderer_context)
+        paths = include_paths(get_serializer(), include) if include else []
+        return ",".join(sorted(paths))
+
+    def timed(
+        self, context: Context, phase: str, func: Callable[..., T], *args: Any
+    ) -> T:
+        """Call a function, adding its duration to a phase if rendering is timed."""
+        timer = context.timer
+        if timer is None:
+            return func(*args)
+        start = timer.start()
+        try:
+            return func(*args)
+        finally:
+            timer.stop(phase, start)
+
+    def render_timing(
+        self, timer: RenderTimer, renderer_context: Mapping[str, Any]
+    ) -> None:
+        """Add the measurements of rendering to the response's Server-Timing header."""
+        response = renderer_context.get("response", None)
+        if response is not None:
+            response["Server-Timing"] = timer.render_header()
+
+    async def arender(
+        self,
+        data: Any,
+        media_type: Optional[str] = None,
+        renderer_context: Optional[Mapping[str, Any]] = None,
+    ) -> bytes:
+        """
+        Render `data` into JSON API asynchronously, returning a bytestring.
+
+        The document is rendered in the request's thread, while the included
+        resources are loaded on the event loop. Without asgiref, it is
+        rendered synchronously.
+        """
+        self.async_includes = True
+        if sync_to_async is None:
+            return self.render(data, media_type, renderer_context)
+        return await sync_to_async(self.render)(data, media_type, renderer_context)
 
 
 class JSONAPITestRenderer(JSONRenderer):
@@ -180,3 +527,35 @@ class JSONAPITestRenderer(JSONRenderer):
 
     media_type: str = "application/vnd.api+json"
     format: str = "vnd.api+json"
+
+
+def include_paths(
+    serializer: Any, include: Dict[str, Dict], prefix: str = ""
+) -> List[str]:
+    """
+    Return the include paths that are relationships of a serializer's schema.
+
+    Relationships are followed through the serializers of their fields. Only
+    the paths that don't continue are returned, as they imply the others.
+    """
+    schema = getattr(serializer, "schema", None)
+    fields = getattr(serializer, "fields", None)
+    if schema is None or fields is None:
+        return []
+    relationships = dict(schema().norm_relationships)
+    paths = []
+    for (name, children) in include.items():
+        field = fields.get(name)
+        if field is None or name not in relationships:
+            continue
+        path = prefix + name
+        field = getattr(field, "child_relation", field)
+        get_serializer = getattr(field, "get_serializer", None)
+        related = get_serializer() if get_serializer is not None else None
+        child_paths = (
+            include_paths(related(), children, path + ".")
+            if children and related is not None
+            else []
+        )
+        paths.extend(child_paths or [path])
+    return paths
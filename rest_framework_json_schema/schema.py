@@ -5,7 +5,11 @@ They provide a DRF-independent way of defining a JSON API resource,
 which can be then used by DRF-serialized data to generate a JSON API response.
 """
 
+import copy
+import time
 from collections import OrderedDict
+from functools import lru_cache
+from operator import attrgetter, itemgetter
 from typing import (
     Any,
     Optional,
@@ -18,21 +22,58 @@ from typing import (
     Type,
     cast,
     Iterator,
+    Mapping,
     overload,
 )
 
 from django.urls import reverse
+from rest_framework.exceptions import ParseError
 from rest_framework.request import Request
+from rest_framework.utils.urls import replace_query_param
 
 from .exceptions import TypeConflict, IncludeInvalid
 from .transforms import NullTransform, Transform
 
 # This is the type that can be specified by subclasses
+AttrOptType = Union[str, Tuple[str, Union[str, Callable[[Any], Any]]]]
 RelOptType = Union[str, Tuple[str, "RelationshipObject"]]
 # This is the normalized type we set in the constructor
 RelType = Tuple[str, "RelationshipObject"]
 ObjDataType = Dict[str, Any]
 RenderResultType = Tuple[Dict[str, Any], List[Dict[str, Any]]]
+GetterType = Callable[[Any], Any]
+
+
+@lru_cache(maxsize=1024)
+def compile_source(source: Union[str, Callable[[Any], Any]]) -> GetterType:
+    """
+    Compile the source of an attribute into a function that gets it from data.
+
+    A source is a callable that takes the data, or a key, or a dotted path of
+    keys. Keys are looked up in dicts, and as attributes of other objects, such
+    as model instances. The path is compiled into operator.itemgetter() and
+    attrgetter() calls, so it is only parsed once.
+    """
+    if callable(source):
+        return source
+
+    path = source.split(".")
+    get_attr = attrgetter(source)
+    get_item: GetterType
+    if len(path) == 1:
+        get_item = itemgetter(source)
+    else:
+        items = [itemgetter(key) for key in path]
+
+        def get_item(data: Any) -> Any:
+            for item in items:
+                data = item(data)
+            return data
+
+    def getter(data: Any) -> Any:
+        return get_item(data) if isinstance(data, dict) else get_attr(data)
+
+    return getter
 
 
 class Context:
@@ -43,11 +84,57 @@ class Context:
         request: Request,
         include: Optional[Dict] = None,
         fields: Optional[Dict] = None,
+        related_types: Optional[Dict[str, str]] = None,
+        relationship_modes: Optional[Dict[str, Dict]] = None,
+        relationship_mode: str = "linkage",
+        batch: Optional["RenderBatch"] = None,
+        resolver: Any = None,
+        timer: Any = None,
+        metrics: Any = None,
+        path: Tuple[str, ...] = (),
+        detector: Any = None,
+        profiler: Any = None,
+        budget: Any = None,
+        deadline: Any = None,
+        started: float = 0.0,
     ) -> None:
         """Create an object."""
         self.request = request
         self.include = include or {}
         self.fields = fields or {}
+        # The expected JSON API type of each relationship, used to validate
+        # resource linkage when parsing.
+        self.related_types = related_types or {}
+        # The relationship modes requested by the client for each type, and
+        # the mode of the relationship being rendered.
+        self.relationship_modes = relationship_modes or {}
+        self.relationship_mode = relationship_mode
+        # Collects the resource objects of a document, to render their links and
+        # meta in batches. Without it, they are rendered one by one.
+        self.batch = batch
+        # Renders included resources breadth-first, loading them in bulk (see
+        # includes.IncludeResolver). Without it, they are rendered depth-first.
+        self.resolver = resolver
+        # Measures the phases of rendering (see timing.RenderTimer), or None.
+        self.timer = timer
+        # Receives the measurements of rendering (see metrics.MetricsHook), or None.
+        self.metrics = metrics
+        # The relationship names from the primary data to the resources rendered.
+        self.path = path
+        # Attributes queries to include paths (see queries.QueryDetector), or None.
+        self.detector = detector
+        # Labels the rendering of resource objects by type in a profile (see
+        # profiling.RequestProfiler), or None.
+        self.profiler = profiler
+        # Limits the included resources (see budgets.IncludeBudget), or None.
+        self.budget = budget
+        # Stops expanding included resources when it's near (see
+        # timing.RenderDeadline), or None.
+        self.deadline = deadline
+        # When rendering of the document started, from time.perf_counter(), and
+        # the type of its primary data, or None, for the metrics.
+        self.started = started
+        self.document_type: Optional[str] = None
 
 
 class BaseLinkedObject:
@@ -73,6 +160,69 @@ class BaseLinkedObject:
         """
         return self.meta
 
+    def render_links_many(
+        self, data: Sequence[Any], context: Context
+    ) -> Sequence[OrderedDict]:
+        """
+        Render the links of many objects at once, in the same order.
+
+        By default, this calls `render_links()` for each object. Implement this in
+        your subclass if links need a query, so it can be made once for all
+        the objects.
+        """
+        return [self.render_links(obj, context) for obj in data]
+
+    def render_meta_many(
+        self, data: Sequence[Any], context: Context
+    ) -> Sequence[Optional[Dict]]:
+        """
+        Render the metadata of many objects at once, in the same order.
+
+        By default, this calls `render_meta()` for each object. Implement this in
+        your subclass if metadata needs a query, such as per-user permissions,
+        so it can be made once for all the objects.
+        """
+        return [self.render_meta(obj, context) for obj in data]
+
+
+class RenderBatch:
+    """
+    Render the links and meta of the resource objects of a document in batches.
+
+    Resource objects are collected while the document is rendered, and
+    `render()` then calls `render_links_many()` and `render_meta_many()`
+    once per resource type and schema class, with all of the objects of that
+    type, including included resources. Schemas of the same type can render
+    different links and meta, so they are batched apart. The results are added
+    to the rendered objects.
+    """
+
+    def __init__(self) -> None:
+        """Create an object."""
+        # (schema, [(rendered object, data)]), by type and schema class
+        self.pending: Dict[
+            Tuple[str, Type["ResourceObject"]],
+            Tuple["ResourceObject", List[Tuple[Dict, Any]]],
+        ] = OrderedDict()
+
+    def add(self, schema: "ResourceObject", result: Dict, data: Any) -> None:
+        """Add a rendered resource object."""
+        key = (schema.type, type(schema))
+        self.pending.setdefault(key, (schema, []))[1].append((result, data))
+
+    def render(self, context: Context) -> None:
+        """Render the links and meta of all of the collected resource objects."""
+        pending, self.pending = self.pending, OrderedDict()
+        for (schema, objects) in pending.values():
+            data = [obj_data for (_result, obj_data) in objects]
+            all_links = schema.render_links_many(data, context)
+            all_meta = schema.render_meta_many(data, context)
+            for ((result, _data), links, meta) in zip(objects, all_links, all_meta):
+                if links:
+                    result["links"] = links
+                if meta:
+                    result["meta"] = meta
+
 
 class ResourceObject(BaseLinkedObject):
     """
@@ -86,10 +236,15 @@ class ResourceObject(BaseLinkedObject):
     type: str = "unknown"
 
     # OPTIONAL members
-    attributes: Sequence[str] = ()
+    # Attributes are names, or (name, source) tuples, where the source is a
+    # dotted path or a callable. See compile_source().
+    attributes: Sequence[AttrOptType] = ()
     relationships: Sequence[RelOptType] = ()
     transformer: Type[Transform] = NullTransform
+    # The attributes that clients can sort by
+    sortable: Sequence[str] = ()
 
+    norm_attributes: Sequence[str]
     norm_relationships: Sequence[RelType]
 
     def __init__(self, **kwargs: Any) -> None:
@@ -97,9 +252,28 @@ class ResourceObject(BaseLinkedObject):
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+        # Normalize the attributes array to their names, and compile their sources.
+        self.attribute_sources: Dict[str, Any] = {}
+        names = []
+        for attr in self.attributes:
+            if isinstance(attr, str):
+                names.append(attr)
+            else:
+                names.append(attr[0])
+                self.attribute_sources[attr[0]] = attr[1]
+        self.attributes = self.norm_attributes = names
+        self.getters: Dict[str, GetterType] = {
+            name: compile_source(self.attribute_sources.get(name, name))
+            for name in names
+        }
+        # Without sources, all of the attributes of a dict can be fetched at once.
+        self.get_all_attributes: Optional[GetterType] = None
+        if len(names) > 1 and not self.attribute_sources:
+            self.get_all_attributes = itemgetter(*names)
+
         self.transformed_names: Dict[str, str] = {}
         transformer = self.transformer()
-        for name in self.attributes:
+        for name in self.norm_attributes:
             self.transformed_names[name] = transformer.transform(name)
 
         # Normalize the relationships array to always be a tuple of (name, relobj)
@@ -133,7 +307,7 @@ class ResourceObject(BaseLinkedObject):
             result.update(
                 {
                     attr: attributes[self.transformed_names[attr]]
-                    for attr in self.attributes
+                    for attr in self.norm_attributes
                     if self.transformed_names[attr] in attributes
                 }
             )
@@ -141,8 +315,8 @@ class ResourceObject(BaseLinkedObject):
         if relationships:
             result.update(
                 {
-                    name: rel.parse(
-                        relationships[self.transformed_names[name]], context
+                    name: self.parse_relationship(
+                        relationships[self.transformed_names[name]], name, rel, context
                     )
                     for (name, rel) in self.norm_relationships
                     if self.transformed_names[name] in relationships
@@ -150,38 +324,134 @@ class ResourceObject(BaseLinkedObject):
             )
         return result
 
-    def render(self, data: ObjDataType, context: Context) -> RenderResultType:
-        """Render data to a Resource Object representation."""
-        result: Dict[str, Dict] = OrderedDict(
-            (("id", str(data[self.id])), ("type", self.type))  # type: ignore
-        )
-        attributes = self.render_attributes(data, context)
-        if attributes:
-            result["attributes"] = attributes
+    def parse_relationship(
+        self,
+        data: ObjDataType,
+        rel_name: str,
+        rel: "RelationshipObject",
+        context: Context,
+    ) -> Any:
+        """
+        Parse a single relationship.
 
-        relationships, included = self.render_relationships(data, context)
-        if relationships:
-            result["relationships"] = relationships
+        The relationship must be an object, whose resource linkage is null, a
+        resource identifier object or a list of them, or ParseError is raised. If the context
+        knows the type of the related resource, every member of the resource
+        linkage is verified to be of that type.
+        """
+        if not isinstance(data, Mapping):
+            raise ParseError("Relationship %s must be an object." % rel_name)
+        linkage = data.get("data")
+        if isinstance(linkage, Mapping):
+            linkage = [linkage]
+        elif linkage is None:
+            linkage = []
+        if not isinstance(linkage, list) or not all(
+            isinstance(obj, Mapping) and "id" in obj for obj in linkage
+        ):
+            raise ParseError(
+                "The resource linkage of relationship %s must be null, an "
+                "identifier object or a list of them." % rel_name
+            )
+        related_type = context.related_types.get(rel_name)
+        if related_type:
+            for obj in linkage:
+                if obj.get("type") != related_type:
+                    raise TypeConflict(
+                        "type %s is not the correct type for relationship %s"
+                        % (obj.get("type"), rel_name)
+                    )
+        return rel.parse(data, context)
 
-        links = self.render_links(data, context)
-        if links:
-            result["links"] = links
+    def render(self, data: Any, context: Context) -> RenderResultType:
+        """
+        Render data to a Resource Object representation.
 
-        meta = self.render_meta(data, context)
-        if meta:
-            result["meta"] = meta
+        The data is usually a dict, but it can be any object with attributes.
+        """
+        if context.profiler is not None:
+            return context.profiler.call(
+                "render[%s]" % self.type, self.render_resource, data, context
+            )
+        return self.render_resource(data, context)
+
+    def render_resource(self, data: Any, context: Context) -> RenderResultType:
+        """Render data to a Resource Object representation, see `render()`."""
+        start = time.perf_counter() if context.metrics is not None else 0.0
+        if context.detector is not None:
+            context.detector.enter(".".join(context.path), self.type)
+        try:
+            result: Dict[str, Any] = OrderedDict(
+                (("id", str(self.from_data(data, self.id))), ("type", self.type))
+            )
+            if context.timer is not None:
+                context.timer.count("resources")
+            if context.batch is not None:
+                # Links and meta are added by the batch, after the whole document.
+                context.batch.add(self, result, data)
+
+            attributes = self.render_attributes(data, context)
+            if attributes:
+                result["attributes"] = attributes
+
+            relationships, included = self.render_relationships(data, context)
+            if relationships:
+                result["relationships"] = relationships
+
+            if context.batch is None:
+                links = self.render_links(data, context)
+                if links:
+                    result["links"] = links
+
+                meta = self.render_meta(data, context)
+                if meta:
+                    result["meta"] = meta
+
+            if context.metrics is not None:
+                context.metrics.observe_resource(
+                    self.type, ".".join(context.path), time.perf_counter() - start
+                )
+        finally:
+            # Queries are attributed to the parent again, even after an error.
+            if context.detector is not None:
+                context.detector.exit()
         return result, included
 
-    def render_attributes(self, data: Dict, context: Context) -> ObjDataType:
-        """Render model attributes to the output type."""
-        attributes = self.filter_by_fields(self.attributes, context.fields, lambda x: x)
-        return OrderedDict(
-            (self.transformed_names[attr], self.from_data(data, attr))
-            for attr in attributes
-            if attr in data
-        )
+    def render_attributes(self, data: Any, context: Context) -> ObjDataType:
+        """
+        Render model attributes to the output type.
+
+        Attributes that are missing from the data aren't rendered.
+        """
+        if (
+            self.get_all_attributes is not None
+            and self.type not in context.fields
+            and isinstance(data, dict)
+        ):
+            try:
+                values = self.get_all_attributes(data)
+            except KeyError:
+                pass
+            else:
+                return OrderedDict(
+                    zip(
+                        (self.transformed_names[a] for a in self.norm_attributes),
+                        values,
+                    )
+                )
 
-    def render_relationships(self, data: Dict, context: Context) -> RenderResultType:
+        result: ObjDataType = OrderedDict()
+        for attr in self.filter_by_fields(
+            self.norm_attributes, context.fields, lambda x: x
+        ):
+            try:
+                value = self.getters[attr](data)
+            except (KeyError, AttributeError):
+                continue
+            result[self.transformed_names[attr]] = value
+        return result
+
+    def render_relationships(self, data: Any, context: Context) -> RenderResultType:
         """Render model relationships to the output type, including included resources."""
         relationships: Dict[str, Dict] = OrderedDict()
         included = []
@@ -195,7 +465,7 @@ class ResourceObject(BaseLinkedObject):
             cast(Sequence[RelType], self.relationships), context.fields, lambda x: x[0]
         )
         # Filter by missing values in the data
-        filtered = (rel for rel in filtered if rel[0] in data)
+        filtered = (rel for rel in filtered if self.has_data(data, rel[0]))
         for (name, rel) in filtered:
             relationship, rel_included = self.render_relationship(
                 data, name, rel, context
@@ -206,23 +476,59 @@ class ResourceObject(BaseLinkedObject):
         return relationships, included
 
     def render_relationship(
-        self, data: Dict, rel_name: str, rel: "RelationshipObject", context: Context
+        self, data: Any, rel_name: str, rel: "RelationshipObject", context: Context
     ) -> RenderResultType:
         """Render a single relationship, including any included resources."""
         # This relationship is included if rel_name is in the include paths.
         include_this = rel_name in context.include
         # Create a new context by going one level deeper into the include paths.
         rel_context = Context(
-            context.request, context.include.get(rel_name, {}), context.fields
+            context.request,
+            context.include.get(rel_name, {}),
+            context.fields,
+            relationship_modes=context.relationship_modes,
+            relationship_mode=self.get_relationship_mode(
+                rel_name, rel, context.relationship_modes
+            ),
+            batch=context.batch,
+            resolver=context.resolver,
+            timer=context.timer,
+            metrics=context.metrics,
+            path=context.path + (rel_name,),
+            detector=context.detector,
+            profiler=context.profiler,
+            budget=context.budget,
+            deadline=context.deadline,
         )
         rel_data = self.from_data(data, rel_name)
         return rel.render(data, rel_data, rel_context, include_this)
 
-    def from_data(self, data: Dict, attr: str) -> Any:
-        """Get an attribute from a data dictionary."""
-        # This is easy for now, but eventually we want to be able to specify
-        # functions and the like
-        return data[attr]
+    def get_relationship_mode(
+        self, rel_name: str, rel: "RelationshipObject", modes: Dict[str, Dict]
+    ) -> str:
+        """
+        Return the mode of a relationship, which the client may choose.
+
+        A relationship without links can't be rendered in "links" mode, as it
+        would be empty.
+        """
+        mode = modes.get(self.type, {}).get(self.transformed_names[rel_name], rel.mode)
+        if mode not in rel.modes or (mode == "links" and not rel.links):
+            return rel.mode
+        return mode
+
+    def from_data(self, data: Any, attr: str) -> Any:
+        """Get an attribute from data, using its source."""
+        getter = self.getters.get(attr)
+        if getter is None:
+            getter = compile_source(attr)
+        return getter(data)
+
+    def has_data(self, data: Any, attr: str) -> bool:
+        """Return whether a relationship is in the data."""
+        if isinstance(data, dict):
+            return attr in data
+        return hasattr(data, attr)
 
     @overload
     def filter_by_fields(
@@ -296,6 +602,59 @@ class ResourceIdObject(BaseLinkedObject):
         raise IncludeInvalid()
 
 
+class IdentityMap:
+    """
+    The resource identifiers of a request, by type and ID.
+
+    The same related resource is usually referenced many times in a document,
+    such as the artist of many albums. Rather than creating, rendering and loading
+    a new identifier for each reference, relationship fields and objects share
+    them through the identity map of the request.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty identity map."""
+        self.identifiers: Dict[Tuple[str, str], "ResourceIdObject"] = {}
+        self.linkage: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    @classmethod
+    def for_request(cls, request: Optional[Request]) -> Optional["IdentityMap"]:
+        """Return the identity map of a request, or None without a request."""
+        if request is None:
+            return None
+        identity_map = getattr(request, "_jsonapi_identity_map", None)
+        if identity_map is None:
+            identity_map = cls()
+            setattr(request, "_jsonapi_identity_map", identity_map)
+        return identity_map
+
+    def get(self, type: str, id: Any) -> Optional["ResourceIdObject"]:
+        """Return the identifier of a resource, if it's known."""
+        return self.identifiers.get((type, str(id)))
+
+    def add(self, identifier: "ResourceIdObject") -> "ResourceIdObject":
+        """Add an identifier, returning the known one of its resource if any."""
+        return self.identifiers.setdefault(
+            (identifier.type, str(identifier.id)), identifier
+        )
+
+    def render(self, identifier: "ResourceIdObject", request: Request) -> Dict:
+        """
+        Return the linkage of a resource, rendering it once.
+
+        Each reference gets its own copy, so changing it, such as adding meta,
+        doesn't change the others.
+        """
+        key = (identifier.type, str(identifier.id))
+        linkage = self.linkage.get(key)
+        if linkage is None:
+            linkage = self.linkage[key] = identifier.render(request)
+        result = OrderedDict(linkage)
+        if "meta" in result:
+            result["meta"] = copy.deepcopy(result["meta"])
+        return result
+
+
 class RelationshipObject(BaseLinkedObject):
     """
     Represents a JSON API Relationship Object.
@@ -303,20 +662,109 @@ class RelationshipObject(BaseLinkedObject):
     https://jsonapi.org/format/#document-resource-object-relationships
     """
 
+    # How the relationship is rendered:
+    # * "linkage": The resource linkage, with any included resources.
+    # * "count": Only the number of members, in `meta`.
+    # * "links": Only the links.
+    mode: str = "linkage"
+    # The modes that clients can choose with the relationships[TYPE] parameter.
+    modes: Sequence[str] = ("linkage", "count", "links")
+    # The maximum number of members of a to-many relationship to render as
+    # resource linkage and include. None renders every member.
+    linkage_limit: Optional[int] = None
+    # The expected number of members of a to-many relationship, to estimate the
+    # cost of including it (see budgets.IncludeBudget). None uses linkage_limit.
+    cardinality: Optional[int] = None
+    limit_query_param = "limit"
+    offset_query_param = "offset"
+
     def __init__(self, **kwargs: Any) -> None:
         """Create an object."""
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+    def limit_linkage(self, rel_data: Sequence[Any]) -> Tuple[List[Any], int]:
+        """
+        Return the members of a to-many relationship to render, and the total.
+
+        The members are capped at `linkage_limit`. Relationship fields may
+        already have fetched a limited number of members, in which case the data
+        has a `total` attribute with the number of all the members.
+        """
+        members = list(rel_data)
+        total = getattr(rel_data, "total", None)
+        if total is None:
+            total = len(members)
+        if self.linkage_limit is not None:
+            members = members[: self.linkage_limit]
+        return members, total
+
+    def render_pagination_links(
+        self, links: Dict[str, Any], count: int
+    ) -> Dict[str, Any]:
+        """
+        Render the links to the rest of the members of a limited relationship.
+
+        The `page[next]` link points to the second page of the relationship endpoint,
+        and `related[next]` to the second page of the related resource endpoint,
+        if the relationship has these links.
+        """
+        result = OrderedDict()
+        for (link_name, page_name) in (
+            ("self", "page[next]"),
+            ("related", "related[next]"),
+        ):
+            url = links.get(link_name)
+            if isinstance(url, str):
+                url = replace_query_param(url, self.limit_query_param, count)
+                url = replace_query_param(url, self.offset_query_param, count)
+                result[page_name] = url
+        return result
+
+    def render_identifier(
+        self, rel_data: "ResourceIdObject", context: Context
+    ) -> Dict[str, Any]:
+        """Render the linkage of a member, shared by the request's references to it."""
+        identity_map = IdentityMap.for_request(context.request)
+        if identity_map is None:
+            return rel_data.render(context.request)
+        return identity_map.render(rel_data, context.request)
+
     def render_included(
         self, rel_data: "ResourceIdObject", context: Context
     ) -> List[Dict[str, Any]]:
         """Render included resources."""
+        if context.deadline is not None and context.deadline.is_near():
+            context.deadline.omit(".".join(context.path))
+            return []
+        if context.budget is not None:
+            context.budget.include_resource(rel_data.type, rel_data.id)
+        if context.resolver is not None:
+            # The resolver renders it later, with the other resources of its level.
+            context.resolver.add(rel_data, context)
+            return []
         # This recursively calls the resource's schema to render the full object.
         schema = rel_data.get_schema()
-        obj, included = schema.render(rel_data.get_data(), context)
+        if context.detector is None:
+            data = rel_data.get_data()
+        else:
+            with context.detector.scope(".".join(context.path), schema.type):
+                data = rel_data.get_data()
+        obj, included = schema.render(data, context)
         return [obj] + included
 
+    def render_timed_links(
+        self, obj_data: ObjDataType, context: Context
+    ) -> OrderedDict:
+        """Render the links, measuring them if rendering is timed."""
+        timer = context.timer
+        if timer is None:
+            return self.render_links(obj_data, context)
+        start = timer.start()
+        links = self.render_links(obj_data, context)
+        timer.stop("links", start)
+        return links
+
     def render(
         self,
         obj_data: ObjDataType,
@@ -327,29 +775,55 @@ class RelationshipObject(BaseLinkedObject):
         """Render object to JSON data."""
         result: ObjDataType = OrderedDict()
         included: List[ObjDataType] = []
-
-        if not rel_data:
+        total = 0
+        mode = context.relationship_mode
+
+        if mode == "count":
+            # No linkage is rendered, but data may have counted the members.
+            if isinstance(rel_data, ResourceIdObject):
+                total = 1
+            elif rel_data:
+                _members, total = self.limit_linkage(rel_data)
+            else:
+                total = getattr(rel_data, "total", 0)
+        elif mode == "links":
+            pass
+        elif not rel_data:
             # None or []
             result["data"] = rel_data
         elif isinstance(rel_data, ResourceIdObject):
-            result["data"] = rel_data.render(context.request)
+            result["data"] = self.render_identifier(rel_data, context)
             if include_this:
                 included.extend(self.render_included(rel_data, context))
         else:
             # Probably a list of resource objects
+            members, total = self.limit_linkage(rel_data)
             if include_this:
                 result["data"] = []
-                for obj in rel_data:
-                    result["data"].append(obj.render(context.request))
+                for obj in members:
+                    result["data"].append(self.render_identifier(obj, context))
                     included.extend(self.render_included(obj, context))
             else:
-                result["data"] = [obj.render(context.request) for obj in rel_data]
+                result["data"] = [
+                    self.render_identifier(obj, context) for obj in members
+                ]
+
+        if include_this and context.metrics is not None:
+            data = result.get("data")
+            members = len(data) if isinstance(data, list) else int(data is not None)
+            context.metrics.observe_included(".".join(context.path), members)
+        links = self.render_timed_links(obj_data, context)
+        meta = self.render_meta(obj_data, context)
+        if mode == "count":
+            meta = OrderedDict(meta or ())
+            meta["count"] = total
+        elif isinstance(result.get("data"), list) and total > len(result["data"]):
+            links.update(self.render_pagination_links(links, len(result["data"])))
+            meta = OrderedDict(meta or ())
+            meta["count"] = total
 
-        links = self.render_links(obj_data, context)
         if links:
             result["links"] = links
-
-        meta = self.render_meta(obj_data, context)
         if meta:
             result["meta"] = meta
         return result, included
@@ -0,0 +1,138 @@
+"""
+Measure the cost of rendering JSON API responses in tests, and check it against budgets.
+
+The pytest plugin in `rest_framework_json_schema.pytest_plugin` adds a
+`perf_snapshots` fixture and an `--update-perf-snapshots` option.
+"""
+
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from django.db import connections
+from django.http.response import HttpResponseBase
+from django.test.utils import CaptureQueriesContext
+
+
+class RenderCost:
+    """The cost of handling and rendering a request."""
+
+    fields = ("queries", "resources", "included", "size")
+
+    def __init__(self, queries: int, resources: int, included: int, size: int) -> None:
+        """
+        Create a cost.
+
+        :param queries: The number of database queries.
+        :param resources: The number of resources in the document, included or not.
+        :param included: The number of included resources.
+        :param size: The size of the document in bytes.
+        """
+        self.queries = queries
+        self.resources = resources
+        self.included = included
+        self.size = size
+
+    def as_dict(self) -> Dict[str, int]:
+        """Return the cost by field."""
+        return OrderedDict((field, getattr(self, field)) for field in self.fields)
+
+    def over_budget(self, budget: Mapping[str, Optional[int]]) -> List[str]:
+        """Return a description of each field over its budget."""
+        over = []
+        for field in self.fields:
+            limit = budget.get(field)
+            if limit is not None and getattr(self, field) > limit:
+                over.append("%s: %d > %d" % (field, getattr(self, field), limit))
+        return over
+
+    def __repr__(self) -> str:
+        """Return the cost by field."""
+        return "RenderCost(%s)" % ", ".join(
+            "%s=%d" % item for item in self.as_dict().items()
+        )
+
+
+def measure(
+    view: Callable[..., HttpResponseBase],
+    request: Any,
+    *args: Any,
+    using: str = "default",
+    **kwargs: Any
+) -> Tuple[HttpResponseBase, RenderCost]:
+    """Handle a request with a view and render the response, measuring the cost."""
+    with CaptureQueriesContext(connections[using]) as queries:
+        response = view(request, *args, **kwargs)
+        render = getattr(response, "render", None)
+        if render is not None:
+            response = render()
+    content = json.loads(response.content) if response.content else {}
+    data = content.get("data")
+    included = len(content.get("included", ()))
+    resources = len(data) if isinstance(data, list) else int(data is not None)
+    return (
+        response,
+        RenderCost(len(queries), resources + included, included, len(response.content)),
+    )
+
+
+def assert_within_budget(
+    cost: RenderCost,
+    queries: Optional[int] = None,
+    resources: Optional[int] = None,
+    included: Optional[int] = None,
+    size: Optional[int] = None,
+) -> None:
+    """Fail if a cost is over any of the given budgets."""
+    over = cost.over_budget(
+        {"queries": queries, "resources": resources, "included": included, "size": size}
+    )
+    assert not over, "Over budget: %s" % ", ".join(over)
+
+
+class PerfSnapshots:
+    """
+    Budgets of render costs, recorded in a JSON file.
+
+    `check()` fails if a cost is over its recorded budget. When updating, costs
+    are recorded as the new budgets instead, and saved by `save()`.
+    """
+
+    def __init__(self, path: str, update: bool = False) -> None:
+        """Load the budgets of a snapshot file, if it exists."""
+        self.path = path
+        self.update = update
+        self.changed = False
+        self.budgets: Dict[str, Dict[str, int]] = OrderedDict()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.budgets.update(json.load(f))
+
+    def check(self, name: str, cost: RenderCost) -> None:
+        """Check a cost against its budget, or record it when updating."""
+        if self.update:
+            if self.budgets.get(name) != cost.as_dict():
+                self.budgets[name] = cost.as_dict()
+                self.changed = True
+            return
+
+        budget = self.budgets.get(name)
+        assert (
+            budget is not None
+        ), "No budget for %r in %s, run pytest with --update-perf-snapshots" % (
+            name,
+            self.path,
+        )
+        over = cost.over_budget(budget)
+        assert not over, "%s over budget: %s" % (name, ", ".join(over))
+
+    def save(self) -> None:
+        """Save the budgets, if they were updated."""
+        if not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.budgets, f, indent=2, sort_keys=True)
+            f.write("\n")
+        self.changed = False
@@ -0,0 +1,108 @@
+"""
+Measure the phases of rendering a document, for the Server-Timing header.
+
+https://www.w3.org/TR/server-timing/
+
+Also limit the time spent rendering a document, with a deadline.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from django.conf import settings
+from rest_framework.request import Request
+
+
+class RenderTimer:
+    """
+    Accumulate the durations of the phases of rendering a document, and counts.
+
+    Phases can be measured several times, such as the links of each relationship,
+    and their durations add up. Some phases are part of others: the links of
+    relationships are rendered while rendering the resources.
+
+    Rendering isn't timed unless the request asks for it (see `for_request()`),
+    in which case the timer is set on the render Context. Otherwise the Context
+    has no timer, and the only cost is checking for it.
+    """
+
+    # The Django setting that enables timing for all requests.
+    setting = "JSON_API_SERVER_TIMING"
+    # The request header that enables timing for a staff user's request.
+    header = "HTTP_X_SERVER_TIMING"
+
+    def __init__(self) -> None:
+        """Create a timer with no measurements."""
+        self.durations: Dict[str, float] = OrderedDict()
+        self.counts: Dict[str, int] = OrderedDict()
+
+    @classmethod
+    def for_request(cls, request: Optional[Request]) -> Optional["RenderTimer"]:
+        """Return a timer if rendering the response to a request is timed."""
+        if getattr(settings, cls.setting, False):
+            return cls()
+        if request is None or not request.META.get(cls.header):
+            return None
+        user = getattr(request, "user", None)
+        if user is not None and user.is_staff:
+            return cls()
+        return None
+
+    def start(self) -> float:
+        """Return the start time of a measurement."""
+        return time.perf_counter()
+
+    def stop(self, phase: str, start: float) -> None:
+        """Add the duration since a start time to a phase."""
+        self.add(phase, time.perf_counter() - start)
+
+    def add(self, phase: str, duration: float) -> None:
+        """Add a duration, in seconds, to a phase."""
+        self.durations[phase] = self.durations.get(phase, 0.0) + duration
+
+    def count(self, name: str, number: int = 1) -> None:
+        """Add to a count, such as the number of resources rendered."""
+        self.counts[name] = self.counts.get(name, 0) + number
+
+    def render_header(self) -> str:
+        """Render the durations, in milliseconds, and counts as a Server-Timing value."""
+        metrics = [
+            "%s;dur=%.3f" % (phase, duration * 1000)
+            for (phase, duration) in self.durations.items()
+        ]
+        metrics.extend(
+            '%s;desc="%d"' % (name, number) for (name, number) in self.counts.items()
+        )
+        return ", ".join(metrics)
+
+
+class RenderDeadline:
+    """
+    The time by which a document should be rendered.
+
+    Once the deadline is near, relationships stop expanding their included
+    resources, and the include paths they would have expanded are kept in
+    `omitted`. Primary data is always rendered in full, so the deadline can be
+    passed, but the document stops growing.
+
+    The deadline is near once less than `margin` of its time is left, which is
+    kept to finish rendering the document.
+    """
+
+    margin = 0.1
+
+    def __init__(self, seconds: float, start: Optional[float] = None) -> None:
+        """Create a deadline, some seconds after the start of rendering."""
+        if start is None:
+            start = time.perf_counter()
+        self.expires = start + seconds * (1 - self.margin)
+        self.omitted: Dict[str, None] = OrderedDict()
+
+    def is_near(self) -> bool:
+        """Return whether included resources should no longer be expanded."""
+        return time.perf_counter() >= self.expires
+
+    def omit(self, path: str) -> None:
+        """Record an include path whose resources weren't expanded."""
+        self.omitted[path] = None
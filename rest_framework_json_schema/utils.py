@@ -1,6 +1,13 @@
 """Common utilities and helper functions."""
 
-from typing import Dict
+import copy
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+RX_RELATIONSHIPS = re.compile(r"^relationships\[([a-zA-Z0-9\-_]+)\]$")
 
 
 def parse_include(include: str) -> Dict[str, Dict]:
@@ -35,3 +42,104 @@ def parse_include(include: str) -> Dict[str, Dict]:
                     level[c] = {}
                 level = level[c]
     return result
+
+
+def parse_relationship_modes(query_params: Mapping[str, str]) -> Dict[str, Dict]:
+    """
+    Parse the relationships[TYPE] parameters into the requested relationship modes.
+
+    relationships[album]=tracks:count,artist:links
+    Returns:
+    {
+        'album': {
+            'tracks': 'count',
+            'artist': 'links'
+        }
+    }
+    """
+    result: Dict[str, Dict] = {}
+    for key, value in query_params.items():
+        m = RX_RELATIONSHIPS.match(key)
+        if m:
+            modes = result.setdefault(m.group(1), {})
+            for member in value.split(","):
+                name, _sep, mode = member.partition(":")
+                if name and mode:
+                    modes[name] = mode
+    return result
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into a single call.
+
+    The first caller for a key (the leader) makes the call, and any callers
+    for the same key that arrive while it is in flight (the followers) wait for
+    its result instead of making the call themselves. Followers wait for at most
+    `timeout` seconds before giving up and making the call anyway.
+
+    If the leader raises an exception, each follower raises its own copy of it,
+    chained to the leader's exception, so that their tracebacks stay apart.
+
+    `stats` counts leaders, followers and timeouts.
+    """
+
+    class Call:
+        """A call in flight."""
+
+        def __init__(self) -> None:
+            """Create a call."""
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self) -> None:
+        """Create a single flight group."""
+        self.lock = threading.Lock()
+        self.calls: Dict[Hashable, SingleFlight.Call] = {}
+        self.stats = {"leaders": 0, "followers": 0, "timeouts": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], T], timeout: float) -> Tuple[T, bool]:
+        """
+        Call `fn`, or wait for the in-flight call with the same key.
+
+        Returns the result, and whether it was shared from another call.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self.calls[key] = SingleFlight.Call()
+            self.stats["leaders" if leader else "followers"] += 1
+
+        if not leader:
+            if call.done.wait(timeout):
+                if call.error is not None:
+                    error = shared_error(call.error)
+                    if error is call.error:
+                        raise error
+                    raise error from call.error
+                return call.result, True
+            with self.lock:
+                self.stats["timeouts"] += 1
+            return fn(), False
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+def shared_error(error: BaseException) -> BaseException:
+    """Return a copy of an exception to raise in another thread."""
+    try:
+        return copy.copy(error)
+    except Exception:
+        # Exceptions that can't be copied are raised as they are.
+        return error
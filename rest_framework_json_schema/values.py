@@ -0,0 +1,229 @@
+"""
+Render resources straight from queryset rows, without serializing model instances.
+
+https://docs.djangoproject.com/en/stable/ref/models/querysets/#values
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, cast
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet
+from rest_framework import serializers
+from rest_framework.request import Request
+
+from .exceptions import ValuesUnsupported
+from .helpers import LinkageList
+from .relations import JSONAPIManyRelatedField, JSONAPIRelationshipField
+from .schema import ResourceIdObject
+from .utils import parse_relationship_modes
+
+
+class ValuesPlan:
+    """
+    Fetch the data of a model serializer's resources with `QuerySet.values()`.
+
+    The serializer's fields are mapped to columns once, so rendering a list only
+    needs to convert the values of each row. Attributes are read from their
+    columns, to-one relationships from their foreign key columns, and the
+    linkage of to-many relationships with one query for all of the rows.
+    No model is instantiated.
+
+    ValuesUnsupported is raised if a field can't be read from a column, such as
+    a SerializerMethodField, or a field with a dotted source. It's also raised
+    for the linkage of to-many relationships with a linkage limit, as the
+    members would all be fetched: their serializer fields fetch only the
+    members within the limit, and for members ordered by an expression.
+    """
+
+    # Fields whose column values are rendered as they are.
+    native_fields: Tuple[type, ...] = (
+        serializers.CharField,
+        serializers.IntegerField,
+        serializers.FloatField,
+        serializers.BooleanField,
+    )
+    # Fields whose column values are converted by the field, like datetimes.
+    converted_fields: Tuple[type, ...] = (
+        serializers.DateTimeField,
+        serializers.DateField,
+        serializers.TimeField,
+        serializers.DurationField,
+        serializers.DecimalField,
+        serializers.UUIDField,
+    )
+
+    def __init__(
+        self, serializer: serializers.ModelSerializer, request: Optional[Request]
+    ) -> None:
+        """Map the fields of a model serializer to columns."""
+        self.model = serializer.Meta.model
+        schema = serializer.schema()
+        modes = parse_relationship_modes(request.query_params) if request else {}
+        # (name, column, converter)
+        self.attributes: List[Tuple[str, str, Optional[Callable]]] = []
+        # (name, column, type)
+        self.to_one: List[Tuple[str, str, str]] = []
+        # (name, lookup, type, mode)
+        self.to_many: List[Tuple[str, str, str, str]] = []
+
+        self.id = schema.id
+        self.id_column = self.get_column(schema.id)
+        rels = dict(schema.norm_relationships)
+        for name, field in serializer.fields.items():
+            if field.write_only or name == schema.id:
+                continue
+            if name in rels:
+                self.add_relationship(
+                    name,
+                    field,
+                    schema.get_relationship_mode(name, rels[name], modes),
+                    rels[name].linkage_limit,
+                )
+            elif name in schema.attribute_sources:
+                raise ValuesUnsupported("%s has a source" % name)
+            elif name in schema.norm_attributes:
+                self.attributes.append(
+                    (name, self.get_column(field.source), self.get_converter(field))
+                )
+
+    def get_column(self, source: str) -> str:
+        """Return the column of a concrete model field."""
+        try:
+            model_field = self.model._meta.get_field(source)
+        except FieldDoesNotExist:
+            raise ValuesUnsupported("%s is not a model field" % source)
+        if not model_field.concrete or model_field.many_to_many:
+            raise ValuesUnsupported("%s is not a column" % source)
+        return model_field.attname
+
+    def get_converter(self, field: serializers.Field) -> Optional[Callable]:
+        """Return the function that converts a column value, or None."""
+        if isinstance(field, self.converted_fields):
+            return cast(serializers.Field, field).to_representation
+        if isinstance(field, self.native_fields):
+            return None
+        raise ValuesUnsupported("%s can't be read from a column" % field.field_name)
+
+    def add_relationship(
+        self, name: str, field: serializers.Field, mode: str, limit: Optional[int]
+    ) -> None:
+        """Map a relationship to its foreign key column or to-many lookup."""
+        if isinstance(field, JSONAPIManyRelatedField):
+            if mode == "linkage" and limit is not None:
+                raise ValuesUnsupported("%s has a linkage limit" % name)
+            try:
+                model_field = self.model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                raise ValuesUnsupported("%s is not a model field" % field.source)
+            if mode == "linkage":
+                self.get_member_ordering(model_field.name)
+            related_type = field.child_relation.get_type()
+            self.to_many.append((name, model_field.name, related_type, mode))
+        elif isinstance(field, JSONAPIRelationshipField):
+            self.to_one.append((name, self.get_column(field.source), field.get_type()))
+        else:
+            raise ValuesUnsupported("%s is not a JSON API relationship" % name)
+
+    def count_annotation(self, name: str) -> str:
+        """Return the name of the count annotation of a to-many relationship."""
+        return JSONAPIManyRelatedField.count_annotation % name
+
+    def values(self, queryset: QuerySet, *extra: str) -> QuerySet:
+        """Return the queryset of the rows, with any extra columns."""
+        columns = [self.id_column]
+        columns.extend(column for (_name, column, _converter) in self.attributes)
+        columns.extend(column for (_name, column, _type) in self.to_one)
+        annotations = queryset.query.annotations
+        columns.extend(
+            self.count_annotation(name)
+            for (name, _lookup, _type, mode) in self.to_many
+            if mode == "count" and self.count_annotation(name) in annotations
+        )
+        columns.extend(extra)
+        return queryset.values(*OrderedDict.fromkeys(columns))
+
+    def get_member_ordering(self, lookup: str) -> List[str]:
+        """
+        Return the ordering of the members of a to-many relationship.
+
+        The members are ordered like the related manager would, by the default
+        ordering of the related model, which must only name fields.
+        """
+        related_model = self.model._meta.get_field(lookup).related_model
+        ordering = []
+        for o in related_model._meta.ordering:
+            if not isinstance(o, str):
+                raise ValuesUnsupported("%s is ordered by an expression" % lookup)
+            ordering.append(
+                "%s%s__%s" % ("-" if o.startswith("-") else "", lookup, o.lstrip("-"))
+            )
+        return ordering or [lookup]
+
+    def get_members(self, lookup: str, pks: List[Any]) -> Dict[Any, List[Any]]:
+        """Return the primary keys of the members of a to-many relationship."""
+        pairs = (
+            self.model._default_manager.filter(pk__in=pks)
+            .filter(**{"%s__isnull" % lookup: False})
+            .order_by(*self.get_member_ordering(lookup))
+            .values_list("pk", lookup)
+        )
+        members: Dict[Any, List[Any]] = {pk: [] for pk in pks}
+        for (pk, member) in pairs:
+            members[pk].append(member)
+        return members
+
+    def to_data(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convert rows to the data of their resources."""
+        rows = list(rows)
+        if not rows:
+            return []
+
+        # One query per to-many relationship, unless its count was annotated.
+        pks = [row[self.id_column] for row in rows]
+        members = {
+            name: self.get_members(lookup, pks)
+            for (name, lookup, _type, mode) in self.to_many
+            if mode == "linkage"
+            or (mode == "count" and self.count_annotation(name) not in rows[0])
+        }
+
+        results = []
+        for row in rows:
+            data: Dict[str, Any] = OrderedDict()
+            data[self.id] = row[self.id_column]
+            for (name, column, converter) in self.attributes:
+                value = row[column]
+                if converter is not None and value is not None:
+                    value = converter(value)
+                data[name] = value
+            for (name, column, related_type) in self.to_one:
+                value = row[column]
+                data[name] = (
+                    ResourceIdObject(id=value, type=related_type)
+                    if value is not None
+                    else None
+                )
+            for (name, _lookup, related_type, mode) in self.to_many:
+                data[name] = self.get_to_many_data(
+                    row, name, related_type, mode, members.get(name)
+                )
+            results.append(data)
+        return results
+
+    def get_to_many_data(
+        self,
+        row: Dict[str, Any],
+        name: str,
+        related_type: str,
+        mode: str,
+        members: Optional[Dict[Any, List[Any]]],
+    ) -> Any:
+        """Return the data of a to-many relationship, like its serializer field."""
+        if mode == "links":
+            return []
+        pks = members[row[self.id_column]] if members is not None else []
+        if mode == "count":
+            total = row.get(self.count_annotation(name), len(pks))
+            return LinkageList([], total=total)
+        return [ResourceIdObject(id=pk, type=related_type) for pk in pks]
@@ -0,0 +1,526 @@
+"""
+Generic views and viewset mixins.
+
+https://jsonapi.org/format/#fetching-relationships
+https://jsonapi.org/format/#crud-updating-relationships
+"""
+
+import copy
+import functools
+from collections import OrderedDict
+from http.cookies import Morsel
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Type
+
+import django
+from django.db import models, transaction
+from django.http import Http404, HttpRequest, HttpResponse
+from django.http.response import HttpResponseBase
+from rest_framework import exceptions, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.relations import ManyRelatedField
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from .budgets import IncludeBudget
+from .exceptions import TypeConflict, ValuesUnsupported
+from .helpers import JSONReturnLinkage
+from .includes import sync_to_async
+from .pagination import JSONAPILimitOffsetPagination
+from .parsers import Conflict, JSONAPIRelationshipParser
+from .profiling import ProfileStore, RequestProfiler, default_profile_store
+from .renderers import RX_FIELDS, JSONAPIRenderer
+from .schema import Context, RelationshipObject, ResourceIdObject, ResourceObject
+from .utils import SingleFlight, parse_include
+from .values import ValuesPlan
+
+
+class JSONAPIRelationshipMixin(viewsets.GenericViewSet):
+    """
+    Add relationship endpoints to a viewset of Django models.
+
+    The endpoints are routed to ``{prefix}/{lookup}/relationships/{name}/``,
+    where `name` is the transformed name of the relationship in the schema.
+
+    Resource linkage is read and written using primary keys only, so the related
+    models are never instantiated. Updates to to-many relationships only add and
+    remove the members that differ from the current linkage.
+
+    The linkage of to-many relationships is paginated with the `limit` and
+    `offset` query parameters of `linkage_pagination_class`, which are also
+    used by the pagination links of relationships with a `linkage_limit`. Such
+    relationships are paginated by default.
+    """
+
+    linkage_pagination_class: Type[
+        JSONAPILimitOffsetPagination
+    ] = JSONAPILimitOffsetPagination
+
+    @action(
+        detail=True,
+        methods=["get", "post", "patch", "delete"],
+        url_path=r"relationships/(?P<rel_name>[^/.]+)",
+        url_name="relationships",
+        parser_classes=[JSONAPIRelationshipParser],
+    )
+    def relationships(
+        self, request: Request, rel_name: str, *args: Any, **kwargs: Any
+    ) -> Response:
+        """Fetch or update the resource linkage of a relationship."""
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        schema = serializer.schema()
+        name, rel = self.get_relationship(schema, rel_name)
+        try:
+            field = serializer.fields[name]
+        except KeyError:
+            raise Http404("Relationship not found.")
+
+        if request.method != "GET":
+            self.update_relationship(instance, schema, name, rel, field)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        related_type = self.get_related_field(field).get_type()
+        rel_data: Any
+        links = meta = None
+        if isinstance(field, ManyRelatedField):
+            pks = self.get_to_many_pks(instance, field)
+            paginator = self.linkage_pagination_class()
+            if rel.linkage_limit is not None:
+                # Paginate like the linkage is limited, rather than limiting it.
+                paginator.default_limit = rel.linkage_limit
+                rel = copy.copy(rel)
+                rel.linkage_limit = None
+            page = paginator.paginate_queryset(pks, request, view=self)
+            if page is not None:
+                pks = page
+                links = OrderedDict(
+                    (
+                        ("page[next]", paginator.get_next_link()),
+                        ("page[previous]", paginator.get_previous_link()),
+                    )
+                )
+                meta = OrderedDict((("count", paginator.count),))
+            rel_data = [ResourceIdObject(id=pk, type=related_type) for pk in pks]
+        else:
+            pk = self.get_to_one_pk(instance, field)
+            rel_data = (
+                ResourceIdObject(id=pk, type=related_type) if pk is not None else None
+            )
+        return Response(
+            JSONReturnLinkage(
+                rel, {schema.id: instance.pk}, rel_data, links=links, meta=meta
+            )
+        )
+
+    def get_relationship(
+        self, schema: ResourceObject, rel_name: str
+    ) -> Tuple[str, RelationshipObject]:
+        """Return the name and relationship object for the relationship in the URL."""
+        for (name, rel) in schema.norm_relationships:
+            if schema.transformed_names[name] == rel_name:
+                return name, rel
+        raise Http404("Relationship not found.")
+
+    def get_related_field(self, field: serializers.Field) -> serializers.RelatedField:
+        """Return the relationship field, unwrapping to-many relationships."""
+        return getattr(field, "child_relation", field)
+
+    def get_to_one_pk(self, instance: models.Model, field: serializers.Field) -> Any:
+        """Return the primary key of a to-one relationship, without fetching it."""
+        model_field = instance._meta.get_field(field.source)
+        return getattr(instance, model_field.attname)
+
+    def get_to_many_pks(
+        self, instance: models.Model, field: serializers.Field
+    ) -> models.QuerySet:
+        """Return the primary keys of a to-many relationship, without fetching them."""
+        pks = getattr(instance, field.source).values_list("pk", flat=True)
+        # Pages need a stable order.
+        return pks if pks.ordered else pks.order_by("pk")
+
+    def get_existing_pks(
+        self, related_field: serializers.RelatedField, ids: List[Any]
+    ) -> List[Any]:
+        """Verify that the related resources exist, returning their primary keys."""
+        pks = related_field.to_pks(ids, related_field.get_queryset())
+        return related_field.get_existing_pks(pks)
+
+    def update_relationship(
+        self,
+        instance: models.Model,
+        schema: ResourceObject,
+        name: str,
+        rel: RelationshipObject,
+        field: serializers.Field,
+    ) -> None:
+        """Update a relationship from the resource linkage in the request."""
+        request = self.request
+        if field.read_only:
+            raise exceptions.PermissionDenied("This relationship cannot be updated.")
+
+        related_field = self.get_related_field(field)
+        context = Context(request, related_types={name: related_field.get_type()})
+        try:
+            ids = schema.parse_relationship(request.data, name, rel, context)
+        except TypeConflict as e:
+            raise Conflict(str(e))
+
+        if isinstance(field, ManyRelatedField):
+            if not isinstance(ids, list):
+                raise exceptions.ValidationError(
+                    "A to-many relationship requires an array of resource linkage."
+                )
+            self.update_to_many(instance, field, ids)
+        elif request.method != "PATCH":
+            raise exceptions.MethodNotAllowed(request.method)
+        elif isinstance(ids, list):
+            raise exceptions.ValidationError(
+                "A to-one relationship requires a single resource linkage."
+            )
+        else:
+            self.update_to_one(instance, field, ids)
+
+    def update_to_one(
+        self, instance: models.Model, field: serializers.Field, id: Optional[Any]
+    ) -> None:
+        """Replace a to-one relationship."""
+        model_field = instance._meta.get_field(field.source)
+        pk = None
+        if id is not None:
+            (pk,) = self.get_existing_pks(field, [id])
+        elif not model_field.null:
+            raise exceptions.PermissionDenied("This relationship cannot be cleared.")
+        setattr(instance, model_field.attname, pk)
+        instance.save(update_fields=[model_field.name])
+
+    def update_to_many(
+        self, instance: models.Model, field: ManyRelatedField, ids: List[Any]
+    ) -> None:
+        """
+        Add, remove or replace the members of a to-many relationship.
+
+        POST adds members, DELETE removes members and PATCH replaces all members.
+        Only the difference between the current and requested members is applied.
+        """
+        related_field = field.child_relation
+        manager = getattr(instance, field.source)
+        current = OrderedDict.fromkeys(manager.values_list("pk", flat=True))
+        requested = OrderedDict.fromkeys(
+            related_field.to_pks(ids, related_field.get_queryset())
+        )
+
+        add: List[Any] = []
+        remove: List[Any] = []
+        if self.request.method == "DELETE":
+            remove = [pk for pk in requested if pk in current]
+        else:
+            add = [pk for pk in requested if pk not in current]
+            if self.request.method == "PATCH":
+                remove = [pk for pk in current if pk not in requested]
+
+        if add:
+            add = related_field.get_existing_pks(add)
+        with transaction.atomic():
+            if add:
+                self.add_related(instance, manager, add)
+            if remove:
+                self.remove_related(instance, manager, remove)
+
+    def add_related(self, instance: models.Model, manager: Any, pks: List[Any]) -> None:
+        """Add members to a to-many relationship with a single query."""
+        if hasattr(manager, "through"):
+            # Many-to-many: insert the rows of the through table directly.
+            through = manager.through
+            source = through._meta.get_field(manager.source_field_name).attname
+            target = through._meta.get_field(manager.target_field_name).attname
+            through._default_manager.bulk_create(
+                [through(**{source: instance.pk, target: pk}) for pk in pks]
+            )
+        else:
+            # Reverse foreign key: point the related rows at this instance.
+            manager.model._default_manager.filter(pk__in=pks).update(
+                **{manager.field.name: instance}
+            )
+
+    def remove_related(
+        self, instance: models.Model, manager: Any, pks: List[Any]
+    ) -> None:
+        """Remove members from a to-many relationship with a single query."""
+        if hasattr(manager, "through"):
+            through = manager.through
+            source = through._meta.get_field(manager.source_field_name).attname
+            target = through._meta.get_field(manager.target_field_name).attname
+            through._default_manager.filter(
+                **{source: instance.pk, f"{target}__in": pks}
+            ).delete()
+        elif manager.field.null:
+            manager.model._default_manager.filter(pk__in=pks).update(
+                **{manager.field.name: None}
+            )
+        else:
+            raise exceptions.PermissionDenied(
+                "Members cannot be removed from this relationship."
+            )
+
+
+class JSONAPISingleFlightMixin(viewsets.GenericViewSet):
+    """
+    Coalesce identical concurrent GET requests to a viewset.
+
+    While a list or retrieve request is being handled and rendered, identical
+    requests wait for it and share its rendered response instead of rendering
+    their own. Requests are identical if they have the same path, the same
+    JSON API query (so the order of include paths doesn't matter), the same
+    media type, and the same scope.
+
+    The scope is the user by default, so responses are never shared between
+    users. Shared responses include the cookies that the leader's response
+    sets. Override `get_single_flight_scope()` to share them more widely, for
+    instance between users with the same permissions.
+
+    Followers wait at most `single_flight_timeout` seconds before handling the
+    request themselves. `single_flight.stats` counts leaders, followers
+    and timeouts.
+    """
+
+    single_flight = SingleFlight()
+    single_flight_timeout = 5.0
+
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> HttpResponseBase:
+        """List a queryset, sharing the response with identical requests."""
+        return self.coalesce(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request: Request, *args: Any, **kwargs: Any) -> HttpResponseBase:
+        """Retrieve an instance, sharing the response with identical requests."""
+        return self.coalesce(super().retrieve, request, *args, **kwargs)
+
+    def coalesce(
+        self, handler: Callable, request: Request, *args: Any, **kwargs: Any
+    ) -> HttpResponseBase:
+        """Call the handler and render its response, unless an identical one is."""
+        key = self.get_single_flight_key(request)
+        if key is None:
+            return handler(request, *args, **kwargs)
+
+        def render() -> Tuple[int, bytes, List[Tuple[str, str]], List[Morsel]]:
+            response = self.finalize_response(
+                request, handler(request, *args, **kwargs), *args, **kwargs
+            )
+            response.render()
+            return (
+                response.status_code,
+                response.content,
+                list(response.items()),
+                list(response.cookies.values()),
+            )
+
+        (status_code, content, headers, cookies), _shared = self.single_flight.do(
+            key, render, self.single_flight_timeout
+        )
+        response = HttpResponse(content, status=status_code)
+        for (header, value) in headers:
+            response[header] = value
+        for morsel in cookies:
+            response.cookies[morsel.key] = morsel.copy()
+        return response
+
+    def get_single_flight_key(self, request: Request) -> Optional[Hashable]:
+        """Return the key that identical requests share, or None to not share."""
+        if request.method != "GET":
+            return None
+        scope = self.get_single_flight_scope(request)
+        if scope is None:
+            return None
+
+        query = []
+        for param in sorted(request.query_params.keys()):
+            values = request.query_params.getlist(param)
+            if param == "include" or RX_FIELDS.match(param):
+                values = [",".join(sorted(value.split(","))) for value in values]
+            query.append((param, tuple(values)))
+        return (request.path, tuple(query), request.accepted_media_type, scope)
+
+    def get_single_flight_scope(self, request: Request) -> Optional[Hashable]:
+        """
+        Return the scope in which responses can be shared, or None to not share.
+
+        By default, responses are only shared with requests from the same user.
+        """
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            return "anonymous"
+        return ("user", user.pk)
+
+
+class JSONAPIValuesMixin(viewsets.GenericViewSet):
+    """
+    Render lists straight from queryset rows, without serializing model instances.
+
+    The list is fetched with `QuerySet.values()`, using a `ValuesPlan` of the
+    serializer's fields, which is only meant for read-only lists whose
+    fields are all model columns and relationships. Other serializers, and
+    requests that include related resources, are serialized as usual.
+    """
+
+    values_plan_class = ValuesPlan
+
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """List a queryset from its values."""
+        plan = self.get_values_plan(request)
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # Pagination may need the ordering columns, as cursor pagination does.
+        ordering = list(queryset.query.order_by)
+        ordering.extend(getattr(self.paginator, "ordering", None) or ())
+        rows = plan.values(
+            queryset, "pk", *(o.lstrip("-") for o in ordering if o.lstrip("-") != "pk")
+        )
+
+        page = self.paginate_queryset(rows)
+        data = ReturnList(
+            plan.to_data(rows if page is None else page),
+            serializer=self.get_serializer(many=True),
+        )
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def get_values_plan(self, request: Request) -> Optional[ValuesPlan]:
+        """Return the plan to fetch the list from its values, or None."""
+        if request.query_params.get("include"):
+            return None
+        try:
+            return self.values_plan_class(self.get_serializer(), request)
+        except ValuesUnsupported:
+            return None
+
+
+class JSONAPIAsyncMixin(viewsets.GenericViewSet):
+    """
+    Serve a viewset as an async view, for ASGI deployments.
+
+    DRF views are synchronous, so the request is still handled in a thread with
+    `sync_to_async()`. The response is then rendered with the included
+    resources loaded on the event loop (see `JSONAPIRenderer.arender()`), so
+    loaders with async data sources can run concurrently.
+
+    Before Django 3.1, which can't serve async views, the viewset is served
+    synchronously.
+    """
+
+    @classmethod
+    def as_view(
+        cls, actions: Optional[Dict[str, str]] = None, **initkwargs: Any
+    ) -> Callable:
+        """Return the async view of the viewset's actions."""
+        view = super().as_view(actions, **initkwargs)
+        if sync_to_async is None or django.VERSION < (3, 1):
+            return view
+
+        @functools.wraps(view)
+        async def async_view(
+            request: HttpRequest, *args: Any, **kwargs: Any
+        ) -> HttpResponseBase:
+            response = await sync_to_async(view)(request, *args, **kwargs)
+            renderer = getattr(response, "accepted_renderer", None)
+            if isinstance(renderer, JSONAPIRenderer) and not response.is_rendered:
+                renderer.async_includes = True
+                response = await sync_to_async(response.render)()
+            return response
+
+        return async_view
+
+
+class JSONAPIProfileMixin(viewsets.GenericViewSet):
+    """
+    Profile single requests to a viewset with cProfile, on demand.
+
+    A request is profiled when it has the `X-Profile` header and the user has
+    permission (see `has_profile_permission()`, staff users by default). It is
+    profiled from the handler, which parses the request, through the rendering
+    of the response. The profile is saved to `profile_store` under the id of
+    the request (its `X-Request-ID` header, or a new id), which is returned in
+    the `X-Profile-Id` header of the response.
+    """
+
+    profiler_class = RequestProfiler
+    profile_store: ProfileStore = default_profile_store
+    profiler: Optional[RequestProfiler] = None
+
+    def initial(self, request: Request, *args: Any, **kwargs: Any) -> None:
+        """Start profiling once the request is authenticated, if it's allowed."""
+        super().initial(request, *args, **kwargs)
+        if self.profiler_class.is_requested(request) and self.has_profile_permission(
+            request
+        ):
+            self.profiler = self.profiler_class(
+                self.profiler_class.get_request_id(request)
+            )
+            self.profiler.enable()
+
+    def has_profile_permission(self, request: Request) -> bool:
+        """Return whether the request can be profiled."""
+        user = getattr(request, "user", None)
+        return user is not None and bool(user.is_staff)
+
+    def dispatch(
+        self, request: HttpRequest, *args: Any, **kwargs: Any
+    ) -> HttpResponseBase:
+        """Handle a request, and render the response while it's profiled."""
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+            if self.profiler is not None and not getattr(response, "is_rendered", True):
+                response.render()
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+        if self.profiler is not None:
+            self.profile_store.save(self.profiler)
+            response[self.profiler_class.response_header] = self.profiler.request_id
+        return response
+
+
+class JSONAPIIncludeBudgetMixin(viewsets.GenericViewSet):
+    """
+    Check the include paths of requests against a budget, before handling them.
+
+    The depth and number of include paths, and an estimate of the included
+    resources, are checked against `include_budget` (see `IncludeBudget`)
+    once the request is authenticated, so a request that would include too
+    many resources fails with a 400 error before any of them is fetched.
+    The renderer then enforces the budget while rendering.
+    """
+
+    include_budget: Optional[IncludeBudget] = None
+
+    def initial(self, request: Request, *args: Any, **kwargs: Any) -> None:
+        """Check the include paths of the request."""
+        super().initial(request, *args, **kwargs)
+        include = parse_include(request.query_params.get("include", ""))
+        if self.include_budget is not None and include:
+            self.include_budget.preflight(
+                self.get_serializer(), include, self.get_primary_estimate(request)
+            )
+
+    def get_primary_estimate(self, request: Request) -> Optional[int]:
+        """
+        Return the expected number of resources in the primary data, if known.
+
+        Details have a resource, and paginated lists the page size. The size of
+        lists that aren't paginated isn't known.
+        """
+        if self.action != "list":
+            return 1
+        paginator = self.paginator
+        if paginator is None:
+            return None
+        get_limit = getattr(paginator, "get_limit", None)
+        if get_limit is not None:
+            return get_limit(request)
+        get_page_size = getattr(paginator, "get_page_size", None)
+        if get_page_size is not None:
+            return get_page_size(request)
+        return getattr(paginator, "page_size", None)
@@ -1,6 +1,9 @@
+from decimal import Decimal
+
 import pytest
 from rest_framework.test import APIRequestFactory
 
+from tests.dummy.models import Artist, Album, Track, Playlist
 from tests.support.serializers import reset_data
 
 
@@ -14,3 +17,21 @@ def factory() -> APIRequestFactory:
 def auto_reset_data() -> None:
     """Automatically reset test data before each test."""
     reset_data()
+
+
+@pytest.fixture
+def db_data(db: None) -> None:
+    """Create the test data in the database."""
+    miles = Artist.objects.create(first_name="Miles", last_name="Davis")
+    coltrane = Artist.objects.create(first_name="John", last_name="Coltrane")
+    Album.objects.create(album_name="A Love Supreme", artist=coltrane)
+    cool = Album.objects.create(album_name="Birth of the Cool", artist=miles)
+    Album.objects.create(album_name="Unknown Artist", artist=None)
+    tracks = [
+        Track.objects.create(track_num=num, name=name, album=cool)
+        for (num, name) in enumerate(
+            ("Jeru", "Moon Dreams", "Venus de Milo", "Deception"), 1
+        )
+    ]
+    playlist = Playlist.objects.create(name="Cool Jazz", rating=Decimal("4.5"))
+    playlist.tracks.add(tracks[0], tracks[2])
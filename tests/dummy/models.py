@@ -0,0 +1,46 @@
+"""
+Database models for the dummy project.
+
+Unlike the models in tests.support.serializers, these are real Django models,
+used to test the parts of the library that work with the Django ORM.
+"""
+
+import uuid
+
+from django.db import models
+
+
+class Artist(models.Model):
+    """An artist model."""
+
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+
+
+class Album(models.Model):
+    """An album model."""
+
+    album_name = models.CharField(max_length=100)
+    artist = models.ForeignKey(
+        Artist, null=True, related_name="albums", on_delete=models.SET_NULL
+    )
+
+
+class Track(models.Model):
+    """A track model."""
+
+    track_num = models.IntegerField()
+    name = models.CharField(max_length=100)
+    album = models.ForeignKey(
+        Album, null=True, related_name="tracks", on_delete=models.SET_NULL
+    )
+
+
+class Playlist(models.Model):
+    """A playlist model, with a many-to-many relationship to tracks."""
+
+    name = models.CharField(max_length=100)
+    uuid = models.UUIDField(default=uuid.uuid4)
+    created = models.DateTimeField(auto_now_add=True)
+    rating = models.DecimalField(max_digits=3, decimal_places=1, null=True)
+    tracks = models.ManyToManyField(Track, related_name="playlists")
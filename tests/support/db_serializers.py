@@ -0,0 +1,120 @@
+from typing import Any
+
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.request import Request
+
+from rest_framework_json_schema.auto import auto_schema
+from rest_framework_json_schema.relations import JSONAPIRelationshipField
+from rest_framework_json_schema.schema import ObjDataType, RelationshipObject, UrlLink
+from rest_framework_json_schema.transforms import CamelCaseTransform
+from tests.dummy.models import Artist, Album, Track, Playlist
+
+
+def camel_schema(*args: Any, **kwargs: Any) -> Any:
+    """Generate a camel-cased auto schema."""
+    return auto_schema(*args, **kwargs, transformer=CamelCaseTransform)
+
+
+class ArtistSerializer(serializers.ModelSerializer):
+    """Serializer for artist models."""
+
+    schema = camel_schema("artist", sortable=("first_name", "last_name"))
+
+    class Meta:
+        """The model and fields to serialize."""
+
+        model = Artist
+        fields = ("id", "first_name", "last_name")
+
+
+class AlbumSerializer(serializers.ModelSerializer):
+    """Serializer for album models."""
+
+    artist = JSONAPIRelationshipField(
+        serializer=ArtistSerializer, queryset=Artist.objects.all(), allow_null=True
+    )
+    tracks = JSONAPIRelationshipField(
+        serializer="tests.support.db_serializers.TrackSerializer",
+        many=True,
+        queryset=Track.objects.all(),
+    )
+
+    schema = camel_schema("album")
+
+    class Meta:
+        """The model and fields to serialize."""
+
+        model = Album
+        fields = ("id", "album_name", "artist", "tracks")
+
+
+class RelationshipLink(UrlLink):
+    """Link to the relationship endpoint of a resource."""
+
+    rel_name = ""
+
+    def render(self, data: ObjDataType, request: Request) -> Any:
+        """Render the URL of the relationship endpoint."""
+        link = reverse(
+            self.view_name, kwargs={"pk": data["id"], "rel_name": self.rel_name}
+        )
+        return request.build_absolute_uri(link)
+
+
+class LimitedAlbumSerializer(AlbumSerializer):
+    """Serializer for album models, which limits the linkage of tracks."""
+
+    schema = camel_schema(
+        "album",
+        relationships=(
+            "artist",
+            (
+                "tracks",
+                RelationshipObject(
+                    linkage_limit=2,
+                    links=(
+                        (
+                            "self",
+                            RelationshipLink(
+                                view_name="db-limited-album-relationships",
+                                rel_name="tracks",
+                            ),
+                        ),
+                    ),
+                ),
+            ),
+        ),
+    )
+
+
+class TrackSerializer(serializers.ModelSerializer):
+    """Serializer for track models."""
+
+    album = JSONAPIRelationshipField(
+        serializer=AlbumSerializer, queryset=Album.objects.all(), allow_null=True
+    )
+
+    schema = camel_schema("track", sortable=("track_num", "name", "album"))
+
+    class Meta:
+        """The model and fields to serialize."""
+
+        model = Track
+        fields = ("id", "track_num", "name", "album")
+
+
+class PlaylistSerializer(serializers.ModelSerializer):
+    """Serializer for playlist models."""
+
+    tracks = JSONAPIRelationshipField(
+        serializer=TrackSerializer, many=True, queryset=Track.objects.all()
+    )
+
+    schema = camel_schema("playlist")
+
+    class Meta:
+        """The model and fields to serialize."""
+
+        model = Playlist
+        fields = ("id", "name", "uuid", "created", "rating", "tracks")
@@ -0,0 +1,117 @@
+from typing import Optional, Type
+
+from django.db.models import QuerySet
+from rest_framework import viewsets
+from rest_framework.pagination import BasePagination
+from rest_framework.permissions import AllowAny
+
+from rest_framework_json_schema.pagination import (
+    JSONAPICursorPagination,
+    JSONAPILimitOffsetPagination,
+)
+from rest_framework_json_schema.filters import (
+    JSONAPIFilterBackend,
+    JSONAPIRelationshipCountBackend,
+    JSONAPISortBackend,
+)
+from rest_framework_json_schema.negotiation import JSONAPIContentNegotiation
+from rest_framework_json_schema.parsers import JSONAPIParser
+from rest_framework_json_schema.renderers import JSONAPIRenderer
+from rest_framework_json_schema.utils import parse_relationship_modes
+from rest_framework_json_schema.views import JSONAPIRelationshipMixin
+from tests.dummy.models import Artist, Album, Track, Playlist
+from .db_serializers import (
+    ArtistSerializer,
+    AlbumSerializer,
+    LimitedAlbumSerializer,
+    TrackSerializer,
+    PlaylistSerializer,
+)
+
+
+class BaseViewSet(JSONAPIRelationshipMixin, viewsets.ModelViewSet):
+    """Base view set for database models."""
+
+    parser_classes = (JSONAPIParser,)
+    permission_classes = (AllowAny,)
+    renderer_classes = (JSONAPIRenderer,)
+    content_negotiation_class = JSONAPIContentNegotiation
+    filter_backends = (
+        JSONAPIFilterBackend,
+        JSONAPISortBackend,
+        JSONAPIRelationshipCountBackend,
+    )
+    pagination_class: Optional[Type[BasePagination]] = None
+
+
+class ArtistViewSet(BaseViewSet):
+    """A ViewSet for artists in the database."""
+
+    queryset = Artist.objects.order_by("pk")
+    serializer_class = ArtistSerializer
+
+
+class AlbumViewSet(BaseViewSet):
+    """A ViewSet for albums in the database."""
+
+    queryset = Album.objects.order_by("pk")
+    serializer_class = AlbumSerializer
+    # Fetch the tracks of all the listed albums with one query.
+    prefetch_tracks = True
+
+    def get_queryset(self) -> QuerySet:
+        """Prefetch the tracks of a list of albums, if their linkage is rendered."""
+        queryset = super().get_queryset()
+        modes = parse_relationship_modes(self.request.query_params)
+        mode = modes.get("album", {}).get("tracks", "linkage")
+        if self.prefetch_tracks and self.action == "list" and mode == "linkage":
+            queryset = queryset.prefetch_related("tracks")
+        return queryset
+
+
+class LimitedAlbumViewSet(AlbumViewSet):
+    """A ViewSet for albums, which limits the linkage of tracks."""
+
+    serializer_class = LimitedAlbumSerializer
+    # Only the tracks within the linkage limit are fetched, per album.
+    prefetch_tracks = False
+
+
+class TrackViewSet(BaseViewSet):
+    """A ViewSet for tracks in the database."""
+
+    queryset = Track.objects.order_by("pk")
+    serializer_class = TrackSerializer
+
+
+class PlaylistViewSet(BaseViewSet):
+    """A ViewSet for playlists in the database."""
+
+    queryset = Playlist.objects.order_by("pk")
+    serializer_class = PlaylistSerializer
+
+
+class CursorPagination(JSONAPICursorPagination):
+    """Cursor pagination with a small page size."""
+
+    page_size = 2
+
+
+class CursorPaginateViewSet(ArtistViewSet):
+    """Viewset that implements JSON API cursor pagination."""
+
+    queryset = Artist.objects.order_by("last_name")
+    pagination_class = CursorPagination
+
+
+class CountPagination(JSONAPILimitOffsetPagination):
+    """Limit/offset pagination where the client chooses how to count."""
+
+    default_limit = 2
+    allowed_count_strategies = ("exact", "cached", "estimated", "window", "none")
+
+
+class CountPaginateViewSet(ArtistViewSet):
+    """Viewset that implements JSON API limit/offset pagination."""
+
+    pagination_class = CountPagination
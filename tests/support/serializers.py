@@ -148,6 +148,11 @@ class QuerySet(Generic[T]):
         """Get a model by ID."""
         return self.objs[pk]
 
+    def in_bulk(self, id_list: List[Any]) -> Dict[Any, T]:
+        """Get models by a list of IDs (used by relationship fields)."""
+        ids = {str(pk) for pk in id_list}
+        return {obj.pk: obj for obj in self.objs if str(obj.pk) in ids}  # type: ignore
+
     def add(self, obj: T) -> None:
         """Add a model."""
         self.objs.append(obj)
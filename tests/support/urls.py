@@ -1,6 +1,7 @@
 from django.conf.urls import url, include
 from rest_framework import routers
 
+from . import db_views
 from .views import (
     ArtistViewSet,
     AlbumViewSet,
@@ -17,5 +18,12 @@ router.register(r"track", TrackViewSet, "track")
 router.register(r"paged", PaginateViewSet, "page")
 router.register(r"paged-nonjson", NonJSONPaginateViewSet, "page-nonjson")
 router.register(r"non-default-id", NonDefaultIdViewSet, "non-default-id")
+router.register(r"db/artist", db_views.ArtistViewSet, "db-artist")
+router.register(r"db/album", db_views.AlbumViewSet, "db-album")
+router.register(r"db/limited-album", db_views.LimitedAlbumViewSet, "db-limited-album")
+router.register(r"db/track", db_views.TrackViewSet, "db-track")
+router.register(r"db/playlist", db_views.PlaylistViewSet, "db-playlist")
+router.register(r"db/paged", db_views.CursorPaginateViewSet, "db-page")
+router.register(r"db/counted", db_views.CountPaginateViewSet, "db-count")
 
 urlpatterns = [url(r"^api/", include(router.urls))]
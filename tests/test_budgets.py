@@ -0,0 +1,142 @@
+import json
+from typing import Any, Dict, Optional, Type
+
+from django.urls import reverse
+from pytest_django import DjangoAssertNumQueries
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import GenericViewSet
+
+from rest_framework_json_schema.budgets import IncludeBudget, measure_include
+from rest_framework_json_schema.renderers import JSONAPIRenderer
+from rest_framework_json_schema.utils import parse_include
+from rest_framework_json_schema.views import JSONAPIIncludeBudgetMixin
+from tests.support import db_views
+from tests.support.db_serializers import AlbumSerializer
+from tests.support.decorators import mark_urls
+
+
+def budget_viewset(
+    budget: IncludeBudget, pagination_class: Optional[Type] = None
+) -> Type[GenericViewSet]:
+    """Return the album viewset, with an include budget."""
+    return type(
+        "BudgetAlbumViewSet",
+        (JSONAPIIncludeBudgetMixin, db_views.AlbumViewSet),
+        {"include_budget": budget, "pagination_class": pagination_class},
+    )
+
+
+def get_albums(
+    factory: APIRequestFactory, viewset: Type[GenericViewSet], include: str
+) -> Any:
+    """Get and render the list of albums."""
+    request = factory.get(reverse("db-album-list"), {"include": include})
+    response = viewset.as_view({"get": "list"})(request)
+    response.render()
+    return response
+
+
+def error_detail(response: Any) -> str:
+    """Return the detail of the error of a response."""
+    (error,) = json.loads(response.content)["errors"]
+    return error["detail"]
+
+
+def test_measure_include() -> None:
+    """The depth and number of include paths are measured."""
+    assert measure_include({}) == (0, 0)
+    assert measure_include(parse_include("artist,tracks.album.artist")) == (3, 4)
+
+
+def test_estimate_included() -> None:
+    """Included resources are estimated from the cardinality of relationships."""
+    budget = IncludeBudget(default_cardinality=5)
+    include: Dict[str, Dict] = parse_include("artist,tracks.album")
+    # 3 artists, 15 tracks and the album of each track.
+    assert budget.estimate_included(AlbumSerializer(), include, 3) == 33
+
+
+@mark_urls
+def test_preflight(
+    factory: APIRequestFactory,
+    db_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """Include paths over the budget fail before anything is fetched."""
+    viewset = budget_viewset(
+        IncludeBudget(max_depth=2, max_paths=2, max_included=15),
+        db_views.CountPagination,
+    )
+    with django_assert_num_queries(0):
+        response = get_albums(factory, viewset, "tracks.album.artist")
+    assert response.status_code == 400
+    assert error_detail(response) == "Include paths can have at most 2 relationships."
+
+    response = get_albums(factory, viewset, "artist,tracks.album")
+    assert response.status_code == 400
+    assert error_detail(response) == "At most 2 relationships can be included."
+
+    # A page of 2 albums could include 20 tracks.
+    response = get_albums(factory, viewset, "tracks")
+    assert response.status_code == 400
+    assert error_detail(response) == (
+        "The include paths could include about 20 resources, but at most "
+        "15 can be included."
+    )
+
+    response = get_albums(factory, viewset, "artist")
+    assert response.status_code == 200
+    assert len(json.loads(response.content)["included"]) == 2
+
+
+@mark_urls
+def test_enforced_while_rendering(factory: APIRequestFactory, db_data: None) -> None:
+    """Included resources and the size of the document are limited while rendering."""
+    # The list isn't paginated, so the included resources can't be estimated.
+    response = get_albums(
+        factory, budget_viewset(IncludeBudget(max_included=3)), "tracks"
+    )
+    assert response.status_code == 400
+    assert error_detail(response) == "At most 3 resources can be included."
+
+    response = get_albums(
+        factory, budget_viewset(IncludeBudget(max_included=4)), "tracks"
+    )
+    assert response.status_code == 200
+    assert len(json.loads(response.content)["included"]) == 4
+
+    response = get_albums(factory, budget_viewset(IncludeBudget(max_bytes=500)), "")
+    assert response.status_code == 400
+    assert error_detail(response) == "The document would be larger than 500 bytes."
+
+
+@mark_urls
+def test_enforced_once_per_resource(factory: APIRequestFactory, db_data: None) -> None:
+    """A resource referenced several times is counted once."""
+    # Included resources are rendered breadth-first, or depth-first without a
+    # loader.
+    for (name, include_loader_class) in (
+        ("BreadthFirst", JSONAPIRenderer.include_loader_class),
+        ("DepthFirst", None),
+    ):
+        renderer_class = type(
+            "%sRenderer" % name,
+            (JSONAPIRenderer,),
+            {"include_loader_class": include_loader_class},
+        )
+        viewset: Type[GenericViewSet] = type(
+            "%sBudgetTrackViewSet" % name,
+            (JSONAPIIncludeBudgetMixin, db_views.TrackViewSet),
+            {
+                "include_budget": IncludeBudget(max_included=2),
+                "renderer_classes": (renderer_class,),
+            },
+        )
+        request = factory.get(reverse("db-track-list"), {"include": "album"})
+        response = viewset.as_view({"get": "list"})(request)
+        response.render()
+        # The four tracks are on the same album.
+        assert response.status_code == 200, response.content
+        content = json.loads(response.content)
+        assert len(content["data"]) == 4
+        assert len({(obj["type"], obj["id"]) for obj in content["included"]}) == 1
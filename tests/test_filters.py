@@ -1,5 +1,31 @@
-from rest_framework_json_schema.filters import get_query_filters
+import json
+from typing import Any, Dict, List, Type
+
+import django
+import pytest
+from django.db.models import Index
+from django.db.models.functions import Lower
+from django.urls import reverse
+from pytest_django import DjangoAssertNumQueries
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import GenericViewSet
+
+from rest_framework_json_schema.filters import (
+    get_query_filters,
+    has_sort_index,
+    parse_filter_spec,
+)
 from rest_framework_json_schema.transforms import CamelCaseToUnderscoreTransform
+from tests.dummy.models import Artist, Track
+from tests.support.db_serializers import ArtistSerializer, camel_schema
+from tests.support.db_views import (
+    AlbumViewSet,
+    ArtistViewSet,
+    PlaylistViewSet,
+    TrackViewSet,
+)
+from tests.support.decorators import mark_urls
 
 
 def test_filter_no_transform() -> None:
@@ -17,3 +43,255 @@ def test_filter_transform() -> None:
         CamelCaseToUnderscoreTransform(),
     )
     assert result == {"name": "John", "last_name": "Coltrane"}
+
+
+def test_parse_filter_spec() -> None:
+    """Filters are parsed into names, operators and values."""
+    result = parse_filter_spec(
+        "filter[name]=John&filter[age][gte]=30&filter[id]=1,2,3&page[limit]=5"
+    )
+    assert result == (
+        ("name", "eq", ("John",)),
+        ("age", "gte", ("30",)),
+        ("id", "eq", ("1", "2", "3")),
+    )
+    # The same query string is only parsed once.
+    assert parse_filter_spec("filter[name]=John") is parse_filter_spec(
+        "filter[name]=John"
+    )
+
+
+def filter_artists(factory: APIRequestFactory, params: Dict[str, Any]) -> Any:
+    """Filter the artists in the database."""
+    request = factory.get(reverse("db-artist-list"), params)
+    response = ArtistViewSet.as_view({"get": "list"})(request)
+    response.render()
+    return response
+
+
+def artist_names(response: Any) -> List[str]:
+    """Return the first names of the artists in a response."""
+    return [a["attributes"]["firstName"] for a in json.loads(response.content)["data"]]
+
+
+@mark_urls
+def test_filter_backend(factory: APIRequestFactory, db_data: None) -> None:
+    """Filters are applied in the database, using the transformed names."""
+    assert artist_names(filter_artists(factory, {"filter[lastName]": "Davis"})) == [
+        "Miles"
+    ]
+    assert artist_names(
+        filter_artists(factory, {"filter[lastName]": "Davis,Coltrane"})
+    ) == ["Miles", "John"]
+    assert artist_names(filter_artists(factory, {"filter[lastName][ne]": "Davis"})) == [
+        "John"
+    ]
+    assert artist_names(
+        filter_artists(factory, {"filter[firstName][startswith]": "Mi"})
+    ) == ["Miles"]
+
+    miles = Artist.objects.get(first_name="Miles")
+    assert artist_names(filter_artists(factory, {"filter[id][gt]": miles.pk})) == [
+        "John"
+    ]
+
+
+@mark_urls
+def test_filter_backend_relationship(factory: APIRequestFactory, db_data: None) -> None:
+    """You can filter on the ID of a relationship."""
+    miles = Artist.objects.get(first_name="Miles")
+    request = factory.get(reverse("db-album-list"), {"filter[artist]": miles.pk})
+    response = AlbumViewSet.as_view({"get": "list"})(request)
+    response.render()
+    data = json.loads(response.content)["data"]
+    assert [a["attributes"]["albumName"] for a in data] == ["Birth of the Cool"]
+
+    request = factory.get(reverse("db-album-list"), {"filter[artist][isnull]": "true"})
+    response = AlbumViewSet.as_view({"get": "list"})(request)
+    response.render()
+    data = json.loads(response.content)["data"]
+    assert [a["attributes"]["albumName"] for a in data] == ["Unknown Artist"]
+
+
+@mark_urls
+def test_filter_backend_relationship_invalid(
+    factory: APIRequestFactory, db_data: None
+) -> None:
+    """The IDs of relationships are converted like the related primary key."""
+    for member in ("artist", "tracks"):
+        param = "filter[%s]" % member
+        request = factory.get(reverse("db-album-list"), {param: "abc"})
+        response = AlbumViewSet.as_view({"get": "list"})(request)
+        response.render()
+        assert response.status_code == 400
+        ((error,),) = [e[param] for e in json.loads(response.content)["errors"]]
+        assert "abc" in error and "integer" in error
+
+
+class NamedArtistSerializer(ArtistSerializer):
+    """An artist serializer with a method field, which isn't in the database."""
+
+    full_name = serializers.SerializerMethodField()
+    schema = camel_schema("artist")
+
+    class Meta:
+        model = Artist
+        fields = ("id", "first_name", "last_name", "full_name")
+
+    def get_full_name(self, obj: Artist) -> str:
+        """Return the full name of the artist."""
+        return "%s %s" % (obj.first_name, obj.last_name)
+
+
+@mark_urls
+def test_filter_backend_not_model_field(
+    factory: APIRequestFactory, db_data: None
+) -> None:
+    """Fields that aren't model fields can't be filtered."""
+    viewset: Type[GenericViewSet] = type(
+        "NamedArtistViewSet",
+        (ArtistViewSet,),
+        {"serializer_class": NamedArtistSerializer},
+    )
+    request = factory.get(reverse("db-artist-list"), {"filter[fullName]": "Miles"})
+    response = viewset.as_view({"get": "list"})(request)
+    response.render()
+    assert response.status_code == 400
+    assert json.loads(response.content) == {
+        "errors": [{"filter[fullName]": ["Invalid filter."]}]
+    }
+
+
+@mark_urls
+def test_filter_backend_invalid(factory: APIRequestFactory, db_data: None) -> None:
+    """Invalid filters are rejected."""
+    response = filter_artists(factory, {"filter[first_name]": "Miles"})
+    assert response.status_code == 400
+    assert json.loads(response.content) == {
+        "errors": [{"filter[first_name]": ["Invalid filter."]}]
+    }
+
+    response = filter_artists(factory, {"filter[firstName][like]": "Miles"})
+    assert response.status_code == 400
+
+    response = filter_artists(factory, {"filter[firstName][gt]": "Miles,John"})
+    assert response.status_code == 400
+
+    response = filter_artists(factory, {"filter[id]": "foo"})
+    assert response.status_code == 400
+    assert json.loads(response.content) == {
+        "errors": [{"filter[id]": ["A valid integer is required."]}]
+    }
+
+
+@mark_urls
+def test_sort_backend(factory: APIRequestFactory, db_data: None) -> None:
+    """The sort parameter orders the results in the database."""
+    Artist.objects.create(first_name="Alice", last_name="Coltrane")
+    assert artist_names(filter_artists(factory, {"sort": "lastName"})) == [
+        "John",
+        "Alice",
+        "Miles",
+    ]
+    assert artist_names(filter_artists(factory, {"sort": "lastName,firstName"})) == [
+        "Alice",
+        "John",
+        "Miles",
+    ]
+    # The primary key breaks ties.
+    assert artist_names(filter_artists(factory, {"sort": "-lastName"})) == [
+        "Miles",
+        "John",
+        "Alice",
+    ]
+    assert artist_names(filter_artists(factory, {"sort": "-id"})) == [
+        "Alice",
+        "John",
+        "Miles",
+    ]
+
+
+@mark_urls
+def test_sort_backend_invalid(factory: APIRequestFactory, db_data: None) -> None:
+    """Only sortable attributes can be sorted by."""
+    response = filter_artists(factory, {"sort": "last_name"})
+    assert response.status_code == 400
+    assert json.loads(response.content) == {
+        "errors": [{"sort": ["Invalid sort field."]}]
+    }
+
+    request = factory.get(reverse("db-album-list"), {"sort": "albumName"})
+    response = AlbumViewSet.as_view({"get": "list"})(request)
+    assert response.status_code == 400
+
+
+@mark_urls
+def test_sort_backend_index_warning(
+    factory: APIRequestFactory,
+    db_data: None,
+    settings: Any,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """In debug mode, sorting without an index logs a warning."""
+    settings.DEBUG = True
+    filter_artists(factory, {"sort": "-lastName"})
+    assert "has no index on last_name" in caplog.text
+
+    caplog.clear()
+    request = factory.get(reverse("db-track-list"), {"sort": "album,trackNum"})
+    response = TrackViewSet.as_view({"get": "list"})(request)
+    assert response.status_code == 200
+    assert caplog.text == ""
+
+
+@pytest.mark.skipif(django.VERSION < (3, 2), reason="Indexes on expressions")
+def test_has_sort_index_expression(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Indexes on expressions, which have no fields, are skipped."""
+    index = Index(Lower("last_name"), name="artist_lower_last_name")
+    monkeypatch.setattr(Artist._meta, "indexes", [index])
+    assert not has_sort_index(Artist, "last_name")
+
+
+@mark_urls
+def test_relationship_count_backend(
+    factory: APIRequestFactory,
+    db_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """Relationships in count mode are counted in the list query."""
+    request = factory.get(
+        reverse("db-album-list"), {"relationships[album]": "tracks:count"}
+    )
+    with django_assert_num_queries(1):
+        response = AlbumViewSet.as_view({"get": "list"})(request)
+        response.render()
+    data = json.loads(response.content)["data"]
+    assert [a["relationships"]["tracks"] for a in data] == [
+        {"meta": {"count": 0}},
+        {"meta": {"count": 4}},
+        {"meta": {"count": 0}},
+    ]
+    # The other relationships are unchanged.
+    assert "data" in data[0]["relationships"]["artist"]
+
+
+@mark_urls
+def test_relationship_count_backend_filtered(
+    factory: APIRequestFactory, db_data: None
+) -> None:
+    """Counts don't depend on filters on the same relationship."""
+    track = Track.objects.get(name="Jeru")
+    for (url, viewset, type) in (
+        ("db-playlist-list", PlaylistViewSet, "playlist"),
+        ("db-album-list", AlbumViewSet, "album"),
+    ):
+        request = factory.get(
+            reverse(url),
+            {"relationships[%s]" % type: "tracks:count", "filter[tracks]": track.pk},
+        )
+        response = viewset.as_view({"get": "list"})(request)
+        response.render()
+        data = json.loads(response.content)["data"]
+        assert [obj["relationships"]["tracks"] for obj in data] == [
+            {"meta": {"count": 2 if type == "playlist" else 4}}
+        ]
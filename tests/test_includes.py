@@ -0,0 +1,423 @@
+import asyncio
+import json
+import sys
+import threading
+from typing import Any, Dict, List, Sequence, Type
+
+import django
+import pytest
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import GenericViewSet
+
+from rest_framework_json_schema.includes import (
+    IncludeLoader,
+    IncludeResolver,
+    in_event_loop,
+)
+from rest_framework_json_schema.metrics import InMemoryMetrics
+from rest_framework_json_schema.renderers import JSONAPIRenderer
+from rest_framework_json_schema.schema import Context, IdentityMap, RelationshipObject
+from rest_framework_json_schema.views import JSONAPIAsyncMixin
+from tests.dummy.models import Album, Artist, Track
+from tests.support import db_views
+from tests.support.db_serializers import TrackSerializer
+from tests.support.decorators import mark_urls
+from tests.support.views import AlbumViewSet
+
+try:
+    from asgiref.sync import async_to_sync
+except ImportError:  # Django < 3.0
+    async_to_sync = None  # type: ignore
+
+requires_async = pytest.mark.skipif(
+    async_to_sync is None or django.VERSION < (3, 1), reason="Async views"
+)
+
+
+class DepthFirstRenderer(JSONAPIRenderer):
+    """Render included resources one by one, as they are found."""
+
+    include_loader_class = None
+
+
+def get_list(
+    factory: APIRequestFactory, viewset: Type[GenericViewSet], include: str
+) -> Any:
+    """Return the rendered list of albums, and the number of queries it took."""
+    request = factory.get(reverse("db-album-list"), {"include": include})
+    with CaptureQueriesContext(connection) as queries:
+        response = viewset.as_view({"get": "list"})(request)
+        response.render()
+    assert response.status_code == 200, response.content
+    return json.loads(response.content), len(queries)
+
+
+def by_id(resources: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+    """Return the resources by type and ID."""
+    return {(obj["type"], obj["id"]): obj for obj in resources}
+
+
+@mark_urls
+def test_include_breadth_first(factory: APIRequestFactory, db_data: None) -> None:
+    """Included resources are the same as when rendered depth-first."""
+    depth_first = type(
+        "DepthFirstAlbumViewSet",
+        (db_views.AlbumViewSet,),
+        {"renderer_classes": (DepthFirstRenderer,)},
+    )
+    include = "artist,tracks.album.artist"
+    content, _queries = get_list(factory, db_views.AlbumViewSet, include)
+    expected, _queries = get_list(factory, depth_first, include)
+    assert content["data"] == expected["data"]
+    assert by_id(content["included"]) == by_id(expected["included"])
+    # Level by level, and once each: the tracks have the same album, whose
+    # artist is already included.
+    assert [obj["type"] for obj in content["included"]] == [
+        "artist",
+        "artist",
+        "track",
+        "track",
+        "track",
+        "track",
+        "album",
+    ]
+
+
+@mark_urls
+def test_include_unique(factory: APIRequestFactory, db_data: None) -> None:
+    """Resources referenced many times are only included once."""
+    request = factory.get(reverse("db-track-list"), {"include": "album.artist"})
+    response = db_views.TrackViewSet.as_view({"get": "list"})(request)
+    response.render()
+    included = json.loads(response.content)["included"]
+    assert [(obj["type"], obj["id"]) for obj in included] == [
+        ("album", str(Album.objects.get(album_name="Birth of the Cool").pk)),
+        ("artist", str(Artist.objects.get(first_name="Miles").pk)),
+    ]
+
+    # The album is rendered again as tracks.album.artist, which includes its
+    # artist, but it's only included once.
+    request = factory.get(
+        reverse("db-track-list"), {"include": "album.tracks.album.artist"}
+    )
+    response = db_views.TrackViewSet.as_view({"get": "list"})(request)
+    response.render()
+    included = json.loads(response.content)["included"]
+    assert [obj["type"] for obj in included] == ["album"] + ["track"] * 4 + ["artist"]
+
+
+@mark_urls
+def test_include_queries(factory: APIRequestFactory, db_data: None) -> None:
+    """The number of queries grows with the include paths, not the resources."""
+    # The linkage of the primary data's tracks is prefetched too.
+    viewset = type(
+        "PrefetchAlbumViewSet",
+        (db_views.AlbumViewSet,),
+        {"queryset": Album.objects.prefetch_related("tracks").order_by("pk")},
+    )
+    include = "artist,tracks.album.artist"
+    _content, expected = get_list(factory, viewset, include)
+
+    for num in range(3):
+        artist = Artist.objects.create(first_name="Artist", last_name=str(num))
+        album = Album.objects.create(album_name="Album %s" % num, artist=artist)
+        for track_num in range(3):
+            Track.objects.create(track_num=track_num, name="Track", album=album)
+
+    content, queries = get_list(factory, viewset, include)
+    assert len(content["data"]) == 6
+    assert queries == expected
+
+
+@mark_urls
+def test_include_loader(factory: APIRequestFactory, db_data: None) -> None:
+    """Loaders can load the included resources of a type in bulk."""
+    calls = []
+
+    class Loader(IncludeLoader):
+        def load_many(self, type: str, ids: Sequence[Any]) -> Dict[str, Any]:
+            calls.append((type, sorted(ids)))
+            return super().load_many(type, ids)
+
+    class Renderer(JSONAPIRenderer):
+        include_loader_class = Loader
+
+    viewset = type(
+        "LoaderAlbumViewSet",
+        (db_views.AlbumViewSet,),
+        {"renderer_classes": (Renderer,)},
+    )
+    content, _queries = get_list(factory, viewset, "artist,tracks")
+    artists = sorted(Artist.objects.values_list("pk", flat=True))
+    tracks = sorted(Track.objects.values_list("pk", flat=True))
+    assert calls == [("artist", artists), ("track", tracks)]
+    assert len(content["included"]) == len(artists) + len(tracks)
+
+
+@mark_urls
+def test_include_concurrent(factory: APIRequestFactory) -> None:
+    """The types of a level can be loaded concurrently, in the same order."""
+    threads = {}
+    resolvers = []
+
+    class Loader(IncludeLoader):
+        def load_many(self, type: str, ids: Sequence[Any]) -> Dict[str, Any]:
+            threads[type] = threading.current_thread()
+            return super().load_many(type, ids)
+
+    class Resolver(IncludeResolver):
+        max_workers = 2
+
+        def __init__(self, loader: IncludeLoader) -> None:
+            super().__init__(loader)
+            resolvers.append(self)
+
+    class Renderer(JSONAPIRenderer):
+        include_loader_class = Loader
+        include_resolver_class = Resolver
+
+    def get_albums(viewset: Type[GenericViewSet]) -> Any:
+        request = factory.get(reverse("album-list"), {"include": "artist,tracks.album"})
+        response = viewset.as_view({"get": "list"})(request)
+        response.render()
+        return json.loads(response.content)
+
+    viewset = type(
+        "ConcurrentAlbumViewSet", (AlbumViewSet,), {"renderer_classes": (Renderer,)}
+    )
+    assert get_albums(viewset) == get_albums(AlbumViewSet)
+    # Levels with a single type are loaded in the rendering thread.
+    assert threads["artist"] != threading.current_thread()
+    assert threads["track"] != threading.current_thread()
+    assert threads["album"] == threading.current_thread()
+    # One load per level and type.
+    (resolver,) = resolvers
+    assert sorted(level_type[:2] for level_type in resolver.timings) == [
+        (1, "artist"),
+        (1, "track"),
+        (2, "album"),
+    ]
+
+
+def test_include_concurrent_connections(
+    db: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Workers don't close the connections they share with the request's thread."""
+    shared = connections["default"]
+    closed = []
+    monkeypatch.setattr(shared, "close", lambda: closed.append(shared))
+    resolver = IncludeResolver(IncludeLoader(Context(None)))
+    loaded = []
+
+    def load() -> None:
+        connections["default"] = shared
+        loaded.append(resolver.load_in_thread("artist", []))
+
+    shared.inc_thread_sharing()
+    try:
+        worker = threading.Thread(target=load)
+        worker.start()
+        worker.join()
+    finally:
+        shared.dec_thread_sharing()
+    assert loaded == [{}]
+    assert closed == []
+
+
+@mark_urls
+def test_identity_map(factory: APIRequestFactory, db_data: None) -> None:
+    """References to the same resource share its identifier, but not its linkage."""
+    request = Request(factory.get(reverse("db-track-list")))
+    data = TrackSerializer(
+        Track.objects.all(), many=True, context={"request": request}
+    ).data
+    identifiers = {id(track["album"]) for track in data}
+    assert len(identifiers) == 1
+
+    identity_map = IdentityMap.for_request(request)
+    assert identity_map is IdentityMap.for_request(request)
+    context = Context(request)
+    linkage = [
+        RelationshipObject().render(track, track["album"], context, False)[0]
+        for track in data
+    ]
+    assert linkage[0] == {"data": {"id": str(data[0]["album"].id), "type": "album"}}
+    assert all(rel["data"] == linkage[0]["data"] for rel in linkage)
+    linkage[0]["data"]["meta"] = {"position": 1}
+    assert all("meta" not in rel["data"] for rel in linkage[1:])
+
+
+@mark_urls
+def test_include_loaded_once(factory: APIRequestFactory, db_data: None) -> None:
+    """Resources included at several levels are only loaded once."""
+    _content, expected = get_list(factory, db_views.AlbumViewSet, "tracks.album")
+    content, queries = get_list(
+        factory, db_views.AlbumViewSet, "tracks.album.tracks.album"
+    )
+    assert queries == expected
+    assert len(by_id(content["included"])) == 4 + 1
+
+
+@requires_async
+@mark_urls
+def test_include_async(factory: APIRequestFactory) -> None:
+    """Async views load the included resources of each level on the event loop."""
+    calls = []
+
+    class Loader(IncludeLoader):
+        async def aload_many(self, type: str, ids: Sequence[Any]) -> Dict[str, Any]:
+            calls.append(type)
+            return await super().aload_many(type, ids)
+
+    class Renderer(JSONAPIRenderer):
+        include_loader_class = Loader
+
+    viewset: Type[GenericViewSet] = type(
+        "AsyncAlbumViewSet",
+        (JSONAPIAsyncMixin, AlbumViewSet),
+        {"renderer_classes": (Renderer,)},
+    )
+    view = viewset.as_view({"get": "list"})
+    assert asyncio.iscoroutinefunction(view)
+
+    request = factory.get(reverse("album-list"), {"include": "artist,tracks.album"})
+    response = async_to_sync(view)(request)
+    assert sorted(calls) == ["album", "artist", "track"]
+
+    request = factory.get(reverse("album-list"), {"include": "artist,tracks.album"})
+    expected = AlbumViewSet.as_view({"get": "list"})(request)
+    expected.render()
+    assert json.loads(response.content) == json.loads(expected.content)
+
+
+@pytest.mark.parametrize("version", [sys.version_info, (3, 6, 15)])
+def test_in_event_loop(monkeypatch: pytest.MonkeyPatch, version: Any) -> None:
+    """The running event loop is detected, including on Python 3.6."""
+
+    async def check() -> bool:
+        with monkeypatch.context() as m:
+            m.setattr(sys, "version_info", version)
+            return in_event_loop()
+
+    assert asyncio.get_event_loop_policy().new_event_loop().run_until_complete(check())
+    monkeypatch.setattr(sys, "version_info", version)
+    assert not in_event_loop()
+
+
+@requires_async
+@mark_urls
+def test_arender(factory: APIRequestFactory) -> None:
+    """Renderers can render asynchronously."""
+    request = factory.get(reverse("album-list"), {"include": "artist"})
+    response = AlbumViewSet.as_view({"get": "list"})(request)
+    response.render()
+    renderer = JSONAPIRenderer()
+    content = async_to_sync(renderer.arender)(
+        response.data, response.accepted_media_type, response.renderer_context
+    )
+    assert content == response.content
+
+
+class ExpiringLoader(IncludeLoader):
+    """Load included resources, slowly enough to reach the deadline."""
+
+    def load_many(self, type: str, ids: Sequence[Any]) -> Dict[str, Any]:
+        """Load the resources, then make the deadline of the document near."""
+        loaded = super().load_many(type, ids)
+        self.context.deadline.expires = 0.0
+        return loaded
+
+
+@mark_urls
+def test_render_deadline(factory: APIRequestFactory) -> None:
+    """Once the deadline is near, included resources are no longer expanded."""
+    metrics = InMemoryMetrics()
+    for renderer_class in (JSONAPIRenderer, DepthFirstRenderer):
+        renderer = type("MetricsRenderer", (renderer_class,), {"metrics": metrics})
+        viewset: Type[GenericViewSet] = type(
+            "DeadlineAlbumViewSet",
+            (AlbumViewSet,),
+            {"renderer_classes": (renderer,), "render_deadline": 0},
+        )
+        request = factory.get(reverse("album-list"), {"include": "tracks,artist"})
+        response = viewset.as_view({"get": "list"})(request)
+        response.render()
+        content = json.loads(response.content)
+        assert len(content["data"]) == 4
+        assert all(obj["relationships"] for obj in content["data"])
+        assert "included" not in content
+        assert content["meta"] == {"omittedIncludes": ["artist", "tracks"]}
+        assert content["links"]["omittedIncludes"] == (
+            "http://testserver/api/album/?include=artist%2Ctracks"
+        )
+
+    assert metrics.counters["jsonapi_omitted_includes_total"] == {
+        (("type", "album"), ("path", "artist")): 2,
+        (("type", "album"), ("path", "tracks")): 2,
+    }
+
+    # Without a deadline, everything is included.
+    request = factory.get(reverse("album-list"), {"include": "tracks,artist"})
+    response = AlbumViewSet.as_view({"get": "list"})(request)
+    response.render()
+    content = json.loads(response.content)
+    assert len(content["included"]) == 7
+    assert "meta" not in content
+
+
+@mark_urls
+def test_render_deadline_levels(factory: APIRequestFactory, db_data: None) -> None:
+    """Levels of included resources loaded before the deadline are kept."""
+    renderer = type(
+        "DeadlineRenderer",
+        (JSONAPIRenderer,),
+        {"include_loader_class": ExpiringLoader, "render_deadline": 10.0},
+    )
+    viewset = type(
+        "DeadlineAlbumViewSet",
+        (db_views.AlbumViewSet,),
+        {"renderer_classes": (renderer,)},
+    )
+    content, _queries = get_list(factory, viewset, "artist,tracks.album.artist")
+    assert [obj["type"] for obj in content["included"]] == ["artist"] * 2 + [
+        "track"
+    ] * 4
+    assert content["meta"] == {"omittedIncludes": ["tracks.album"]}
+
+
+@mark_urls
+def test_render_state_per_document(factory: APIRequestFactory, db_data: None) -> None:
+    """A renderer keeps the state of each document apart, even when nested."""
+    nested: List[Dict[str, Any]] = []
+
+    class NestingRenderer(JSONAPIRenderer):
+        include_loader_class = ExpiringLoader
+        render_deadline = 10.0
+
+        def render_resources(self, *args: Any) -> Any:
+            result = super().render_resources(*args)
+            if not nested:
+                nested.append({})
+                request = factory.get(reverse("db-artist-list"))
+                response = db_views.ArtistViewSet.as_view({"get": "list"})(request)
+                content = self.render(
+                    response.data,
+                    response.accepted_media_type,
+                    dict(response.renderer_context, response=response),
+                )
+                nested[0] = json.loads(content)
+            return result
+
+    viewset = type(
+        "DeadlineAlbumViewSet",
+        (db_views.AlbumViewSet,),
+        {"renderer_classes": (NestingRenderer,)},
+    )
+    content, _queries = get_list(factory, viewset, "artist,tracks.album.artist")
+    assert content["meta"] == {"omittedIncludes": ["tracks.album"]}
+    assert len(nested[0]["data"]) == 2
+    assert "meta" not in nested[0]
@@ -0,0 +1,122 @@
+from typing import Type
+
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import GenericViewSet
+
+from rest_framework_json_schema.metrics import (
+    Histogram,
+    InMemoryMetrics,
+    PrometheusMetricsView,
+)
+from rest_framework_json_schema.renderers import JSONAPIRenderer
+from tests.support import db_views
+from tests.support.decorators import mark_urls
+from tests.support.views import AlbumViewSet
+
+
+def metrics_viewset(metrics: InMemoryMetrics) -> Type[GenericViewSet]:
+    """Return the album viewset, with its rendering measured by the metrics."""
+    renderer = type("MetricsRenderer", (JSONAPIRenderer,), {"metrics": metrics})
+    return type(
+        "MetricsAlbumViewSet", (AlbumViewSet,), {"renderer_classes": (renderer,)}
+    )
+
+
+def test_histogram() -> None:
+    """Histograms count observations in cumulative buckets."""
+    histogram = Histogram([1, 5])
+    for value in (0, 1, 2, 10):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("1", 2), ("5", 3), ("+Inf", 4)]
+    assert histogram.sum == 13
+    assert histogram.count == 4
+
+
+@mark_urls
+def test_metrics(factory: APIRequestFactory) -> None:
+    """Rendering is measured by resource type and include path."""
+    metrics = InMemoryMetrics()
+    view_list = metrics_viewset(metrics).as_view({"get": "list"})
+    for _i in range(2):
+        response = view_list(
+            factory.get(reverse("album-list"), {"include": "tracks,artist"})
+        )
+        response.render()
+
+    labels = (("type", "album"), ("include", "artist,tracks"))
+    assert metrics.counters["jsonapi_documents_total"] == {labels: 2}
+    resources = metrics.histograms["jsonapi_document_resources"][labels]
+    # 4 albums, 3 artists and 4 tracks.
+    assert (resources.count, resources.sum) == (2, 2 * 11)
+    size = metrics.histograms["jsonapi_document_bytes"][labels]
+    assert size.sum == 2 * len(response.content)
+
+    rendered = metrics.histograms["jsonapi_resource_render_seconds"]
+    assert {key: histogram.count for (key, histogram) in rendered.items()} == {
+        (("type", "album"), ("path", "")): 8,
+        (("type", "artist"), ("path", "artist")): 6,
+        (("type", "track"), ("path", "tracks")): 8,
+    }
+    fan_out = metrics.histograms["jsonapi_included_members"]
+    assert {key: histogram.sum for (key, histogram) in fan_out.items()} == {
+        (("path", "artist"),): 6,
+        (("path", "tracks"),): 8,
+    }
+
+
+@mark_urls
+def test_metrics_include_label(factory: APIRequestFactory, db_data: None) -> None:
+    """The include label only has the distinct paths of the view's relationships."""
+    metrics = InMemoryMetrics()
+    renderer = type("MetricsRenderer", (JSONAPIRenderer,), {"metrics": metrics})
+    viewset: Type[GenericViewSet] = type(
+        "MetricsAlbumViewSet",
+        (db_views.AlbumViewSet,),
+        {"renderer_classes": (renderer,)},
+    )
+    for params in (
+        {"include": "tracks.album,artist,tracks,artist"},
+        {"include": "artist,tracks.album"},
+        # Unknown paths aren't checked without data to render.
+        {"include": "unknown.path", "filter[albumName]": "Nothing"},
+    ):
+        response = viewset.as_view({"get": "list"})(
+            factory.get(reverse("db-album-list"), params)
+        )
+        response.render()
+        assert response.status_code == 200
+
+    assert metrics.counters["jsonapi_documents_total"] == {
+        (("type", "album"), ("include", "artist,tracks.album")): 2,
+        (("type", "album"), ("include", "")): 1,
+    }
+
+
+@mark_urls
+def test_prometheus_export(factory: APIRequestFactory) -> None:
+    """Metrics are exported in the Prometheus text format."""
+    metrics = InMemoryMetrics()
+    response = metrics_viewset(metrics).as_view({"get": "list"})(
+        factory.get(reverse("album-list"))
+    )
+    response.render()
+
+    view = PrometheusMetricsView.as_view(metrics=metrics)
+    response = view(factory.get("/metrics"))
+    response.render()
+    assert response["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+    lines = response.content.decode("utf-8").splitlines()
+    assert lines[:3] == [
+        "# HELP jsonapi_documents_total Rendered documents.",
+        "# TYPE jsonapi_documents_total counter",
+        'jsonapi_documents_total{type="album",include=""} 1',
+    ]
+    assert "# TYPE jsonapi_document_render_seconds histogram" in lines
+    assert 'jsonapi_resource_render_seconds_count{type="album",path=""} 4' in lines
+    assert "jsonapi_included_members" not in response.content.decode("utf-8")
+
+    metrics.clear()
+    response = view(factory.get("/metrics"))
+    response.render()
+    assert response.content == b"\n"
@@ -1,8 +1,21 @@
 import json
+from typing import Any, Dict, List
 
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
 from django.urls import reverse
+from pytest_django import DjangoAssertNumQueries
+from rest_framework.request import Request
 from rest_framework.test import APIRequestFactory
 
+from tests.dummy.models import Artist
+from tests.support.db_views import (
+    CountPaginateViewSet,
+    CountPagination,
+    CursorPaginateViewSet,
+)
 from tests.support.decorators import mark_urls
 from tests.support.views import PaginateViewSet, NonJSONPaginateViewSet
 
@@ -52,3 +65,214 @@ def test_no_pagination_limit_offset(factory: APIRequestFactory) -> None:
     data = json.loads(response.content.decode())
     assert "meta" in data
     assert "data" in data["meta"]
+
+
+def get_page(factory: APIRequestFactory, url: str) -> Dict[str, Any]:
+    """Fetch a page from the cursor paginated viewset."""
+    response = CursorPaginateViewSet.as_view({"get": "list"})(factory.get(url))
+    response.render()
+    assert response.status_code == 200
+    return json.loads(response.content.decode())
+
+
+def names(page: Dict[str, Any]) -> List[str]:
+    """Return the names of the artists in a page."""
+    return [
+        "%s %s" % (item["attributes"]["firstName"], item["attributes"]["lastName"])
+        for item in page["data"]
+    ]
+
+
+@mark_urls
+def test_pagination_cursor(
+    factory: APIRequestFactory,
+    db: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """Cursor pagination walks forward and backward through a stable ordering."""
+    for (first_name, last_name) in (
+        ("Miles", "Davis"),
+        ("John", "Coltrane"),
+        ("Charles", "Mingus"),
+        ("Bill", "Evans"),
+        ("Alice", "Coltrane"),
+    ):
+        Artist.objects.create(first_name=first_name, last_name=last_name)
+
+    # Only one query is made for each page, there is no count.
+    with django_assert_num_queries(1):
+        page = get_page(factory, reverse("db-page-list"))
+    assert names(page) == ["John Coltrane", "Alice Coltrane"]
+    assert "meta" not in page
+    assert page["links"]["page[previous]"] is None
+
+    page = get_page(factory, page["links"]["page[next]"])
+    assert names(page) == ["Miles Davis", "Bill Evans"]
+
+    last = get_page(factory, page["links"]["page[next]"])
+    assert names(last) == ["Charles Mingus"]
+    assert last["links"]["page[next]"] is None
+
+    page = get_page(factory, last["links"]["page[previous]"])
+    assert names(page) == ["Miles Davis", "Bill Evans"]
+
+    first = get_page(factory, page["links"]["page[previous]"])
+    assert names(first) == ["John Coltrane", "Alice Coltrane"]
+    assert first["links"]["page[previous]"] is None
+
+    # The client can choose the page size
+    page = get_page(factory, reverse("db-page-list") + "?page[size]=4")
+    assert names(page) == [
+        "John Coltrane",
+        "Alice Coltrane",
+        "Miles Davis",
+        "Bill Evans",
+    ]
+    assert "page%5Bsize%5D=4" in page["links"]["page[next]"]
+
+
+@mark_urls
+def test_pagination_invalid_cursor(factory: APIRequestFactory, db: None) -> None:
+    """Cursors that have been tampered with are rejected."""
+    Artist.objects.create(first_name="Miles", last_name="Davis")
+    request = factory.get(reverse("db-page-list"), {"page[cursor]": "forged"})
+    response = CursorPaginateViewSet.as_view({"get": "list"})(request)
+    assert response.status_code == 404
+
+
+def get_counted_page(factory: APIRequestFactory, params: Dict[str, Any]) -> Any:
+    """Fetch a page from the limit/offset paginated viewset."""
+    request = factory.get(reverse("db-count-list"), params)
+    response = CountPaginateViewSet.as_view({"get": "list"})(request)
+    response.render()
+    return json.loads(response.content.decode())
+
+
+@pytest.fixture
+def count_data(db: None) -> None:
+    """Create artists to be counted."""
+    cache.clear()
+    for (first_name, last_name) in (
+        ("Miles", "Davis"),
+        ("John", "Coltrane"),
+        ("Charles", "Mingus"),
+    ):
+        Artist.objects.create(first_name=first_name, last_name=last_name)
+
+
+@mark_urls
+def test_count_window(
+    factory: APIRequestFactory,
+    count_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """The window strategy counts in the page query."""
+    with django_assert_num_queries(1):
+        page = get_counted_page(factory, {"page[count]": "window"})
+    assert page["meta"] == {"count": 3}
+    assert len(page["data"]) == 2
+    assert page["links"]["page[next]"] is not None
+
+    with django_assert_num_queries(1):
+        page = get_counted_page(factory, {"page[count]": "window", "offset": 2})
+    assert page["meta"] == {"count": 3}
+    assert page["links"]["page[next]"] is None
+
+    # Past the end, there's nothing for the window to count.
+    page = get_counted_page(factory, {"page[count]": "window", "offset": 5})
+    assert page["meta"] == {"count": 3}
+    assert page["data"] == []
+
+
+@mark_urls
+def test_count_none(
+    factory: APIRequestFactory,
+    count_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """Counts can be omitted, while still knowing if there's a next page."""
+    with django_assert_num_queries(1):
+        page = get_counted_page(factory, {"page[count]": "none"})
+    assert "meta" not in page
+    assert page["links"]["page[next]"] is not None
+
+    page = get_counted_page(factory, {"page[count]": "none", "offset": 1})
+    assert len(page["data"]) == 2
+    assert page["links"]["page[next]"] is None
+
+
+@mark_urls
+def test_count_cached(
+    factory: APIRequestFactory,
+    count_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """Cached counts are keyed by the filtered query."""
+    with django_assert_num_queries(2):
+        page = get_counted_page(factory, {"page[count]": "cached"})
+    assert page["meta"] == {"count": 3}
+
+    Artist.objects.create(first_name="Bill", last_name="Evans")
+    # The count comes from the cache.
+    with django_assert_num_queries(1):
+        page = get_counted_page(factory, {"page[count]": "cached", "offset": 2})
+    assert page["meta"] == {"count": 3}
+
+    # The exact count is still available.
+    page = get_counted_page(factory, {"page[count]": "exact"})
+    assert page["meta"] == {"count": 4}
+
+
+@mark_urls
+def test_count_estimated(
+    factory: APIRequestFactory, count_data: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Estimated counts use the query planner, when the database has one."""
+    # SQLite has no estimates, so it falls back to an exact count.
+    page = get_counted_page(factory, {"page[count]": "estimated"})
+    assert page["meta"] == {"count": 3}
+
+    def explain(self: QuerySet, format: str) -> str:
+        assert format == "json"
+        return json.dumps([{"Plan": {"Node Type": "Seq Scan", "Plan Rows": 12000}}])
+
+    monkeypatch.setattr(connection, "vendor", "postgresql")
+    monkeypatch.setattr(QuerySet, "explain", explain)
+    page = get_counted_page(factory, {"page[count]": "estimated"})
+    assert page["meta"] == {"estimatedCount": 12000}
+    assert page["links"]["page[next]"] is not None
+
+
+@mark_urls
+def test_pagination_cursor_sort(factory: APIRequestFactory, count_data: None) -> None:
+    """Cursor pagination follows the JSON API sort parameter."""
+    page = get_page(factory, reverse("db-page-list") + "?sort=-firstName")
+    assert names(page) == ["Miles Davis", "John Coltrane"]
+    assert "sort=-firstName" in page["links"]["page[next]"]
+
+    page = get_page(factory, page["links"]["page[next]"])
+    assert names(page) == ["Charles Mingus"]
+
+    # A cursor can't be used with a different sort.
+    url = page["links"]["page[previous]"].replace("-firstName", "firstName")
+    response = CursorPaginateViewSet.as_view({"get": "list"})(factory.get(url))
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize(
+    "queryset",
+    [Artist.objects.none(), Artist.objects.filter(pk__in=[])],
+    ids=["none", "empty-in"],
+)
+def test_count_cached_empty(
+    factory: APIRequestFactory,
+    db: None,
+    queryset: QuerySet,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """Queries that can't match anything are counted without a cache key."""
+    request = Request(factory.get("/", {"page[count]": "cached"}))
+    paginator = CountPagination()
+    with django_assert_num_queries(0):
+        assert paginator.paginate_queryset(queryset, request) == []
+    assert paginator.count == 0
@@ -1,14 +1,19 @@
 import json
+from typing import Any, List
 
+import pytest
 from django.urls import reverse
 from rest_framework.test import APIRequestFactory
 
+from tests.dummy.models import Album, Track
+from tests.support import db_views
 from tests.support.decorators import mark_urls
 from tests.support.serializers import (
     get_artists,
     get_albums,
     get_tracks,
     get_non_default_ids,
+    QuerySet,
 )
 from tests.support.views import ArtistViewSet, AlbumViewSet, NonDefaultIdViewSet
 
@@ -128,3 +133,171 @@ def test_post_non_default_id(factory: APIRequestFactory) -> None:
     assert response.status_code == 201
     models = get_non_default_ids()
     assert models[0].non_default_id == "foo"
+
+
+@mark_urls
+def test_parse_relationships_bulk(
+    factory: APIRequestFactory, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """To-many relationships are resolved with a single bulk lookup."""
+
+    lookups = []
+    get = QuerySet.get
+
+    def counting_get(self: QuerySet, pk: int) -> Any:
+        lookups.append(pk)
+        return get(self, pk)
+
+    monkeypatch.setattr(QuerySet, "get", counting_get)
+    album_list = AlbumViewSet.as_view({"post": "create"})
+    request = factory.post(
+        reverse("album-list"),
+        {
+            "data": {
+                "type": "album",
+                "attributes": {"albumName": "Kind of Blue"},
+                "relationships": {
+                    "artist": {"data": {"id": 0, "type": "artist"}},
+                    "tracks": {
+                        "data": [
+                            {"id": "2", "type": "track"},
+                            {"id": "0", "type": "track"},
+                            {"id": "3", "type": "track"},
+                        ]
+                    },
+                },
+            }
+        },
+    )
+    response = album_list(request)
+    assert response.status_code == 201
+    # Only the to-one artist relationship is looked up by itself.
+    assert lookups == [0]
+
+
+@mark_urls
+def test_parse_relationships_missing(factory: APIRequestFactory) -> None:
+    """Missing related resources are reported together."""
+    album_list = AlbumViewSet.as_view({"post": "create"})
+    request = factory.post(
+        reverse("album-list"),
+        {
+            "data": {
+                "type": "album",
+                "attributes": {"albumName": "Kind of Blue"},
+                "relationships": {
+                    "artist": {"data": {"id": 0, "type": "artist"}},
+                    "tracks": {
+                        "data": [
+                            {"id": "98", "type": "track"},
+                            {"id": "0", "type": "track"},
+                            {"id": "99", "type": "track"},
+                        ]
+                    },
+                },
+            }
+        },
+    )
+    response = album_list(request)
+    response.render()
+    assert response.status_code == 400
+    assert json.loads(response.content) == {
+        "errors": [{"tracks": ["Invalid pks 98, 99 - objects do not exist."]}]
+    }
+
+
+@mark_urls
+def test_parse_relationships_type_conflict(factory: APIRequestFactory) -> None:
+    """Resource linkage must be of the related resource's type."""
+    album_list = AlbumViewSet.as_view({"post": "create"})
+    request = factory.post(
+        reverse("album-list"),
+        {
+            "data": {
+                "type": "album",
+                "attributes": {"albumName": "Kind of Blue"},
+                "relationships": {
+                    "artist": {"data": {"id": "0", "type": "artist"}},
+                    "tracks": {"data": [{"id": "0", "type": "album"}]},
+                },
+            }
+        },
+    )
+    response = album_list(request)
+    assert response.status_code == 409
+
+
+@mark_urls
+@pytest.mark.parametrize(
+    "relationship",
+    [
+        "0",
+        {"data": ["0"]},
+        {"data": "0"},
+        {"data": [{"type": "track"}]},
+    ],
+    ids=["not-object", "string-member", "string-data", "no-id"],
+)
+def test_parse_relationships_malformed(
+    factory: APIRequestFactory, relationship: Any
+) -> None:
+    """Malformed resource linkage is a bad request."""
+    album_list = AlbumViewSet.as_view({"post": "create"})
+    request = factory.post(
+        reverse("album-list"),
+        {
+            "data": {
+                "type": "album",
+                "attributes": {"albumName": "Kind of Blue"},
+                "relationships": {
+                    "artist": {"data": {"id": "0", "type": "artist"}},
+                    "tracks": relationship,
+                },
+            }
+        },
+    )
+    response = album_list(request)
+    response.render()
+    assert response.status_code == 400
+    (error,) = json.loads(response.content)["errors"]
+    assert "tracks" in error["detail"]
+
+
+@mark_urls
+@pytest.mark.parametrize(
+    "ids,status",
+    [(["0{}", " {} "], 201), (["abc"], 400), ([True], 400)],
+    ids=["normalized", "invalid", "bool"],
+)
+def test_parse_relationships_normalized(
+    factory: APIRequestFactory, db_data: None, ids: List[Any], status: int
+) -> None:
+    """Related IDs are converted by the primary key field of the related model."""
+    jeru, moon = Track.objects.order_by("track_num")[:2]
+    data = [
+        {"id": id.format(pk) if isinstance(id, str) else id, "type": "track"}
+        for id, pk in zip(ids, (jeru.pk, moon.pk))
+    ]
+    album_list = db_views.AlbumViewSet.as_view({"post": "create"})
+    request = factory.post(
+        reverse("db-album-list"),
+        {
+            "data": {
+                "type": "album",
+                "attributes": {"albumName": "Kind of Blue"},
+                "relationships": {
+                    "artist": {"data": None},
+                    "tracks": {"data": data},
+                },
+            }
+        },
+    )
+    response = album_list(request)
+    response.render()
+    assert response.status_code == status
+    if status == 201:
+        album = Album.objects.get(album_name="Kind of Blue")
+        assert set(album.tracks.all()) == {jeru, moon}
+    else:
+        (error,) = json.loads(response.content)["errors"]
+        assert "Incorrect type" in error["tracks"][0]
@@ -0,0 +1,93 @@
+import os
+import pstats
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Type
+
+from django.http.response import HttpResponseBase
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.viewsets import GenericViewSet
+
+from rest_framework_json_schema.profiling import ProfileStore, labelled_call
+from rest_framework_json_schema.views import JSONAPIProfileMixin
+from tests.support.decorators import mark_urls
+from tests.support.views import AlbumViewSet
+
+
+def profiled_view(store: ProfileStore) -> Callable:
+    """Return the album list view, profiled on demand into a store."""
+    viewset: Type[GenericViewSet] = type(
+        "ProfileAlbumViewSet",
+        (JSONAPIProfileMixin, AlbumViewSet),
+        {"profile_store": store},
+    )
+    return viewset.as_view({"get": "list"})
+
+
+def get_albums(
+    factory: APIRequestFactory,
+    view: Callable,
+    is_staff: Optional[bool] = True,
+    **headers: str
+) -> HttpResponseBase:
+    """Get and render the list of albums with their tracks."""
+    request = factory.get(reverse("album-list"), {"include": "tracks"}, **headers)
+    if is_staff is not None:
+        force_authenticate(request, SimpleNamespace(is_staff=is_staff))
+    response = view(request)
+    response.render()
+    return response
+
+
+def test_labelled_call() -> None:
+    """Labelled calls are named after their label."""
+    call = labelled_call("render[album]")
+    assert call(max, 1, 2) == 2
+    assert call.__code__.co_name == "render[album]"
+
+
+@mark_urls
+def test_profile(factory: APIRequestFactory, tmp_path: Path) -> None:
+    """Requests are profiled by staff users that ask for it."""
+    store = ProfileStore(str(tmp_path))
+    view = profiled_view(store)
+
+    response = get_albums(factory, view)
+    assert "X-Profile-Id" not in response
+    response = get_albums(factory, view, is_staff=False, HTTP_X_PROFILE="1")
+    assert "X-Profile-Id" not in response
+    assert store.request_ids() == []
+
+    response = get_albums(
+        factory, view, HTTP_X_PROFILE="1", HTTP_X_REQUEST_ID="albums-1"
+    )
+    assert response["X-Profile-Id"] == "albums-1"
+    assert store.request_ids() == ["albums-1"]
+
+    stats: Dict[Any, Any] = pstats.Stats(store.path("albums-1")).stats  # type: ignore
+    calls = {name: stat[0] for ((_file, _line, name), stat) in stats.items()}
+    # 4 albums and 4 tracks.
+    assert calls["render[album]"] == 4
+    assert calls["render[track]"] == 4
+
+
+@mark_urls
+def test_profile_retention(factory: APIRequestFactory, tmp_path: Path) -> None:
+    """Only the most recent profiles are kept, by request id."""
+    store = ProfileStore(str(tmp_path), retention=2)
+    view = profiled_view(store)
+    for request_id in ("first", "second", "third"):
+        get_albums(factory, view, HTTP_X_PROFILE="1", HTTP_X_REQUEST_ID=request_id)
+    assert store.request_ids() == ["second", "third"]
+
+    # Request ids that aren't safe file names are replaced.
+    response = get_albums(
+        factory, view, HTTP_X_PROFILE="1", HTTP_X_REQUEST_ID="../fourth"
+    )
+    request_id = response["X-Profile-Id"]
+    assert request_id != "../fourth"
+    assert store.request_ids() == ["third", request_id]
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        ["third.prof", request_id + ".prof"]
+    )
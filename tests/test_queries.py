@@ -0,0 +1,156 @@
+import json
+import logging
+from typing import Any, Type
+
+import pytest
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import GenericViewSet
+
+from rest_framework_json_schema.queries import (
+    QueryDetector,
+    assert_no_repeated_queries,
+)
+from rest_framework_json_schema.exceptions import IncludeInvalid
+from rest_framework_json_schema.relations import JSONAPIRelationshipField
+from rest_framework_json_schema.schema import Context, ResourceObject
+from rest_framework_json_schema.utils import parse_include
+from tests.dummy.models import Album, Artist
+from tests.support import db_views
+from tests.support.db_serializers import (
+    AlbumSerializer,
+    ArtistSerializer,
+    camel_schema,
+)
+from tests.support.decorators import mark_urls
+
+
+class CountingArtistSerializer(ArtistSerializer):
+    """An artist serializer that counts the albums of each artist: an N+1."""
+
+    album_count = serializers.SerializerMethodField()
+    schema = camel_schema("artist")
+
+    class Meta:
+        model = Artist
+        fields = ("id", "first_name", "last_name", "album_count")
+
+    def get_album_count(self, obj: Artist) -> int:
+        """Return the number of albums of the artist, with a query."""
+        return obj.albums.count()
+
+
+class CountingAlbumSerializer(AlbumSerializer):
+    """An album serializer whose artists count their albums."""
+
+    artist = JSONAPIRelationshipField(
+        serializer=CountingArtistSerializer,
+        queryset=Artist.objects.all(),
+        allow_null=True,
+    )
+    schema = camel_schema("album")
+
+    class Meta:
+        model = Album
+        fields = ("id", "album_name", "artist", "tracks")
+
+
+def render_albums(
+    factory: APIRequestFactory, viewset: Type[GenericViewSet], include: str
+) -> Any:
+    """Render the list of albums."""
+    request = factory.get(reverse("db-album-list"), {"include": include})
+    response = viewset.as_view({"get": "list"})(request)
+    response.render()
+    return json.loads(response.content)
+
+
+# The tracks of the primary data are queried per album.
+no_prefetch_viewset = type(
+    "NoPrefetchAlbumViewSet", (db_views.AlbumViewSet,), {"prefetch_tracks": False}
+)
+counting_viewset: Type[GenericViewSet] = type(
+    "CountingAlbumViewSet",
+    (db_views.AlbumViewSet,),
+    {"serializer_class": CountingAlbumSerializer},
+)
+
+
+@mark_urls
+def test_no_repeated_queries(factory: APIRequestFactory, db_data: None) -> None:
+    """Included resources are loaded without repeated queries."""
+    with assert_no_repeated_queries():
+        render_albums(factory, db_views.AlbumViewSet, "artist,tracks.album")
+
+    # Without prefetching, the tracks of each album are queried.
+    with QueryDetector().watch() as detector:
+        render_albums(factory, no_prefetch_viewset, "artist,tracks.album")
+    (query,) = detector.repeated()
+    assert (query["path"], query["count"]) == ("", 3)
+
+
+@mark_urls
+def test_repeated_queries(factory: APIRequestFactory, db_data: None) -> None:
+    """Repeated queries are attributed to their include path and type."""
+    with QueryDetector().watch() as detector:
+        render_albums(factory, counting_viewset, "artist")
+    (query,) = detector.repeated()
+    assert (query["path"], query["type"], query["count"]) == ("artist", "artist", 2)
+    assert "COUNT(*)" in query["sql"]
+
+    with pytest.raises(AssertionError, match="2 x artist at 'artist'"):
+        with assert_no_repeated_queries():
+            render_albums(factory, counting_viewset, "artist")
+
+
+@mark_urls
+def test_repeated_queries_debug(
+    factory: APIRequestFactory,
+    db_data: None,
+    settings: Any,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """In DEBUG, repeated queries are logged and rendered in meta."""
+    content = render_albums(factory, counting_viewset, "artist")
+    assert "meta" not in content
+
+    settings.DEBUG = True
+    request = factory.get(reverse("db-album-list"), {"include": "artist"})
+    with caplog.at_level(logging.WARNING, "rest_framework_json_schema.queries"):
+        response = counting_viewset.as_view({"get": "list"})(request)
+        response.render()
+    content = json.loads(response.content)
+    (query,) = content["meta"]["repeated_queries"]
+    assert (query["path"], query["type"], query["count"]) == ("artist", "artist", 2)
+    assert "Query repeated 2 times for artist resources at include path 'artist'" in (
+        caplog.text
+    )
+
+    # The next document rendered by the same renderer, an error, has no report.
+    renderer = response.accepted_renderer
+    request = factory.get(reverse("db-artist-detail", kwargs={"pk": 999}))
+    response = db_views.ArtistViewSet.as_view({"get": "retrieve"})(request, pk=999)
+    assert response.status_code == 404
+    content = json.loads(
+        renderer.render(
+            response.data,
+            response.accepted_media_type,
+            dict(response.renderer_context, response=response),
+        )
+    )
+    assert "meta" not in content
+
+
+def test_scopes_after_error() -> None:
+    """The scope of a resource is exited even if rendering it fails."""
+
+    class AlbumObject(ResourceObject):
+        type = "album"
+        relationships = ("artist",)
+
+    detector = QueryDetector()
+    context = Context(None, parse_include("tracks"), detector=detector)
+    with pytest.raises(IncludeInvalid):
+        AlbumObject().render({"id": "1", "artist": None}, context)
+    assert detector.scopes == [("", "")]
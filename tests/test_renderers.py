@@ -1,8 +1,16 @@
 import json
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence
 
+import pytest
 from django.urls import reverse
-from rest_framework.test import APIRequestFactory
+from pytest_django import DjangoAssertNumQueries
+from rest_framework.test import APIRequestFactory, force_authenticate
 
+from rest_framework_json_schema.schema import Context
+from tests.dummy.models import Artist
+from tests.support import db_views
+from tests.support.db_serializers import AlbumSerializer, ArtistSerializer
 from tests.support.decorators import mark_urls
 from tests.support.views import ArtistViewSet, AlbumViewSet, TrackViewSet
 
@@ -298,3 +306,103 @@ def test_relationships_fields(factory: APIRequestFactory) -> None:
             {"id": "1", "type": "artist", "attributes": {"firstName": "John"}}
         ],
     }
+
+
+@mark_urls
+def test_batch_links_and_meta(
+    factory: APIRequestFactory,
+    db_data: None,
+    monkeypatch: pytest.MonkeyPatch,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """Links and meta are rendered once per type, with all the objects."""
+    calls: List[Any] = []
+
+    def render_meta_many(
+        self: Any, data: Sequence[Dict[str, Any]], context: Context
+    ) -> List[Optional[Dict]]:
+        calls.append((self.type, [obj["id"] for obj in data]))
+        # A single query for all of the artists.
+        names = dict(
+            Artist.objects.filter(pk__in=[obj["id"] for obj in data]).values_list(
+                "pk", "last_name"
+            )
+        )
+        return [{"name": names[obj["id"]]} for obj in data]
+
+    def render_links_many(
+        self: Any, data: Sequence[Dict[str, Any]], context: Context
+    ) -> List[Dict]:
+        calls.append((self.type, [obj["id"] for obj in data]))
+        return [{"self": "/albums/%s" % obj["id"]} for obj in data]
+
+    monkeypatch.setattr(ArtistSerializer.schema, "render_meta_many", render_meta_many)
+    monkeypatch.setattr(AlbumSerializer.schema, "render_links_many", render_links_many)
+
+    request = factory.get(reverse("db-album-list"), {"include": "artist"})
+    response = db_views.AlbumViewSet.as_view({"get": "list"})(request)
+    # The included artists are loaded with a single query, and their meta is
+    # rendered with another.
+    with django_assert_num_queries(2):
+        response.render()
+    content = json.loads(response.content)
+    album_ids = [album["id"] for album in content["data"]]
+    artist_ids = [artist["id"] for artist in content["included"]]
+    assert calls == [
+        ("album", [int(id) for id in album_ids]),
+        ("artist", [int(id) for id in artist_ids]),
+    ]
+    assert [album["links"]["self"] for album in content["data"]] == [
+        "/albums/%s" % id for id in album_ids
+    ]
+    assert [artist["meta"] for artist in content["included"]] == [
+        {"name": "Coltrane"},
+        {"name": "Davis"},
+    ]
+
+
+@mark_urls
+def test_server_timing(factory: APIRequestFactory, settings: Any) -> None:
+    """Rendering can be timed with a Server-Timing header."""
+    view_list = AlbumViewSet.as_view({"get": "list"})
+    url = reverse("album-list")
+    response = view_list(factory.get(url, {"include": "artist"}))
+    response.render()
+    assert not response.has_header("Server-Timing")
+
+    settings.JSON_API_SERVER_TIMING = True
+    response = view_list(factory.get(url, {"include": "artist"}))
+    response.render()
+    metrics = dict(
+        metric.split(";", 1) for metric in response["Server-Timing"].split(", ")
+    )
+    assert set(metrics) == {
+        "parse",
+        "render",
+        "include",
+        "load",
+        "links",
+        "encode",
+        "resources",
+        "included",
+        "bytes",
+    }
+    assert all(metrics[phase].startswith("dur=") for phase in ("parse", "encode"))
+    content = json.loads(response.content)
+    assert metrics["included"] == 'desc="%d"' % len(content["included"])
+    assert metrics["resources"] == 'desc="%d"' % (
+        len(content["data"]) + len(content["included"])
+    )
+    assert metrics["bytes"] == 'desc="%d"' % len(response.content)
+
+
+@mark_urls
+def test_server_timing_header(factory: APIRequestFactory) -> None:
+    """Staff users can ask for the Server-Timing header."""
+    view_list = ArtistViewSet.as_view({"get": "list"})
+    for (is_staff, expected) in ((False, False), (True, True)):
+        request = factory.get(reverse("artist-list"), HTTP_X_SERVER_TIMING="1")
+        force_authenticate(request, SimpleNamespace(is_staff=is_staff))
+        response = view_list(request)
+        response.render()
+        assert response.has_header("Server-Timing") == expected
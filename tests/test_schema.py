@@ -1,5 +1,5 @@
 from collections import OrderedDict
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import pytest
 from rest_framework.request import Request
@@ -14,6 +14,7 @@ from rest_framework_json_schema.schema import (
     LinkObject,
     UrlLink,
     ObjDataType,
+    RenderBatch,
 )
 from rest_framework_json_schema.transforms import CamelCaseTransform
 from rest_framework_json_schema.utils import parse_include
@@ -328,6 +329,54 @@ def test_tolerate_missing_attributes(context: Context) -> None:
     assert included == []
 
 
+def test_attribute_sources(context: Context) -> None:
+    """Attributes can be rendered from dotted paths and callables."""
+
+    class TrackObject(ResourceObject):
+        type = "track"
+        attributes = (
+            "name",
+            ("album_name", "album.name"),
+            ("title", lambda data: "%s (%s)" % (data["name"], data["album"]["name"])),
+        )
+        transformer = CamelCaseTransform
+
+    data = {"id": 1, "name": "Jeru", "album": {"name": "Birth of the Cool"}}
+    primary, included = TrackObject().render(data, context)
+    assert primary["attributes"] == {
+        "name": "Jeru",
+        "albumName": "Birth of the Cool",
+        "title": "Jeru (Birth of the Cool)",
+    }
+
+    # Missing paths aren't rendered.
+    primary, included = TrackObject().render({"id": 1, "album": {}}, context)
+    assert "attributes" not in primary
+
+
+def test_render_from_objects(context: Context) -> None:
+    """Resources can be rendered straight from objects, such as model instances."""
+
+    class Album:
+        name = "Birth of the Cool"
+
+    class Track:
+        id = 1
+        name = "Jeru"
+        album = Album()
+
+    class TrackObject(ResourceObject):
+        type = "track"
+        attributes = ("name", ("album_name", "album.name"), "missing")
+
+    primary, included = TrackObject().render(Track(), context)
+    assert primary == {
+        "id": "1",
+        "type": "track",
+        "attributes": {"name": "Jeru", "album_name": "Birth of the Cool"},
+    }
+
+
 @mark_urls
 def test_tolerate_missing_relationships(context: Context) -> None:
     """To support write_only data, be tolerant if a relationship isn't in the data."""
@@ -395,6 +444,119 @@ def test_render_included(schema_request: Request) -> None:
     ]
 
 
+@mark_urls
+def test_render_linkage_limit(schema_request: Request) -> None:
+    """The linkage and included members of a relationship can be limited."""
+
+    class TrackObject(ResourceObject):
+        type = "track"
+        attributes = ("name",)
+
+    class AlbumObject(ResourceObject):
+        type = "album"
+        relationships = (
+            (
+                "tracks",
+                RelationshipObject(
+                    linkage_limit=2,
+                    links=(
+                        (
+                            "self",
+                            UrlLink(
+                                view_name="album-relationship-artist",
+                                url_kwargs={"pk": "id"},
+                            ),
+                        ),
+                    ),
+                ),
+            ),
+        )
+
+    class TrackLink(ResourceIdObject):
+        def get_schema(self) -> ResourceObject:
+            return TrackObject()
+
+        def get_data(self) -> Dict[str, Any]:
+            return {"id": self.id, "name": "Track %s" % self.id}
+
+    tracks = [TrackLink(id=id, type="track") for id in range(1, 4)]
+    primary, included = AlbumObject().render(
+        {"id": "123", "tracks": tracks},
+        Context(schema_request, parse_include("tracks")),
+    )
+    assert primary["relationships"]["tracks"] == {
+        "data": [{"id": "1", "type": "track"}, {"id": "2", "type": "track"}],
+        "links": {
+            "self": "http://testserver/api/album/123/relationship_artist/",
+            "page[next]": "http://testserver/api/album/123/relationship_artist/"
+            "?limit=2&offset=2",
+        },
+        "meta": {"count": 3},
+    }
+    assert [obj["id"] for obj in included] == ["1", "2"]
+
+    # Under the limit, the relationship is unchanged.
+    primary, included = AlbumObject().render(
+        {"id": "123", "tracks": tracks[:2]}, Context(schema_request)
+    )
+    assert primary["relationships"]["tracks"] == {
+        "data": [{"id": "1", "type": "track"}, {"id": "2", "type": "track"}],
+        "links": {"self": "http://testserver/api/album/123/relationship_artist/"},
+    }
+
+
+@mark_urls
+def test_render_relationship_modes(schema_request: Request) -> None:
+    """Clients can choose to only render the count or the links of a relationship."""
+
+    class AlbumObject(ResourceObject):
+        type = "album"
+        relationships = (
+            "artist",
+            (
+                "tracks",
+                RelationshipObject(
+                    links=(
+                        (
+                            "self",
+                            UrlLink(
+                                view_name="album-relationship-artist",
+                                url_kwargs={"pk": "id"},
+                            ),
+                        ),
+                    ),
+                ),
+            ),
+        )
+
+    data = {
+        "id": "123",
+        "artist": ResourceIdObject(id=5, type="artist"),
+        "tracks": [ResourceIdObject(id=id, type="track") for id in range(1, 4)],
+    }
+    self_link = "http://testserver/api/album/123/relationship_artist/"
+    context = Context(
+        schema_request,
+        relationship_modes={"album": {"tracks": "count", "artist": "links"}},
+    )
+    primary, included = AlbumObject().render(data, context)
+    # Without links, "links" mode falls back to the default.
+    assert primary["relationships"] == {
+        "artist": {"data": {"id": "5", "type": "artist"}},
+        "tracks": {"links": {"self": self_link}, "meta": {"count": 3}},
+    }
+
+    context = Context(
+        schema_request,
+        relationship_modes={"album": {"tracks": "links", "artist": "invalid"}},
+    )
+    primary, included = AlbumObject().render(data, context)
+    assert primary["relationships"] == {
+        "artist": {"data": {"id": "5", "type": "artist"}},
+        "tracks": {"links": {"self": self_link}},
+    }
+
+
 @mark_urls
 def test_render_included_path(schema_request: Request) -> None:
     """You can render included paths."""
@@ -714,3 +876,69 @@ def test_parse_type_conflict(schema_request: Request) -> None:
         obj.parse({"id": "123", "type": "something"}, Context(schema_request))
     with pytest.raises(TypeConflict):
         obj.parse({}, schema_request)
+
+
+@mark_urls
+def test_parse_relationship_type_conflict(schema_request: Request) -> None:
+    """Relationship linkage is verified against the known related types."""
+
+    class AlbumObject(ResourceObject):
+        type = "album"
+        relationships = ("artist", "tracks")
+
+    context = Context(schema_request, related_types={"tracks": "track"})
+    result = AlbumObject().parse(
+        {
+            "type": "album",
+            "relationships": {
+                "artist": {"data": {"id": "1", "type": "anything"}},
+                "tracks": {"data": [{"id": "1", "type": "track"}]},
+            },
+        },
+        context,
+    )
+    assert result == {"artist": "1", "tracks": ["1"]}
+
+    with pytest.raises(TypeConflict):
+        AlbumObject().parse(
+            {
+                "type": "album",
+                "relationships": {
+                    "tracks": {
+                        "data": [
+                            {"id": "1", "type": "track"},
+                            {"id": "2", "type": "album"},
+                        ]
+                    }
+                },
+            },
+            context,
+        )
+
+
+def test_render_batch_by_schema(context: Context) -> None:
+    """Schemas of the same type render their own links in a batch."""
+
+    class ArtistObject(ResourceObject):
+        type = "artist"
+
+        def render_links(self, data: ObjDataType, context: Context) -> OrderedDict:
+            return OrderedDict(self="/artists/%s" % data["id"])
+
+    class OtherArtistObject(ResourceObject):
+        type = "artist"
+
+        def render_links(self, data: ObjDataType, context: Context) -> OrderedDict:
+            return OrderedDict(self="/other/%s" % data["id"])
+
+    batch = RenderBatch()
+    results: List[Dict[str, Any]] = [{}, {}, {}]
+    batch.add(ArtistObject(), results[0], {"id": "1"})
+    batch.add(OtherArtistObject(), results[1], {"id": "2"})
+    batch.add(ArtistObject(), results[2], {"id": "3"})
+    batch.render(context)
+    assert [result["links"]["self"] for result in results] == [
+        "/artists/1",
+        "/other/2",
+        "/artists/3",
+    ]
@@ -0,0 +1,105 @@
+import json
+from pathlib import Path
+
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory
+
+from rest_framework_json_schema.testing import (
+    PerfSnapshots,
+    RenderCost,
+    assert_within_budget,
+    measure,
+)
+from tests.support import db_views
+from tests.support.decorators import mark_urls
+from tests.support.views import AlbumViewSet, ArtistViewSet
+
+
+@mark_urls
+def test_measure(factory: APIRequestFactory, db: None) -> None:
+    """The cost of a request is measured from the rendered document."""
+    view_list = AlbumViewSet.as_view({"get": "list"})
+    response, cost = measure(
+        view_list, factory.get(reverse("album-list"), {"include": "tracks,artist"})
+    )
+    # 4 albums, 3 artists and 4 tracks.
+    assert cost.as_dict() == {
+        "queries": 0,
+        "resources": 11,
+        "included": 7,
+        "size": len(response.content),
+    }
+    assert_within_budget(cost, queries=0, resources=11, included=7)
+    with pytest.raises(AssertionError, match="Over budget: resources: 11 > 10"):
+        assert_within_budget(cost, resources=10)
+
+    view_detail = ArtistViewSet.as_view({"get": "retrieve"})
+    _response, cost = measure(
+        view_detail, factory.get(reverse("artist-detail", kwargs={"pk": 1})), pk=1
+    )
+    assert (cost.resources, cost.included) == (1, 0)
+
+
+@mark_urls
+def test_measure_queries(factory: APIRequestFactory, db_data: None) -> None:
+    """Queries made to handle and render a request are counted."""
+    view_list = db_views.AlbumViewSet.as_view({"get": "list"})
+    _response, cost = measure(
+        view_list, factory.get(reverse("db-album-list"), {"include": "artist"})
+    )
+    # The albums, their tracks and the artists.
+    assert (cost.queries, cost.resources, cost.included) == (3, 5, 2)
+
+
+def test_perf_snapshots(tmp_path: Path) -> None:
+    """Costs are checked against the budgets of a snapshot file."""
+    path = str(tmp_path / "perf_snapshots" / "test_module.json")
+    cost = RenderCost(queries=2, resources=5, included=2, size=100)
+
+    snapshots = PerfSnapshots(path)
+    with pytest.raises(AssertionError, match="--update-perf-snapshots"):
+        snapshots.check("albums", cost)
+
+    snapshots = PerfSnapshots(path, update=True)
+    snapshots.check("albums", cost)
+    snapshots.save()
+    with open(path) as f:
+        assert json.load(f) == {"albums": cost.as_dict()}
+
+    snapshots = PerfSnapshots(path)
+    snapshots.check("albums", cost)
+    snapshots.check("albums", RenderCost(queries=1, resources=5, included=2, size=90))
+    with pytest.raises(AssertionError, match="albums over budget: queries: 3 > 2"):
+        snapshots.check(
+            "albums", RenderCost(queries=3, resources=5, included=2, size=100)
+        )
+
+
+@mark_urls
+def test_endpoint_budgets(
+    factory: APIRequestFactory, db_data: None, perf_snapshots: PerfSnapshots
+) -> None:
+    """The render costs of endpoints stay within their recorded budgets."""
+    endpoints = (
+        ("albums", AlbumViewSet, "album-list", ""),
+        ("albums?include=tracks,artist", AlbumViewSet, "album-list", "tracks,artist"),
+        ("db-albums", db_views.AlbumViewSet, "db-album-list", ""),
+        (
+            "db-albums?include=artist,tracks",
+            db_views.AlbumViewSet,
+            "db-album-list",
+            "artist,tracks",
+        ),
+        (
+            "db-tracks?include=album.artist",
+            db_views.TrackViewSet,
+            "db-track-list",
+            "album.artist",
+        ),
+    )
+    for (name, viewset, url_name, include) in endpoints:
+        view_list = viewset.as_view({"get": "list"})
+        query = {"include": include} if include else {}
+        _response, cost = measure(view_list, factory.get(reverse(url_name), query))
+        perf_snapshots.check(name, cost)
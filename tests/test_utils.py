@@ -1,4 +1,14 @@
-from rest_framework_json_schema.utils import parse_include
+import threading
+import time
+from typing import List
+
+import pytest
+
+from rest_framework_json_schema.utils import (
+    SingleFlight,
+    parse_include,
+    parse_relationship_modes,
+)
 
 
 def test_parse_include_empty() -> None:
@@ -14,3 +24,82 @@ def test_parse_include_single() -> None:
 def test_parse_include_complicated() -> None:
     result = parse_include("a,a.b,a.c.d,e.f,g")
     assert result == {"a": {"b": {}, "c": {"d": {}}}, "e": {"f": {}}, "g": {}}
+
+
+def test_parse_relationship_modes() -> None:
+    result = parse_relationship_modes(
+        {"relationships[album]": "tracks:count,artist:links,bad", "include": "a"}
+    )
+    assert result == {"album": {"tracks": "count", "artist": "links"}}
+
+
+def test_single_flight_timeout() -> None:
+    """Followers stop waiting for a slow leader after the timeout."""
+    flight = SingleFlight()
+    release = threading.Event()
+    results = []
+
+    def lead() -> None:
+        results.append(flight.do("key", lambda: release.wait(5) and "leader", 5))
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    while not flight.calls:
+        time.sleep(0.001)
+    assert flight.do("key", lambda: "follower", 0.01) == ("follower", False)
+    release.set()
+    leader.join()
+    assert results == [("leader", False)]
+    assert flight.stats == {"leaders": 1, "followers": 1, "timeouts": 1}
+
+
+def test_single_flight_error() -> None:
+    """Followers raise their own copy of the leader's exception."""
+    flight = SingleFlight()
+    release = threading.Event()
+    errors: List[BaseException] = []
+
+    def fail() -> None:
+        release.wait(5)
+        raise ValueError("failed")
+
+    def call() -> None:
+        try:
+            flight.do("key", fail, 5)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while flight.stats["followers"] < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    (leader,) = [e for e in errors if e.__cause__ is None]
+    followers = [e for e in errors if e is not leader]
+    assert len(followers) == 2
+    assert len({id(e) for e in errors}) == 3
+    for error in followers:
+        assert error.args == ("failed",)
+        assert error.__cause__ is leader
+
+
+def test_single_flight_uncopyable_error() -> None:
+    """Exceptions that can't be copied are raised as they are."""
+
+    class Uncopyable(Exception):
+        def __init__(self, code: int, message: str) -> None:
+            super().__init__(message)
+
+    flight = SingleFlight()
+    call = SingleFlight.Call()
+    call.error = Uncopyable(1, "failed")
+    call.done.set()
+    flight.calls["key"] = call
+    with pytest.raises(Uncopyable) as info:
+        flight.do("key", lambda: None, 5)
+    assert info.value is call.error
+    assert info.value.__cause__ is None
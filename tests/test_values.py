@@ -0,0 +1,177 @@
+import json
+from typing import Any, Dict, Type
+from urllib.parse import parse_qsl, urlparse
+
+import pytest
+from django.db.models import F
+from django.urls import reverse
+from pytest_django import DjangoAssertNumQueries
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.viewsets import GenericViewSet
+
+from rest_framework_json_schema.views import JSONAPIValuesMixin
+from tests.dummy.models import Artist, Playlist, Track
+from tests.support import db_views
+from tests.support.db_serializers import ArtistSerializer, camel_schema
+from tests.support.decorators import mark_urls
+
+
+def values_viewset(viewset: Type[GenericViewSet]) -> Type[GenericViewSet]:
+    """Return the viewset, rendering its lists from queryset values."""
+    return type("Values%s" % viewset.__name__, (JSONAPIValuesMixin, viewset), {})
+
+
+def get_list(
+    factory: APIRequestFactory,
+    viewset: Type[GenericViewSet],
+    basename: str,
+    params: Dict[str, Any],
+) -> Any:
+    """Return the rendered list of a viewset."""
+    request = factory.get(reverse("%s-list" % basename), params)
+    response = viewset.as_view({"get": "list"})(request)
+    response.render()
+    assert response.status_code == 200, response.content
+    return json.loads(response.content)
+
+
+@mark_urls
+@pytest.mark.parametrize(
+    "viewset,basename,params",
+    [
+        (db_views.ArtistViewSet, "db-artist", {}),
+        (db_views.AlbumViewSet, "db-album", {}),
+        (db_views.AlbumViewSet, "db-album", {"relationships[album]": "tracks:count"}),
+        (db_views.LimitedAlbumViewSet, "db-limited-album", {}),
+        (
+            db_views.LimitedAlbumViewSet,
+            "db-limited-album",
+            {"relationships[album]": "tracks:links"},
+        ),
+        (db_views.TrackViewSet, "db-track", {"sort": "-name"}),
+        (db_views.TrackViewSet, "db-track", {"filter[album][isnull]": "false"}),
+        (db_views.PlaylistViewSet, "db-playlist", {}),
+        (db_views.CursorPaginateViewSet, "db-page", {"page[size]": 1}),
+        (db_views.CountPaginateViewSet, "db-count", {"page[count]": "window"}),
+    ],
+)
+def test_values_parity(
+    factory: APIRequestFactory,
+    db_data: None,
+    viewset: Type[GenericViewSet],
+    basename: str,
+    params: Dict[str, Any],
+) -> None:
+    """Lists rendered from values are the same as serialized lists."""
+    expected = get_list(factory, viewset, basename, params)
+    assert get_list(factory, values_viewset(viewset), basename, params) == expected
+
+
+@mark_urls
+def test_values_converters(factory: APIRequestFactory, db_data: None) -> None:
+    """Column values are converted like their serializer fields convert them."""
+    playlist = Playlist.objects.get()
+    content = get_list(
+        factory, values_viewset(db_views.PlaylistViewSet), "db-playlist", {}
+    )
+    attributes = content["data"][0]["attributes"]
+    assert attributes["uuid"] == str(playlist.uuid)
+    assert attributes["rating"] == "4.5"
+    assert attributes["created"] == serializers.DateTimeField().to_representation(
+        playlist.created
+    )
+
+
+@mark_urls
+def test_values_cursor_pages(factory: APIRequestFactory, db_data: None) -> None:
+    """The cursors of lists rendered from values lead to the same pages."""
+    viewset = values_viewset(db_views.CursorPaginateViewSet)
+    next_link = get_list(factory, viewset, "db-page", {"page[size]": 1})["links"][
+        "page[next]"
+    ]
+    params = dict(parse_qsl(urlparse(next_link).query))
+    content = get_list(factory, viewset, "db-page", params)
+    assert content == get_list(
+        factory, db_views.CursorPaginateViewSet, "db-page", params
+    )
+    assert [artist["attributes"]["lastName"] for artist in content["data"]] == ["Davis"]
+
+
+@mark_urls
+def test_values_queries(
+    factory: APIRequestFactory,
+    db_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """To-many relationships are fetched with one query for the whole list."""
+    viewset = values_viewset(db_views.AlbumViewSet)
+    # The albums, and the IDs of their tracks.
+    with django_assert_num_queries(2):
+        get_list(factory, viewset, "db-album", {})
+    # The count of the tracks is annotated.
+    with django_assert_num_queries(1):
+        get_list(factory, viewset, "db-album", {"relationships[album]": "tracks:count"})
+
+
+@mark_urls
+def test_values_fallback(factory: APIRequestFactory, db_data: None) -> None:
+    """Included resources and unsupported fields use the serializer."""
+    viewset = values_viewset(db_views.AlbumViewSet)
+    request = Request(factory.get(reverse("db-album-list"), {"include": "artist"}))
+    assert viewset(request=request).get_values_plan(request) is None
+
+    class NamedArtistSerializer(ArtistSerializer):
+        full_name = serializers.SerializerMethodField()
+        schema = camel_schema("artist")
+
+        class Meta:
+            model = Artist
+            fields = ("id", "first_name", "last_name", "full_name")
+
+        def get_full_name(self, obj: Any) -> str:
+            return "%s %s" % (obj.first_name, obj.last_name)
+
+    viewset = values_viewset(db_views.ArtistViewSet)
+    request = Request(factory.get(reverse("db-artist-list")))
+    view = viewset(
+        request=request, serializer_class=NamedArtistSerializer, format_kwarg=None
+    )
+    assert view.get_values_plan(request) is None
+
+    # Linkage limits are applied by the serializer fields' queries.
+    viewset = values_viewset(db_views.LimitedAlbumViewSet)
+    request = Request(factory.get(reverse("db-limited-album-list")))
+    view = viewset(request=request, format_kwarg=None)
+    assert view.get_values_plan(request) is None
+    request = Request(
+        factory.get(
+            reverse("db-limited-album-list"), {"relationships[album]": "tracks:count"}
+        )
+    )
+    view = viewset(request=request, format_kwarg=None)
+    assert view.get_values_plan(request) is not None
+
+
+@mark_urls
+def test_values_expression_ordering(
+    factory: APIRequestFactory, db_data: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Members ordered by an expression use the serializer."""
+    monkeypatch.setattr(Track._meta, "ordering", [F("name").desc()])
+    viewset = values_viewset(db_views.AlbumViewSet)
+    request = Request(factory.get(reverse("db-album-list")))
+    view = viewset(request=request, format_kwarg=None)
+    assert view.get_values_plan(request) is None
+    data = get_list(factory, viewset, "db-album", {})["data"]
+    assert [t["id"] for t in data[1]["relationships"]["tracks"]["data"]] == [
+        str(t.pk) for t in Track.objects.order_by("-name")
+    ]
+
+    # Counts don't need the ordering.
+    request = Request(
+        factory.get(reverse("db-album-list"), {"relationships[album]": "tracks:count"})
+    )
+    view = viewset(request=request, format_kwarg=None)
+    assert view.get_values_plan(request) is not None
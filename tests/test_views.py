@@ -0,0 +1,445 @@
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+from pytest_django import DjangoAssertNumQueries
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from rest_framework_json_schema.utils import SingleFlight
+from rest_framework_json_schema.views import JSONAPISingleFlightMixin
+
+from tests.dummy.models import Album, Playlist, Track
+from tests.support import views
+from tests.support.db_views import AlbumViewSet, LimitedAlbumViewSet, PlaylistViewSet
+from tests.support.decorators import mark_urls
+
+
+def relationship_view(viewset: Any) -> Callable:
+    """Return the relationships view, configured like the router would."""
+    return viewset.as_view(
+        {method: "relationships" for method in ("get", "post", "patch", "delete")},
+        **viewset.relationships.kwargs,
+    )
+
+
+def linkage(type: str, *pks: int) -> Dict[str, Any]:
+    """Return a relationship document with the given linkage."""
+    return {"data": [{"id": str(pk), "type": type} for pk in pks]}
+
+
+@mark_urls
+def test_get_to_many(
+    factory: APIRequestFactory,
+    db_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """You can fetch the linkage of a to-many relationship."""
+    album = Album.objects.get(album_name="Birth of the Cool")
+    url = reverse(
+        "db-album-relationships", kwargs={"pk": album.pk, "rel_name": "tracks"}
+    )
+    view = relationship_view(AlbumViewSet)
+    # One query for the album, and one for the IDs of its tracks.
+    with django_assert_num_queries(2):
+        response = view(factory.get(url), pk=album.pk, rel_name="tracks")
+        response.render()
+    assert response["Content-Type"] == "application/vnd.api+json"
+    pks = album.tracks.order_by("pk").values_list("pk", flat=True)
+    assert json.loads(response.content) == linkage("track", *pks)
+
+
+@mark_urls
+def test_get_to_one(
+    factory: APIRequestFactory,
+    db_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """You can fetch the linkage of a to-one relationship without fetching it."""
+    view = relationship_view(AlbumViewSet)
+    album = Album.objects.get(album_name="Birth of the Cool")
+    url = reverse(
+        "db-album-relationships", kwargs={"pk": album.pk, "rel_name": "artist"}
+    )
+    with django_assert_num_queries(1):
+        response = view(factory.get(url), pk=album.pk, rel_name="artist")
+        response.render()
+    assert json.loads(response.content) == {
+        "data": {"id": str(album.artist_id), "type": "artist"}
+    }
+
+    album = Album.objects.get(album_name="Unknown Artist")
+    response = view(factory.get(url), pk=album.pk, rel_name="artist")
+    response.render()
+    assert json.loads(response.content) == {"data": None}
+
+
+@mark_urls
+def test_get_invalid_relationship(factory: APIRequestFactory, db_data: None) -> None:
+    """Fetching a relationship that doesn't exist is not found."""
+    view = relationship_view(AlbumViewSet)
+    album = Album.objects.get(album_name="Birth of the Cool")
+    url = reverse("db-album-relationships", kwargs={"pk": album.pk, "rel_name": "foo"})
+    response = view(factory.get(url), pk=album.pk, rel_name="foo")
+    assert response.status_code == 404
+
+
+@mark_urls
+def test_update_many_to_many(factory: APIRequestFactory, db_data: None) -> None:
+    """You can add, remove and replace many-to-many relationship members."""
+    playlist = Playlist.objects.get()
+    jeru, moon, venus, deception = Track.objects.order_by("track_num")
+    url = reverse(
+        "db-playlist-relationships", kwargs={"pk": playlist.pk, "rel_name": "tracks"}
+    )
+    view = relationship_view(PlaylistViewSet)
+
+    def tracks() -> Any:
+        return set(playlist.tracks.values_list("pk", flat=True))
+
+    assert tracks() == {jeru.pk, venus.pk}
+    # Existing members are not added again.
+    response = view(
+        factory.post(url, linkage("track", jeru.pk, moon.pk)),
+        pk=playlist.pk,
+        rel_name="tracks",
+    )
+    assert response.status_code == 204
+    assert tracks() == {jeru.pk, moon.pk, venus.pk}
+    assert playlist.tracks.through.objects.count() == 3
+
+    response = view(
+        factory.delete(url, linkage("track", venus.pk, deception.pk)),
+        pk=playlist.pk,
+        rel_name="tracks",
+    )
+    assert response.status_code == 204
+    assert tracks() == {jeru.pk, moon.pk}
+
+    response = view(
+        factory.patch(url, linkage("track", moon.pk, deception.pk)),
+        pk=playlist.pk,
+        rel_name="tracks",
+    )
+    assert response.status_code == 204
+    assert tracks() == {moon.pk, deception.pk}
+
+
+@mark_urls
+def test_update_minimal_queries(
+    factory: APIRequestFactory,
+    db_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """Replacing members only inserts and deletes the difference, in bulk."""
+    playlist = Playlist.objects.get()
+    jeru, moon, venus, deception = Track.objects.order_by("track_num")
+    url = reverse(
+        "db-playlist-relationships", kwargs={"pk": playlist.pk, "rel_name": "tracks"}
+    )
+    view = relationship_view(PlaylistViewSet)
+    request = factory.patch(url, linkage("track", jeru.pk, moon.pk, deception.pk))
+    # Playlist, current members, existence of the new members, savepoint,
+    # insert, delete, savepoint release.
+    with django_assert_num_queries(7):
+        response = view(request, pk=playlist.pk, rel_name="tracks")
+    assert response.status_code == 204
+    assert set(playlist.tracks.values_list("pk", flat=True)) == {
+        jeru.pk,
+        moon.pk,
+        deception.pk,
+    }
+
+
+@mark_urls
+def test_update_reverse_foreign_key(factory: APIRequestFactory, db_data: None) -> None:
+    """You can update to-many relationships that are reverse foreign keys."""
+    album = Album.objects.get(album_name="A Love Supreme")
+    cool = Album.objects.get(album_name="Birth of the Cool")
+    jeru, moon, venus, deception = Track.objects.order_by("track_num")
+    url = reverse(
+        "db-album-relationships", kwargs={"pk": album.pk, "rel_name": "tracks"}
+    )
+    view = relationship_view(AlbumViewSet)
+
+    response = view(
+        factory.post(url, linkage("track", jeru.pk, moon.pk)),
+        pk=album.pk,
+        rel_name="tracks",
+    )
+    assert response.status_code == 204
+    assert set(album.tracks.values_list("pk", flat=True)) == {jeru.pk, moon.pk}
+    assert set(cool.tracks.values_list("pk", flat=True)) == {venus.pk, deception.pk}
+
+    response = view(
+        factory.delete(url, linkage("track", jeru.pk)), pk=album.pk, rel_name="tracks"
+    )
+    assert response.status_code == 204
+    assert set(album.tracks.values_list("pk", flat=True)) == {moon.pk}
+    assert Track.objects.get(pk=jeru.pk).album is None
+
+
+@mark_urls
+def test_update_to_one(factory: APIRequestFactory, db_data: None) -> None:
+    """You can replace and clear a to-one relationship."""
+    album = Album.objects.get(album_name="Unknown Artist")
+    artist = Album.objects.get(album_name="A Love Supreme").artist
+    url = reverse(
+        "db-album-relationships", kwargs={"pk": album.pk, "rel_name": "artist"}
+    )
+    view = relationship_view(AlbumViewSet)
+
+    response = view(
+        factory.patch(url, {"data": {"id": str(artist.pk), "type": "artist"}}),
+        pk=album.pk,
+        rel_name="artist",
+    )
+    assert response.status_code == 204
+    album.refresh_from_db()
+    assert album.artist == artist
+
+    response = view(factory.patch(url, {"data": None}), pk=album.pk, rel_name="artist")
+    assert response.status_code == 204
+    album.refresh_from_db()
+    assert album.artist is None
+
+    response = view(factory.post(url, {"data": None}), pk=album.pk, rel_name="artist")
+    assert response.status_code == 405
+
+
+@mark_urls
+def test_update_errors(factory: APIRequestFactory, db_data: None) -> None:
+    """Invalid linkage is rejected, and nothing is changed."""
+    playlist = Playlist.objects.get()
+    url = reverse(
+        "db-playlist-relationships", kwargs={"pk": playlist.pk, "rel_name": "tracks"}
+    )
+    view = relationship_view(PlaylistViewSet)
+    before = set(playlist.tracks.values_list("pk", flat=True))
+
+    response = view(
+        factory.patch(url, linkage("track", 998, 999)),
+        pk=playlist.pk,
+        rel_name="tracks",
+    )
+    response.render()
+    assert response.status_code == 400
+    assert json.loads(response.content) == {
+        "errors": [["Invalid pks 998, 999 - objects do not exist."]]
+    }
+
+    response = view(
+        factory.patch(url, linkage("album", 1)), pk=playlist.pk, rel_name="tracks"
+    )
+    assert response.status_code == 409
+
+    response = view(
+        factory.patch(url, {"data": {"id": "1", "type": "track"}}),
+        pk=playlist.pk,
+        rel_name="tracks",
+    )
+    assert response.status_code == 400
+    assert set(playlist.tracks.values_list("pk", flat=True)) == before
+
+
+@mark_urls
+def test_update_normalized_ids(factory: APIRequestFactory, db_data: None) -> None:
+    """IDs are compared by the primary key field, not by their strings."""
+    playlist = Playlist.objects.get()
+    jeru, moon, venus, deception = Track.objects.order_by("track_num")
+    url = reverse(
+        "db-playlist-relationships", kwargs={"pk": playlist.pk, "rel_name": "tracks"}
+    )
+    view = relationship_view(PlaylistViewSet)
+
+    def tracks() -> Any:
+        return set(playlist.tracks.values_list("pk", flat=True))
+
+    def padded(*pks: int) -> Dict[str, Any]:
+        return {"data": [{"id": f"0{pk}", "type": "track"} for pk in pks]}
+
+    response = view(
+        factory.post(url, padded(jeru.pk, moon.pk)), pk=playlist.pk, rel_name="tracks"
+    )
+    assert response.status_code == 204
+    assert tracks() == {jeru.pk, moon.pk, venus.pk}
+    assert playlist.tracks.through.objects.count() == 3
+
+    response = view(
+        factory.delete(url, padded(venus.pk)), pk=playlist.pk, rel_name="tracks"
+    )
+    assert response.status_code == 204
+    assert tracks() == {jeru.pk, moon.pk}
+
+    response = view(
+        factory.patch(url, {"data": [{"id": "abc", "type": "track"}]}),
+        pk=playlist.pk,
+        rel_name="tracks",
+    )
+    response.render()
+    assert response.status_code == 400
+    assert json.loads(response.content) == {
+        "errors": [["Incorrect type. Expected pk value, received str."]]
+    }
+    assert tracks() == {jeru.pk, moon.pk}
+
+
+@mark_urls
+def test_linkage_limit(
+    factory: APIRequestFactory,
+    db_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """Large to-many relationships are fetched and rendered up to a limit."""
+    album = Album.objects.get(album_name="Birth of the Cool")
+    url = reverse("db-limited-album-detail", kwargs={"pk": album.pk})
+    view = LimitedAlbumViewSet.as_view({"get": "retrieve"})
+    # The album, a slice of its tracks, and a count of them.
+    with django_assert_num_queries(3):
+        response = view(factory.get(url), pk=album.pk)
+        response.render()
+    pks = list(album.tracks.order_by("pk").values_list("pk", flat=True))
+    rel_url = "http://testserver/api/db/limited-album/%s/relationships/tracks/" % (
+        album.pk
+    )
+    tracks = json.loads(response.content)["data"]["relationships"]["tracks"]
+    assert tracks == {
+        "data": linkage("track", *pks[:2])["data"],
+        "links": {"self": rel_url, "page[next]": rel_url + "?limit=2&offset=2"},
+        "meta": {"count": 4},
+    }
+
+    response = view(factory.get(url, {"include": "tracks"}), pk=album.pk)
+    response.render()
+    content = json.loads(response.content)
+    assert [obj["id"] for obj in content["included"]] == [str(pk) for pk in pks[:2]]
+
+    # The relationship endpoint is paginated the same way.
+    view = relationship_view(LimitedAlbumViewSet)
+    response = view(
+        factory.get(rel_url + "?limit=2&offset=2"), pk=album.pk, rel_name="tracks"
+    )
+    response.render()
+    content = json.loads(response.content)
+    assert content["data"] == linkage("track", *pks[2:])["data"]
+    assert content["meta"] == {"count": 4}
+    assert content["links"]["page[next]"] is None
+    assert content["links"]["page[previous]"] == rel_url + "?limit=2"
+
+    response = view(factory.get(rel_url), pk=album.pk, rel_name="tracks")
+    response.render()
+    content = json.loads(response.content)
+    assert content["data"] == linkage("track", *pks[:2])["data"]
+    assert content["links"]["page[next]"] == rel_url + "?limit=2&offset=2"
+
+
+@mark_urls
+def test_relationship_links_mode(
+    factory: APIRequestFactory,
+    db_data: None,
+    django_assert_num_queries: DjangoAssertNumQueries,
+) -> None:
+    """The members of a relationship rendered with only links aren't fetched."""
+    album = Album.objects.get(album_name="Birth of the Cool")
+    url = reverse("db-limited-album-detail", kwargs={"pk": album.pk})
+    view = LimitedAlbumViewSet.as_view({"get": "retrieve"})
+    with django_assert_num_queries(1):
+        response = view(
+            factory.get(url, {"relationships[album]": "tracks:links"}), pk=album.pk
+        )
+        response.render()
+    tracks = json.loads(response.content)["data"]["relationships"]["tracks"]
+    assert tracks == {
+        "links": {
+            "self": "http://testserver/api/db/limited-album/%s/relationships/tracks/"
+            % album.pk
+        }
+    }
+
+
+@mark_urls
+def test_single_flight(factory: APIRequestFactory) -> None:
+    """Identical concurrent requests share a single response."""
+    release = threading.Event()
+    calls = []
+
+    class SingleFlightViewSet(JSONAPISingleFlightMixin, views.ArtistViewSet):
+        single_flight = SingleFlight()
+
+        def get_queryset(self) -> Any:
+            calls.append(self.request.query_params.get("include"))
+            release.wait(5)
+            return super().get_queryset()
+
+        def finalize_response(self, *args: Any, **kwargs: Any) -> Any:
+            response = super().finalize_response(*args, **kwargs)
+            # Only the rendered response, not the shared copies.
+            if isinstance(response, Response):
+                response.set_cookie("flight", "leader", httponly=True)
+            return response
+
+    view = SingleFlightViewSet.as_view({"get": "list"})
+    url = reverse("artist-list")
+    responses: List[Any] = []
+
+    def fetch(params: Dict[str, str]) -> None:
+        response = view(factory.get(url, params))
+        responses.append(response)
+
+    threads = [
+        threading.Thread(target=fetch, args=({"fields[artist]": fields},))
+        for fields in ("firstName,lastName", "lastName,firstName") * 3
+    ]
+    for thread in threads:
+        thread.start()
+    for _ in range(500):
+        if SingleFlightViewSet.single_flight.stats["followers"] == 5:
+            break
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert SingleFlightViewSet.single_flight.stats == {
+        "leaders": 1,
+        "followers": 5,
+        "timeouts": 0,
+    }
+    assert {response.content for response in responses} == {responses[0].content}
+    assert responses[0]["Content-Type"] == "application/vnd.api+json"
+    assert len(json.loads(responses[0].content)["data"]) == 6
+    # Each response has its own copy of the leader's cookies.
+    cookies = [response.cookies["flight"] for response in responses]
+    assert {(c.value, c["httponly"]) for c in cookies} == {("leader", True)}
+    assert len({id(c) for c in cookies}) == len(responses)
+
+
+@mark_urls
+def test_single_flight_key(factory: APIRequestFactory) -> None:
+    """Requests are only identical if their JSON API query and user match."""
+
+    class SingleFlightViewSet(JSONAPISingleFlightMixin, views.AlbumViewSet):
+        pass
+
+    def key(params: Dict[str, str], user: Any = None) -> Any:
+        view = SingleFlightViewSet(action_map={"get": "list"})
+        request = factory.get(reverse("album-list"), params)
+        if user:
+            force_authenticate(request, user)
+        view.request = view.initialize_request(request)
+        view.format_kwarg = None
+        (
+            view.request.accepted_renderer,
+            view.request.accepted_media_type,
+        ) = view.perform_content_negotiation(view.request)
+        return view.get_single_flight_key(view.request)
+
+    assert key({"include": "artist,tracks"}) == key({"include": "tracks,artist"})
+    assert key({"include": "artist"}) != key({"include": "tracks"})
+    assert key({"sort": "a,b"}) != key({"sort": "b,a"})
+    assert key({}, User(pk=1)) != key({})
+    assert key({}, User(pk=1)) != key({}, User(pk=2))